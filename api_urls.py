@@ -0,0 +1,20 @@
+"""
+doctors JSON API v1
+루트 urlconf에서 path('api/v1/', include('doctors.api_urls'))로 연결한다.
+(/api/ 경로는 RedirectAllErrorsMiddleware의 리디렉트 대상에서 제외되어 오류 응답이 JSON 그대로 전달된다.)
+"""
+from django.urls import path
+from django.views.decorators.gzip import gzip_page
+
+from doctors import api_views
+
+app_name = "doctors_api"
+
+urlpatterns = [
+    path(r'patients/', gzip_page(api_views.PatientListAPIView.as_view()), name='patient_list'),
+    path(r'patients/<uuid:patient_pk>/', gzip_page(api_views.PatientDetailAPIView.as_view()), name='patient_detail'),
+    path(r'patients/<uuid:patient_pk>/histories/', gzip_page(api_views.PatientHistoryListAPIView.as_view()),
+         name='patient_histories'),
+    path(r'histories/<uuid:history_pk>/result/', gzip_page(api_views.HistoryResultAPIView.as_view()),
+         name='history_result'),
+]
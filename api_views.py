@@ -0,0 +1,114 @@
+"""
+의사용 읽기 전용 JSON API (v1)
+환자 목록/상세, 방문 기록 목록, 진단 결과를 제공한다. (doctors.api_urls)
+
+    - 커서 페이지네이션 : (created, id) 기준, OFFSET 없음
+    - ?fields=         : 필요한 필드만 직렬화하고, 요청되지 않은 암호화 컬럼은 조회에서 제외
+    - ETag / 304       : 응답 본문 해시. 진단 결과는 결과 캐시 버전(행의 modified)으로 계산하여 본문을 만들기 전에 비교
+    - gzip             : api_urls에서 gzip_page로 적용
+"""
+import hashlib
+
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.utils.http import quote_etag
+from rest_framework import generics, permissions
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from core.constants import VIEW_COUNT
+from doctors.method import filter_queryset_by_range, get_custom_date_range
+from doctors.models import MedicalHistory, Patient
+from doctors.name_index import filter_patients_by_name
+from doctors.result_cache import get_result_key
+from doctors.serializers import DiagnosisResultSerializer, MedicalHistorySerializer, PatientSerializer
+from doctors.views_util import annotate_patient_list, get_patients_history_result, get_record_graph_version
+
+
+class IsDoctor(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and hasattr(request.user, 'doctor'))
+
+
+class CreatedCursorPagination(CursorPagination):
+    page_size = VIEW_COUNT
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created', '-id')
+
+
+class DoctorAPIView(generics.GenericAPIView):
+    authentication_classes = (SessionAuthentication, TokenAuthentication)
+    permission_classes = (IsDoctor,)
+    pagination_class = CreatedCursorPagination
+
+    def get_doctor_pk(self):
+        return self.request.user.doctor.id
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        GET 200 응답에 본문 해시 ETag를 붙이고, If-None-Match가 같으면 304를 반환합니다.
+        """
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method == 'GET' and response.status_code == 200:
+            response.render()
+            if not response.has_header('ETag'):
+                set_response_etag(response)
+            response = get_conditional_response(request, etag=response['ETag'], response=response)
+        return response
+
+
+class PatientListAPIView(DoctorAPIView, generics.ListAPIView):
+    serializer_class = PatientSerializer
+
+    def get_queryset(self):
+        patients = annotate_patient_list(Patient.objects.filter(doctor_id=self.get_doctor_pk()))
+        search = self.request.query_params.get('search')
+        if search:
+            patients = filter_patients_by_name(patients, search, doctor_pk=self.get_doctor_pk())
+        deferred = PatientSerializer.get_deferred_columns(self.request)
+        return patients.defer(*deferred) if deferred else patients
+
+
+class PatientDetailAPIView(DoctorAPIView, generics.RetrieveAPIView):
+    serializer_class = PatientSerializer
+    lookup_url_kwarg = 'patient_pk'
+
+    def get_queryset(self):
+        return annotate_patient_list(Patient.objects.filter(doctor_id=self.get_doctor_pk()))
+
+
+class PatientHistoryListAPIView(DoctorAPIView, generics.ListAPIView):
+    serializer_class = MedicalHistorySerializer
+
+    def get_queryset(self):
+        patient = get_object_or_404(Patient.objects.only('id'), id=self.kwargs['patient_pk'],
+                                    doctor_id=self.get_doctor_pk())
+        histories = MedicalHistory.objects.filter(patient_id=patient.id)
+        date_range = get_custom_date_range(self.request.query_params.get('from'),
+                                           self.request.query_params.get('to'))
+        if date_range is not None:
+            histories = filter_queryset_by_range(histories, *date_range)
+        return histories
+
+
+class HistoryResultAPIView(DoctorAPIView):
+    serializer_class = DiagnosisResultSerializer
+
+    def get(self, request, history_pk):
+        history = get_object_or_404(MedicalHistory.objects.only('id', 'patient_id'), id=history_pk,
+                                    patient__doctor_id=self.get_doctor_pk())
+        # 결과는 그래프 행의 modified가 바뀔 때만 달라지므로 결과를 만들기 전에 ETag를 비교한다.
+        version = get_record_graph_version(history.id)
+        fields = request.query_params.get('fields', '')
+        version_key = f"{get_result_key(history.patient_id, history.id, version)}:{fields}"
+        etag = quote_etag(hashlib.md5(version_key.encode()).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        context = get_patients_history_result(history.patient_id, history.id, version, inline_images=False)
+        response = Response(self.get_serializer(context).data)
+        response['ETag'] = etag
+        return response
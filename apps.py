@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class DoctorsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'doctors'
+
+    def ready(self):
+        # 시그널 수신자 등록 (환자 요약/이름 검색 토큰/카운터 갱신)
+        from doctors import signals  # noqa: F401
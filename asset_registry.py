@@ -0,0 +1,107 @@
+"""
+리포트용 정적 자산(로고, 워터마크, 폰트 등) 레지스트리
+settings.REPORT_ASSETS의 파일을 staticfiles finder로 찾아 base64로 인코딩한 값을 메모리에 두고,
+파일이 바뀌면(mtime) 다시 읽는다. mtime 확인은 REPORT_ASSET_CHECK_INTERVAL초에 한 번만 한다.
+"""
+import base64
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+
+def find_static_path(path: str) -> Optional[str]:
+    from django.contrib.staticfiles import finders
+    found = finders.find(path)
+    if found:
+        return found[0] if isinstance(found, list) else found
+    for candidate in (os.path.join(settings.STATIC_ROOT, path), os.path.join('static', path)):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+class StaticAsset:
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.resolved_path = None
+        self.mtime = None
+        self.content = None
+        self.base64 = None
+        self.checked_at = 0.0
+
+    def load(self):
+        resolved_path = self.resolved_path or find_static_path(self.path)
+        if resolved_path is None:
+            raise FileNotFoundError(f"static asset '{self.path}' not found")
+        mtime = os.stat(resolved_path).st_mtime
+        if resolved_path != self.resolved_path or mtime != self.mtime:
+            with open(resolved_path, 'rb') as f:
+                content = f.read()
+            self.content = content
+            self.base64 = base64.b64encode(content).decode()
+            self.resolved_path = resolved_path
+            self.mtime = mtime
+
+
+class StaticAssetRegistry:
+    def __init__(self, assets: Dict[str, str], check_interval: float):
+        self.assets = {name: StaticAsset(name, path) for name, path in assets.items()}
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+
+    def preload(self):
+        for name in self.assets:
+            try:
+                self.get_asset(name)
+            except (FileNotFoundError, OSError) as e:
+                print(f"리포트 자산 로드 실패 {name}: {e}")
+
+    def get_asset(self, name: str) -> StaticAsset:
+        asset = self.assets[name]
+        now = time.monotonic()
+        if asset.base64 is not None and now - asset.checked_at < self.check_interval:
+            return asset
+        with self.lock:
+            if asset.base64 is None or now - asset.checked_at >= self.check_interval:
+                try:
+                    asset.load()
+                except OSError:
+                    # 파일이 잠시 없어져도 이전에 읽은 값이 있으면 그대로 사용한다.
+                    if asset.base64 is None:
+                        raise
+                asset.checked_at = now
+        return asset
+
+    def get_base64(self, name: str) -> Optional[str]:
+        try:
+            return self.get_asset(name).base64
+        except (KeyError, OSError) as e:
+            print(f"리포트 자산 조회 실패 {name}: {e}")
+            return None
+
+    def get_bytes(self, name: str) -> Optional[bytes]:
+        try:
+            return self.get_asset(name).content
+        except (KeyError, OSError) as e:
+            print(f"리포트 자산 조회 실패 {name}: {e}")
+            return None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_report_assets() -> StaticAssetRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = StaticAssetRegistry(
+                getattr(settings, 'REPORT_ASSETS', {'logo': 'images/logo/logo.png'}),
+                getattr(settings, 'REPORT_ASSET_CHECK_INTERVAL', 5.0),
+            )
+            _registry.preload()
+        return _registry
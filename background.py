@@ -0,0 +1,327 @@
+"""
+진단 작업(DiagnosisJob) 백그라운드 처리
+웹 요청은 enqueue_diagnosis_job / enqueue_diagnosis_batch로 이미지와 입력값만 저장하고 즉시 job id를 반환한다.
+run_diagnosis_worker 커맨드로 실행되는 워커 프로세스들이 대기 작업을 배치로 묶어
+classify -> upload -> 저장 단계를 수행한다.
+"""
+import multiprocessing
+import os
+import time
+import uuid
+from datetime import timedelta
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from core.metrics import registry as metrics_registry
+from doctors.image_derivatives import generate_record_derivatives
+from doctors.models import DiagnosisJob
+from doctors.record_writer import DiagnosisRecord, DiagnosisRecordWriter
+from doctors.views_util import (DiagnosisError, add_diagnosis_record, convert_to_inmemory_uploaded_file,
+                                request_inference_batch, write_diagnosis_records)
+
+
+def get_job_max_attempts() -> int:
+    return getattr(settings, 'DIAGNOSIS_JOB_MAX_ATTEMPTS', 3)
+
+
+def get_job_stale_seconds() -> int:
+    return getattr(settings, 'DIAGNOSIS_JOB_STALE_SECONDS', 300)
+
+
+def get_batch_max_size() -> int:
+    return getattr(settings, 'DIAGNOSIS_BATCH_MAX_SIZE', 8)
+
+
+def get_batch_flush_seconds() -> float:
+    return getattr(settings, 'DIAGNOSIS_BATCH_FLUSH_SECONDS', 2.0)
+
+
+def build_diagnosis_job(doctor_pk, reg_no: str, form: Dict, eye_images: List, batch_id=None) -> DiagnosisJob:
+    if len(eye_images) != 2:
+        raise DiagnosisError("좌/우안 이미지 2장을 모두 업로드해주세요.")
+
+    for image in eye_images:
+        image.name = f'{uuid.uuid4()}.jpg'
+
+    return DiagnosisJob(
+        doctor_id=doctor_pk,
+        batch_id=batch_id,
+        reg_no=reg_no,
+        name=form.get('name'),
+        birth=form.get('birth'),
+        gender=form.get('sex'),
+        symptom_by_patient=form.get('symptom_by_patient'),
+        memo_by_doctor=form.get('memo_by_doctor'),
+        eye_image_first=eye_images[0],
+        eye_image_second=eye_images[1],
+    )
+
+
+def enqueue_diagnosis_job(doctor_pk, reg_no: str, form: Dict, eye_images: List) -> DiagnosisJob:
+    """
+    업로드된 이미지를 저장하고 대기(pending) 상태의 진단 작업을 등록합니다.
+    """
+    job = build_diagnosis_job(doctor_pk, reg_no, form, eye_images)
+    job.save()
+    return job
+
+
+def enqueue_diagnosis_batch(doctor_pk, patients: List[Dict]) -> List[DiagnosisJob]:
+    """
+    검진 세션의 여러 환자 진단 작업을 하나의 batch_id로 묶어 한 번에 등록합니다.
+    patients의 각 항목은 {'reg_no', 'form', 'eye_images'} 형식입니다.
+    """
+    batch_id = uuid.uuid4()
+    jobs = [
+        build_diagnosis_job(doctor_pk, patient['reg_no'], patient['form'], patient['eye_images'], batch_id)
+        for patient in patients
+    ]
+    # bulk_create도 FileField.pre_save를 호출하므로 이미지는 INSERT 전에 스토리지에 저장된다.
+    return DiagnosisJob.objects.bulk_create(jobs)
+
+
+def get_job_status(job: DiagnosisJob) -> Dict:
+    """
+    상태 조회(poll) 응답용 dict를 만듭니다.
+    """
+    from django.urls import reverse
+
+    data = {
+        'job_id': str(job.id),
+        'status': job.status,
+        'attempts': job.attempts,
+        'result_url': None,
+        'error': job.error_message or None,
+    }
+    if job.status == DiagnosisJob.STATUS_DONE and job.medical_history_id:
+        data['result_url'] = reverse('doctors:show_patients_history_result', kwargs={
+            'doctor_pk': job.doctor_id,
+            'patient_pk': job.medical_history.patient_id,
+            'history_pk': job.medical_history_id,
+        })
+    return data
+
+
+def requeue_stale_jobs() -> int:
+    """
+    워커가 비정상 종료되어 running 상태로 남은 작업을 다시 대기 상태로 돌립니다.
+    """
+    threshold = timezone.now() - timedelta(seconds=get_job_stale_seconds())
+    return DiagnosisJob.objects.filter(
+        status=DiagnosisJob.STATUS_RUNNING, started_at__lt=threshold
+    ).update(status=DiagnosisJob.STATUS_PENDING)
+
+
+def claim_job_batch(max_size: int, flush_seconds: float) -> List[DiagnosisJob]:
+    """
+    대기 작업을 최대 max_size개까지 running 상태로 선점합니다.
+    배치가 가득 차지 않았고 가장 오래된 작업이 아직 flush_seconds만큼 기다리지 않았다면,
+    추론 요청을 더 묶을 수 있도록 아무것도 선점하지 않고 빈 리스트를 반환합니다.
+    SKIP LOCKED를 사용하므로 여러 워커 프로세스가 같은 작업을 가져가지 않습니다.
+    """
+    with transaction.atomic():
+        jobs = list(DiagnosisJob.objects.select_for_update(skip_locked=True)
+                    .filter(status=DiagnosisJob.STATUS_PENDING)
+                    .order_by('created')[:max_size])
+        if not jobs:
+            return []
+        flush_at = jobs[0].created + timedelta(seconds=flush_seconds)
+        if len(jobs) < max_size and timezone.now() < flush_at:
+            return []
+
+        now = timezone.now()
+        for job in jobs:
+            job.status = DiagnosisJob.STATUS_RUNNING
+            job.attempts += 1
+            job.started_at = now
+            job.modified = now
+        DiagnosisJob.objects.bulk_update(jobs, ['status', 'attempts', 'started_at', 'modified'])
+    return jobs
+
+
+def claim_next_job() -> Optional[DiagnosisJob]:
+    """
+    가장 오래된 대기 작업 하나를 running 상태로 선점합니다.
+    """
+    jobs = claim_job_batch(max_size=1, flush_seconds=0)
+    return jobs[0] if jobs else None
+
+
+def load_job_images(job: DiagnosisJob) -> List:
+    """
+    저장된 작업 이미지를 파이프라인에서 사용하는 업로드 파일 형태로 다시 엽니다.
+    classify 응답의 left_eye 파일명과 비교할 수 있도록 이름은 저장 파일명(basename)을 사용합니다.
+    """
+    eye_images = []
+    for field_file in (job.eye_image_first, job.eye_image_second):
+        with field_file.open('rb') as f:
+            image = convert_to_inmemory_uploaded_file(BytesIO(f.read()))
+        image.name = os.path.basename(field_file.name)
+        eye_images.append(image)
+    return eye_images
+
+
+def finish_job(job: DiagnosisJob, medical_history=None, error: Optional[DiagnosisError] = None, retry=True):
+    """
+    처리 결과를 작업에 반영합니다. (저장은 호출하는 쪽에서 한다)
+    실패 시 최대 시도 횟수까지는 다시 대기 상태로 돌리고, 이후에는 failed로 기록합니다.
+    """
+    job.modified = timezone.now()
+    if error is None:
+        job.medical_history = medical_history
+        job.error_message = ''
+        job.status = DiagnosisJob.STATUS_DONE
+        job.finished_at = job.modified
+        return
+
+    job.error_message = error.message[:255]
+    if retry and job.attempts < get_job_max_attempts():
+        job.status = DiagnosisJob.STATUS_PENDING
+    else:
+        job.status = DiagnosisJob.STATUS_FAILED
+        job.finished_at = job.modified
+
+
+def run_job_batch(jobs: List[DiagnosisJob]) -> List[DiagnosisJob]:
+    """
+    선점한 작업들의 추론을 한 번에 요청하고, 결과를 환자별 진단 기록으로 저장합니다.
+    """
+    loaded_jobs, eye_image_sets = [], []
+    for job in jobs:
+        try:
+            eye_image_sets.append(load_job_images(job))
+            loaded_jobs.append(job)
+        except Exception as e:
+            print(f"진단 작업 {job.id} 이미지 로드 실패: {e}")
+            finish_job(job, error=DiagnosisError("업로드된 이미지를 읽을 수 없습니다."), retry=False)
+
+    try:
+        results = request_inference_batch(eye_image_sets) if loaded_jobs else []
+    except Exception as e:
+        print(f"진단 배치 추론 중 오류 발생: {e}")
+        results = [DiagnosisError("진단 처리 중 알 수 없는 오류가 발생했습니다.")] * len(loaded_jobs)
+
+    job_results = []
+    for job, result in zip(loaded_jobs, results):
+        if isinstance(result, DiagnosisError):
+            finish_job(job, error=result)
+            continue
+        job_results.append((job, result))
+
+    records = write_job_results(job_results)
+    if records and getattr(settings, 'DIAGNOSIS_DERIVATIVES_ON_UPLOAD', False):
+        generate_record_derivatives(records)
+
+    DiagnosisJob.objects.bulk_update(jobs, ['status', 'error_message', 'medical_history', 'finished_at',
+                                            'modified'])
+    return jobs
+
+
+def write_job_results(job_results: List) -> List[DiagnosisRecord]:
+    """
+    추론에 성공한 작업들을 하나의 writer로 모아 한 트랜잭션에서 일괄 저장하고, 저장된 기록을 반환합니다.
+    일괄 저장이 실패하면 작업마다 따로 다시 저장하여, 실제로 실패한 작업만 오류로 기록합니다.
+    (한 건 때문에 같은 배치의 정상 작업까지 재시도 횟수를 소진하지 않도록 한다.)
+    """
+    writer = DiagnosisRecordWriter()
+    job_records = []
+    for job, result in job_results:
+        try:
+            record = add_diagnosis_record(writer, job.doctor_id, job.reg_no, job.get_form(),
+                                          result['left_eye'], result['right_eye'], result['upload'])
+        except Exception as e:
+            print(f"진단 작업 {job.id} 결과 변환 실패: {e}")
+            finish_job(job, error=DiagnosisError("이미지 분석 결과가 올바르지 않습니다."))
+            continue
+        job_records.append((job, result, record))
+    if not job_records:
+        return []
+
+    try:
+        write_diagnosis_records(writer)
+    except DiagnosisError as e:
+        if len(job_records) == 1:
+            finish_job(job_records[0][0], error=e)
+            return []
+        print(f"진단 배치 저장 실패, 작업별로 다시 저장합니다: {len(job_records)}건")
+        records = []
+        for job, result, _ in job_records:
+            records += write_job_results([(job, result)])
+        return records
+
+    for job, _, record in job_records:
+        finish_job(job, medical_history=record.medical_history)
+    return writer.records
+
+
+def run_job(job: DiagnosisJob) -> DiagnosisJob:
+    """
+    선점한 작업 하나를 처리합니다.
+    """
+    return run_job_batch([job])[0]
+
+
+def process_pending_jobs(max_jobs: Optional[int] = None, flush_seconds: float = 0) -> int:
+    """
+    대기 작업이 없을 때까지(또는 max_jobs개까지) 배치 단위로 처리하고 처리 건수를 반환합니다.
+    """
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        max_size = get_batch_max_size()
+        if max_jobs is not None:
+            max_size = min(max_size, max_jobs - processed)
+        jobs = claim_job_batch(max_size, flush_seconds)
+        if not jobs:
+            break
+        run_job_batch(jobs)
+        processed += len(jobs)
+    return processed
+
+
+def worker_loop(poll_interval: float):
+    """
+    워커 프로세스 본체: 대기 작업을 배치로 처리하고, 없으면 잠시 쉰다.
+    배치가 덜 찼으면 DIAGNOSIS_BATCH_FLUSH_SECONDS 동안 작업이 더 모이기를 기다린다.
+    """
+    while True:
+        close_old_connections()
+        try:
+            processed = process_pending_jobs(flush_seconds=get_batch_flush_seconds())
+        except Exception as e:
+            print(f"진단 워커 오류: {e}")
+            processed = 0
+        # 추론 호출 메트릭을 /metrics에서 합산할 수 있도록 남긴다. (METRICS_FLUSH_INTERVAL마다 한 번)
+        metrics_registry.flush()
+        if not processed:
+            time.sleep(min(poll_interval, get_batch_flush_seconds()) or poll_interval)
+
+
+def run_worker_pool(processes: int, poll_interval: float):
+    """
+    processes개의 워커 프로세스를 띄우고, 종료된 프로세스는 다시 띄운다.
+    """
+    requeue_stale_jobs()
+    # fork 전에 부모의 DB 연결을 닫아 자식 프로세스가 연결을 공유하지 않도록 한다.
+    connections.close_all()
+
+    workers = {}
+    try:
+        while True:
+            for idx in range(processes):
+                worker = workers.get(idx)
+                if worker is None or not worker.is_alive():
+                    worker = multiprocessing.Process(target=worker_loop, args=(poll_interval,), daemon=True)
+                    worker.start()
+                    workers[idx] = worker
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers.values():
+            worker.terminate()
+        for worker in workers.values():
+            worker.join()
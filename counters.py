@@ -0,0 +1,119 @@
+"""
+의사별 환자 수, 환자별 방문 수 캐시 카운터
+목록 페이지마다 COUNT(*)를 실행하지 않도록 Django 캐시에 개수를 두고,
+생성/soft delete 시 증감(incr/decr)한다. 캐시에 값이 없으면 DB에서 세어 채운다.
+
+    - 개별 저장/삭제      : doctors.signals (post_init에서 읽어 둔 is_removed(_was_removed)와 비교, 추가 SELECT 없음)
+    - DiagnosisRecordWriter : 커밋 후 record_written으로 한 번에 증가
+    - reconcile_counters 커맨드 : DB 집계 값으로 전체 재설정 (주기 실행)
+
+값이 없는 키에 대한 증감은 무시하며, 다음 조회 때 DB에서 다시 센다.
+COUNTER_CACHE_TIMEOUT이 지나면 키가 만료되므로 놓친 증감도 그 안에 바로잡힌다.
+
+증감은 저장한 프로세스의 캐시에만 반영되므로, COUNTER_CACHE_ALIAS가 프로세스 로컬 백엔드(LocMemCache 등)이면
+카운터를 쓰지 않고 매번 DB에서 센다. (is_shared)
+"""
+from collections import Counter
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.db.models import Count
+
+from doctors.models import Doctor, MedicalHistory, Patient
+
+PATIENT_COUNT_KEY = 'counter:doctor_patients:{}'
+VISIT_COUNT_KEY = 'counter:patient_visits:{}'
+
+
+def get_cache():
+    from django.core.cache import caches
+    return caches[getattr(settings, 'COUNTER_CACHE_ALIAS', 'default')]
+
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared() -> bool:
+    """
+    웹 워커와 진단 워커 프로세스가 같은 카운터를 보는 캐시 백엔드인지 확인합니다.
+    """
+    alias = getattr(settings, 'COUNTER_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    return bool(backend) and backend not in LOCAL_CACHE_BACKENDS
+
+
+def get_timeout():
+    return getattr(settings, 'COUNTER_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_or_count(key: str, count) -> int:
+    if not is_shared():
+        return count()
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = count()
+        cache.add(key, value, timeout=get_timeout())
+    return value
+
+
+def get_patient_count(doctor_pk) -> int:
+    return get_or_count(PATIENT_COUNT_KEY.format(doctor_pk),
+                        lambda: Patient.available_objects.filter(doctor_id=doctor_pk).count())
+
+
+def get_visit_count(patient_pk) -> int:
+    return get_or_count(VISIT_COUNT_KEY.format(patient_pk),
+                        lambda: MedicalHistory.available_objects.filter(patient_id=patient_pk).count())
+
+
+def add_counts(key_format: str, deltas: Dict) -> None:
+    if not is_shared():
+        return
+    cache = get_cache()
+    for pk, delta in deltas.items():
+        if not pk or not delta:
+            continue
+        try:
+            cache.incr(key_format.format(pk), delta)
+        except ValueError:
+            # 캐시에 없는 키: 다음 조회 때 DB에서 센다.
+            pass
+
+
+def add_patient_count(doctor_pk, delta: int) -> None:
+    add_counts(PATIENT_COUNT_KEY, {doctor_pk: delta})
+
+
+def add_visit_count(patient_pk, delta: int) -> None:
+    add_counts(VISIT_COUNT_KEY, {patient_pk: delta})
+
+
+def record_written(new_patients: Iterable[Patient], records) -> None:
+    """
+    DiagnosisRecordWriter가 커밋한 새 환자/방문 기록 수만큼 카운터를 올립니다.
+    """
+    add_counts(PATIENT_COUNT_KEY, Counter(patient.doctor_id for patient in new_patients))
+    add_counts(VISIT_COUNT_KEY, Counter(record.patient.id for record in records))
+
+
+def reconcile_patient_counts() -> int:
+    counts = {PATIENT_COUNT_KEY.format(doctor_id): 0 for doctor_id in Doctor.objects.values_list('id', flat=True)}
+    for row in (Patient.available_objects.exclude(doctor_id=None).order_by().values('doctor_id')
+                .annotate(count=Count('id'))):
+        counts[PATIENT_COUNT_KEY.format(row['doctor_id'])] = row['count']
+    get_cache().set_many(counts, timeout=get_timeout())
+    return len(counts)
+
+
+def reconcile_visit_counts(patient_ids) -> int:
+    patient_ids = list(patient_ids)
+    counts = {VISIT_COUNT_KEY.format(patient_id): 0 for patient_id in patient_ids}
+    for row in (MedicalHistory.available_objects.filter(patient_id__in=patient_ids).order_by()
+                .values('patient_id').annotate(count=Count('id'))):
+        counts[VISIT_COUNT_KEY.format(row['patient_id'])] = row['count']
+    get_cache().set_many(counts, timeout=get_timeout())
+    return len(counts)
@@ -2,9 +2,21 @@ from datetime import datetime
 import re
 from urllib.parse import parse_qs
 
-from core.constants import NUM_ADJACENT
-from doctors.method import get_adjacent_pages, paginate_queryset
+from django.conf import settings
+from django.db.models import F, Q
+
+from core.constants import NUM_ADJACENT, VIEW_COUNT
+from doctors.method import (count_up_to, filter_queryset_by_range, get_adjacent_pages, get_custom_date_range,
+                            get_date_range, paginate_keyset, paginate_queryset)
 from doctors.models import MedicalHistory, Patient
+from doctors.name_index import filter_patients_by_name
+from doctors.patient_summary import DISEASE_FIELDS
+
+# 환자 목록 정렬 (?sort=) : PatientSummary의 인덱스 컬럼을 사용한다.
+PATIENT_SORTS = {
+    'last_visit': 'summary__last_visit_at',
+    'visit_count': 'summary__visit_count',
+}
 
 
 class QueryStringHelper:
@@ -17,6 +29,12 @@ class QueryStringHelper:
         self.num_page = None
         self.page_index = None
         self.adjacent_pages = None
+        self.next_cursor = None
+        self.prev_cursor = None
+        self.total_count = None
+        self.total_count_exact = True
+        self.sort_key = 'created'
+        self.sort_nullable = False
         '''
         {
             'search': ['fmdklasfml'],
@@ -40,7 +58,7 @@ class QueryStringHelper:
             return default
 
     def is_date(self, string):
-        date_formats = ["%Y-%m", "%Y-%m-%d"]
+        date_formats = ["%Y", "%Y-%m", "%Y-%m-%d"]
         for date_format in date_formats:
             try:
                 datetime.strptime(string, date_format)
@@ -49,6 +67,16 @@ class QueryStringHelper:
                 continue
         return False
 
+    def get_date_range(self, search):
+        """
+        ?search=(YYYY-MM-DD|YYYY-MM|YYYY) 또는 ?from=&to= 의 날짜 범위 [start, end)를 반환합니다.
+        """
+        if self.get('from') or self.get('to'):
+            return get_custom_date_range(self.get('from'), self.get('to'))
+        if search and self.is_date(search):
+            return get_date_range(search)
+        return None
+
     def is_name(self, string):
         return True
 
@@ -73,25 +101,77 @@ class QueryStringHelper:
     def search_controller(self, query_set):
         self.set_queryset(query_set)
         search = self.get('search')
-        if len(self.query_set) == 0:
+        if not self.query_set.exists():
             return self.query_set
 
-        if len(search) > 0:
-            if self.is_date(search) and self.patient_pk:
-                year, month = self.filter_queryset_searched_month(search)
-                self.query_set = self.query_set.filter(created__year=year, created__month=month,
-                                                       patient_id=self.patient_pk)
-            elif self.is_name(search) and self.doctor_pk:
-                self.query_set = self.query_set.filter(patient_info__name=search, doctor_id=self.doctor_pk)
+        date_range = self.get_date_range(search) if self.patient_pk else None
+        if date_range is not None:
+            start, end = date_range
+            self.query_set = filter_queryset_by_range(self.query_set.filter(patient_id=self.patient_pk), start, end)
+        elif len(search) > 0:
+            if self.is_name(search) and self.doctor_pk:
+                self.query_set = filter_patients_by_name(self.query_set.filter(doctor_id=self.doctor_pk), search,
+                                                         doctor_pk=self.doctor_pk)
         else:
             pass
         return self.query_set
 
-    def page_controller(self, query_set):
+    def sort_controller(self, query_set):
+        """
+        환자 목록의 ?sort=(last_visit|visit_count) 정렬과 ?disease=(amd|diabetic|...) 최근 진단 필터를 적용합니다.
+        """
         self.set_queryset(query_set)
-        if len(self.query_set) == 0:
+        disease = self.get('disease')
+        if disease in DISEASE_FIELDS:
+            self.query_set = self.query_set.filter(Q(**{f'summary__left_{disease}': True}) |
+                                                   Q(**{f'summary__right_{disease}': True}))
+        sort = self.get('sort')
+        if sort in PATIENT_SORTS:
+            # last_visit_at은 방문 기록이 모두 삭제된 환자에서 NULL이므로 NULL을 맨 뒤로 보낸다.
+            self.sort_key = 'sort_key'
+            self.sort_nullable = True
+            self.query_set = (self.query_set.filter(summary__isnull=False)
+                              .annotate(sort_key=F(PATIENT_SORTS[sort]))
+                              .order_by(F('sort_key').desc(nulls_last=True), '-id'))
+        return self.query_set
+
+    def has_filters(self):
+        return any(self.get(key) for key in ('search', 'from', 'to', 'sort', 'disease'))
+
+    def page_controller(self, query_set, count=None):
+        """
+        기본은 page 번호로 나눕니다. (템플릿이 cursor 링크를 그리지 않으므로)
+        PAGINATION_KEYSET이 켜져 있으면 전체 개수가 PAGINATION_EXACT_COUNT_LIMIT보다 많거나 cursor 파라미터가 있을 때
+        (created, id) keyset 방식으로 나눕니다.
+        count(캐시 카운터 값)가 주어지면 COUNT 쿼리를 실행하지 않습니다.
+        """
+        self.set_queryset(query_set)
+        if not getattr(settings, 'PAGINATION_KEYSET', False):
+            self.total_count = self.query_set.count() if count is None else count
+            self.total_count_exact = True
+            return self.paginate_by_page() if self.total_count else self.query_set
+
+        limit = getattr(settings, 'PAGINATION_EXACT_COUNT_LIMIT', 1000)
+        if count is None:
+            self.total_count, self.total_count_exact = count_up_to(self.query_set, limit)
+        else:
+            self.total_count, self.total_count_exact = count, True
+        if self.total_count == 0:
             return self.query_set
+
+        cursor = self.get('cursor')
+        if cursor or self.total_count > limit or not self.total_count_exact:
+            self.query_set, self.next_cursor, self.prev_cursor = paginate_keyset(
+                self.query_set, cursor, self.sort_key, self.sort_nullable)
+            self.num_page = None
+            self.page_index = list(range(1, VIEW_COUNT + 1))
+            self.adjacent_pages = []
+            return self.query_set
+        return self.paginate_by_page()
+
+    def paginate_by_page(self):
         request_page: int = self.get_int("page")
-        self.query_set, self.num_page, self.page_index = paginate_queryset(self.query_set, request_page)
+        self.query_set, self.num_page, self.page_index = paginate_queryset(self.query_set, request_page,
+                                                                           count=self.total_count)
         self.adjacent_pages: list = get_adjacent_pages(request_page, self.num_page, NUM_ADJACENT)
         return self.query_set
@@ -0,0 +1,137 @@
+"""
+안저/hitmap 이미지 전송
+결과 페이지 HTML에 base64로 이미지를 넣는 대신 이미지별 URL을 두고, 브라우저가 캐시할 수 있도록
+ETag / Last-Modified / Range / 장기 private 캐시 헤더를 붙여 응답한다.
+
+DIAGNOSIS_IMAGE_DELIVERY
+    'proxy'  : 앱 서버가 스토리지에서 읽어 직접 전송 (기본값)
+    'signed' : 스토리지가 발급하는 (서명된) URL로 리디렉트
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.utils.http import http_date, parse_http_date_safe
+
+# 이미지 종류 -> (히스토리에서 따라갈 관계 경로, 파일 필드)
+IMAGE_KINDS = {
+    'left': (('fundus_image_left',), 'left_image'),
+    'right': (('fundus_image_right',), 'right_image'),
+    'hit_left': (('fundus_image_left', 'fundus_hitmap_image_left'), 'hit_image_left'),
+    'hit_right': (('fundus_image_right', 'fundus_hitmap_image_right'), 'hit_image_right'),
+}
+
+# 저장된 이미지 파일은 UUID 이름으로 한 번 쓰이고 바뀌지 않으므로 오래 캐시해도 된다.
+IMAGE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_history_image(medical_history, kind: str):
+    """
+    히스토리 그래프에서 kind에 해당하는 (모델 인스턴스, FieldFile)을 반환합니다. 없으면 (None, None).
+    """
+    if kind not in IMAGE_KINDS:
+        return None, None
+    path, field_name = IMAGE_KINDS[kind]
+    instance = medical_history
+    for related_name in path:
+        instance = getattr(instance, related_name, None)
+        if instance is None or getattr(instance, 'is_removed', False):
+            return None, None
+    field_file = getattr(instance, field_name, None)
+    if not field_file:
+        return None, None
+    return instance, field_file
+
+
+def get_image_etag(field_file, last_modified) -> str:
+    digest = hashlib.md5(f"{field_file.name}:{last_modified.isoformat()}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def is_not_modified(request, etag: str, last_modified_ts: int) -> bool:
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified_ts <= if_modified_since
+
+
+def parse_range(range_header: str, size: int) -> Optional[tuple]:
+    """
+    단일 bytes range만 지원합니다. 범위를 만족할 수 없으면 ValueError.
+    """
+    match = RANGE_RE.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.group(1), match.group(2)
+    if start == '':
+        # bytes=-500 : 마지막 500바이트
+        length = min(int(end), size)
+        start, end = size - length, size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range Not Satisfiable')
+    return start, end
+
+
+def serve_image(request, instance, field_file):
+    """
+    이미지 파일을 캐시 헤더와 함께 응답합니다.
+    """
+    if getattr(settings, 'DIAGNOSIS_IMAGE_DELIVERY', 'proxy') == 'signed':
+        response = HttpResponseRedirect(field_file.url)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    last_modified = instance.modified
+    last_modified_ts = int(time.mktime(last_modified.timetuple()))
+    etag = get_image_etag(field_file, last_modified)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified_ts),
+        'Cache-Control': IMAGE_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+
+    if is_not_modified(request, etag, last_modified_ts):
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        size = field_file.size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            with field_file.open('rb') as f:
+                f.seek(start)
+                body = f.read(end - start + 1)
+            response = HttpResponse(body, status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            for key, value in headers.items():
+                response[key] = value
+            return response
+
+    response = FileResponse(field_file.open('rb'), content_type=content_type,
+                            filename=os.path.basename(field_file.name))
+    response['Content-Disposition'] = f'inline; filename="{os.path.basename(field_file.name)}"'
+    for key, value in headers.items():
+        response[key] = value
+    return response
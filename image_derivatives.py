@@ -0,0 +1,137 @@
+"""
+안저/hitmap 이미지 파생본(derivative) 생성
+원본마다 썸네일(thumbnail)과 화면용(screen) 크기의 WebP 이미지를 한 번 만들어 원본 옆에 저장하고,
+ImageDerivative 레지스트리로 찾는다. 파생본은 첫 요청 시 만들어지며(DIAGNOSIS_DERIVATIVES_ON_UPLOAD가
+켜져 있으면 진단 저장 직후), 기존 기록은 backfill_image_derivatives 커맨드로 채운다.
+"""
+import mimetypes
+import posixpath
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError
+from PIL import Image
+
+from doctors.models import (FundusHitmapImageLeft, FundusHitmapImageRight, FundusImageLeft, FundusImageRight,
+                            ImageDerivative)
+
+mimetypes.add_type('image/webp', '.webp')
+
+# 파생본 이름 -> 긴 변의 최대 픽셀
+DERIVATIVE_SIZES = {
+    ImageDerivative.VARIANT_THUMBNAIL: 256,
+    ImageDerivative.VARIANT_SCREEN: 1024,
+}
+VARIANT_ORIGINAL = 'original'
+DERIVATIVE_FORMAT = 'webp'
+DERIVATIVE_QUALITY = 85
+
+# (모델, 이미지 필드) : 백필 대상
+SOURCE_IMAGE_FIELDS = (
+    (FundusImageLeft, 'left_image'),
+    (FundusImageRight, 'right_image'),
+    (FundusHitmapImageLeft, 'hit_image_left'),
+    (FundusHitmapImageRight, 'hit_image_right'),
+)
+
+
+def pick_variant(size: Optional[str] = None, width: Optional[int] = None) -> str:
+    """
+    요청된 이름(size) 또는 표시 폭(width)에 맞는 가장 작은 파생본 이름을 반환합니다.
+    """
+    if size in DERIVATIVE_SIZES or size == VARIANT_ORIGINAL:
+        return size
+    if width:
+        for variant, max_side in sorted(DERIVATIVE_SIZES.items(), key=lambda item: item[1]):
+            if width <= max_side:
+                return variant
+    return VARIANT_ORIGINAL
+
+
+def get_derivative_name(source_name: str, variant: str) -> str:
+    dirname, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(dirname, 'derivatives', f'{stem}_{variant}.{DERIVATIVE_FORMAT}')
+
+
+def render_derivative(image: Image.Image, max_side: int):
+    resized = image.copy()
+    resized.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, format=DERIVATIVE_FORMAT.upper(), quality=DERIVATIVE_QUALITY, method=4)
+    return buffer.getvalue(), resized.size
+
+
+def generate_derivatives(field_file, variants: Optional[List[str]] = None) -> Dict[str, ImageDerivative]:
+    """
+    원본을 한 번 디코딩하여 아직 없는 파생본을 만들고 {variant: ImageDerivative}를 반환합니다.
+    """
+    variants = variants or list(DERIVATIVE_SIZES)
+    existing = {
+        derivative.variant: derivative
+        for derivative in ImageDerivative.objects.filter(source_name=field_file.name, variant__in=variants,
+                                                         format=DERIVATIVE_FORMAT)
+    }
+    missing = [variant for variant in variants if variant not in existing]
+    if not missing:
+        return existing
+
+    with field_file.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+
+    storage = field_file.storage
+    for variant in missing:
+        content, (width, height) = render_derivative(image, DERIVATIVE_SIZES[variant])
+        name = storage.save(get_derivative_name(field_file.name, variant), ContentFile(content))
+        try:
+            existing[variant] = ImageDerivative.objects.create(source_name=field_file.name, variant=variant,
+                                                               format=DERIVATIVE_FORMAT, file=name,
+                                                               width=width, height=height)
+        except IntegrityError:
+            # 다른 요청이 먼저 만든 경우
+            storage.delete(name)
+            existing[variant] = ImageDerivative.objects.get(source_name=field_file.name, variant=variant,
+                                                            format=DERIVATIVE_FORMAT)
+    return existing
+
+
+def get_derivative(field_file, variant: str) -> Optional[ImageDerivative]:
+    """
+    파생본을 찾고, 없으면 만들어서 반환합니다. 원본(original)이거나 생성에 실패하면 None.
+    """
+    if variant not in DERIVATIVE_SIZES:
+        return None
+    derivative = ImageDerivative.objects.filter(source_name=field_file.name, variant=variant,
+                                                format=DERIVATIVE_FORMAT).first()
+    if derivative is not None:
+        return derivative
+    try:
+        return generate_derivatives(field_file).get(variant)
+    except Exception as e:
+        print(f"이미지 파생본 생성 실패 {field_file.name}: {e}")
+        return None
+
+
+def generate_record_derivatives(records) -> int:
+    """
+    방금 저장된 진단 기록(DiagnosisRecord)들의 이미지 파생본을 만들고, 처리한 원본 이미지 수를 반환합니다.
+    """
+    processed = 0
+    for record in records:
+        for instance, field_name in ((record.fundus_image_left, 'left_image'),
+                                     (record.fundus_image_right, 'right_image'),
+                                     (record.fundus_hit_left, 'hit_image_left'),
+                                     (record.fundus_hit_right, 'hit_image_right')):
+            field_file = getattr(instance, field_name, None) if instance is not None else None
+            if not field_file:
+                continue
+            try:
+                generate_derivatives(field_file)
+                processed += 1
+            except Exception as e:
+                print(f"이미지 파생본 생성 실패 {field_file.name}: {e}")
+    return processed
@@ -0,0 +1,166 @@
+"""
+추론 결과 캐시
+같은 안저 사진이 다시 제출되면(폼 오류 후 재제출, 더블 클릭 등) classify/upload 호출을 건너뛴다.
+키는 두 이미지 bytes의 SHA-256과 모델 버전으로 만들고, 값에는 좌안 이미지 해시와 upload 응답
+(좌/우 예측, hitmap)을 저장한다.
+
+INFERENCE_CACHE_BACKEND
+    'local'  : 프로세스 내 LRU + TTL (기본값)
+    'django' : settings.CACHES의 공유 캐시 (INFERENCE_CACHE_ALIAS)
+    'none'   : 캐시 사용 안 함
+"""
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+
+def hash_image(image) -> str:
+    """
+    업로드 파일 내용의 SHA-256을 반환합니다.
+    """
+    digest = hashlib.sha256()
+    image.seek(0)
+    for chunk in image.chunks():
+        digest.update(chunk)
+    image.seek(0)
+    return digest.hexdigest()
+
+
+class BaseInferenceCache(ABC):
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.counter_lock = threading.Lock()
+
+    def make_key(self, image_hashes: List[str]) -> str:
+        # 업로드 순서와 무관하게 같은 사진 쌍이면 같은 키가 되도록 정렬한다.
+        model_version = getattr(settings, 'INFERENCE_MODEL_VERSION', '')
+        return f"inference:{model_version}:{':'.join(sorted(image_hashes))}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self.get_value(key)
+        with self.counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict):
+        self.set_value(key, value)
+
+    @abstractmethod
+    def get_value(self, key) -> Optional[Dict]:
+        """
+        캐시된 값을 반환합니다. 없거나 만료되었으면 None.
+        """
+
+    @abstractmethod
+    def set_value(self, key, value: Dict):
+        """
+        값을 ttl초 동안 저장합니다.
+        """
+
+    def get_metrics(self) -> Dict:
+        with self.counter_lock:
+            total = self.hits + self.misses
+            return {
+                'backend': self.__class__.__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class LocalInferenceCache(BaseInferenceCache):
+    """
+    프로세스 내 LRU 캐시 (max_entries 초과 시 가장 오래 사용하지 않은 항목부터 제거)
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get_value(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set_value(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_metrics(self) -> Dict:
+        metrics = super().get_metrics()
+        with self.lock:
+            metrics.update({'size': len(self.entries), 'max_entries': self.max_entries,
+                            'evictions': self.evictions})
+        return metrics
+
+
+class DjangoInferenceCache(BaseInferenceCache):
+    """
+    여러 워커가 공유하는 Django 캐시 백엔드 (크기 제한과 축출은 백엔드 설정을 따른다)
+    """
+
+    def __init__(self, ttl: int, alias: str):
+        super().__init__(ttl)
+        self.alias = alias
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get_value(self, key):
+        return self.cache.get(key)
+
+    def set_value(self, key, value):
+        self.cache.set(key, value, timeout=self.ttl)
+
+
+class NullInferenceCache(BaseInferenceCache):
+    def get_value(self, key):
+        return None
+
+    def set_value(self, key, value):
+        pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_inference_cache() -> BaseInferenceCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            backend = getattr(settings, 'INFERENCE_CACHE_BACKEND', 'local')
+            ttl = getattr(settings, 'INFERENCE_CACHE_TTL', 60 * 60)
+            if backend == 'django':
+                _cache = DjangoInferenceCache(ttl, getattr(settings, 'INFERENCE_CACHE_ALIAS', 'default'))
+            elif backend == 'none':
+                _cache = NullInferenceCache(ttl)
+            else:
+                _cache = LocalInferenceCache(ttl, getattr(settings, 'INFERENCE_CACHE_MAX_ENTRIES', 128))
+        return _cache
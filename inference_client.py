@@ -0,0 +1,226 @@
+"""
+추론 서버(CLASSIFY_URL / UPLOAD_URL) 호출용 HTTP 클라이언트
+프로세스 단위로 keep-alive 커넥션 풀을 공유하고, 엔드포인트별 connect/read timeout과
+지터(jitter)가 들어간 제한된 재시도를 적용한다. 풀 사용량과 지연 시간은 get_metrics()로 확인한다.
+"""
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from core.metrics import observe_inference
+
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class InferenceServiceError(Exception):
+    """
+    재시도 후에도 추론 서버 호출이 실패했을 때 발생합니다.
+    """
+
+    def __init__(self, endpoint, message):
+        super().__init__(f"[{endpoint}] {message}")
+        self.endpoint = endpoint
+
+
+class InferenceEndpoint:
+    def __init__(self, name, url, connect_timeout, read_timeout, idempotent=True):
+        self.name = name
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # 추론 서버는 같은 입력에 같은 결과를 돌려주므로 read timeout / 5xx 재시도가 안전하다.
+        self.idempotent = idempotent
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+
+def get_inference_endpoints() -> Dict[str, InferenceEndpoint]:
+    connect_timeout = getattr(settings, 'INFERENCE_CONNECT_TIMEOUT', 3.0)
+    endpoints = {
+        'classify': InferenceEndpoint('classify', settings.CLASSIFY_URL, connect_timeout,
+                                      getattr(settings, 'INFERENCE_CLASSIFY_READ_TIMEOUT', 30.0)),
+        'upload': InferenceEndpoint('upload', settings.UPLOAD_URL, connect_timeout,
+                                    getattr(settings, 'INFERENCE_UPLOAD_READ_TIMEOUT', 60.0)),
+    }
+    # 배치 엔드포인트는 추론 서버가 지원하는 경우에만 설정한다.
+    batch_read_timeout = getattr(settings, 'INFERENCE_BATCH_READ_TIMEOUT', 120.0)
+    if getattr(settings, 'CLASSIFY_BATCH_URL', None) and getattr(settings, 'UPLOAD_BATCH_URL', None):
+        endpoints['classify_batch'] = InferenceEndpoint('classify_batch', settings.CLASSIFY_BATCH_URL,
+                                                        connect_timeout, batch_read_timeout)
+        endpoints['upload_batch'] = InferenceEndpoint('upload_batch', settings.UPLOAD_BATCH_URL,
+                                                      connect_timeout, batch_read_timeout)
+    return endpoints
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.latency_ms_total = 0
+        self.latency_ms_max = 0
+
+    def observe(self, latency_ms):
+        self.latency_ms_total += latency_ms
+        self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+
+    def as_dict(self):
+        attempts = self.successes + self.failures + self.retries
+        return {
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'retries': self.retries,
+            'timeouts': self.timeouts,
+            'latency_ms_total': self.latency_ms_total,
+            'latency_ms_avg': int(self.latency_ms_total / attempts) if attempts else 0,
+            'latency_ms_max': self.latency_ms_max,
+        }
+
+
+class InferenceClient:
+    def __init__(self, endpoints: Optional[Dict[str, InferenceEndpoint]] = None):
+        self.endpoints = endpoints or get_inference_endpoints()
+        self.max_retries = getattr(settings, 'INFERENCE_MAX_RETRIES', 2)
+        self.backoff_base = getattr(settings, 'INFERENCE_BACKOFF_BASE', 0.2)
+        self.backoff_max = getattr(settings, 'INFERENCE_BACKOFF_MAX', 2.0)
+        self.adapter = HTTPAdapter(
+            pool_connections=len(self.endpoints),
+            pool_maxsize=getattr(settings, 'INFERENCE_POOL_MAXSIZE', 10),
+            max_retries=0,
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.stats = {name: EndpointStats() for name in self.endpoints}
+        self.lock = threading.Lock()
+
+    def supports_batch(self) -> bool:
+        return 'classify_batch' in self.endpoints and 'upload_batch' in self.endpoints
+
+    def get_backoff(self, attempt) -> float:
+        # full jitter: 0 ~ min(max, base * 2^attempt)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def is_retryable(self, endpoint: InferenceEndpoint, error=None, status_code=None) -> bool:
+        if isinstance(error, requests.ConnectTimeout):
+            # 연결 자체가 되지 않았으므로 요청이 전달되지 않았다.
+            return True
+        if not endpoint.idempotent:
+            return False
+        if error is not None:
+            return isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return status_code in RETRY_STATUS_CODES
+
+    def post(self, endpoint_name: str, files: Dict) -> Dict:
+        """
+        multipart 요청을 보내고 JSON 응답을 반환합니다.
+        재시도 시 같은 내용을 다시 보낼 수 있도록 파일 내용은 미리 bytes로 읽어 둡니다.
+        """
+        endpoint = self.endpoints[endpoint_name]
+        files = materialize_files(files)
+        stats = self.stats[endpoint_name]
+        with self.lock:
+            stats.requests += 1
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            error, status_code = None, None
+            try:
+                response = self.session.post(endpoint.url, files=files, timeout=endpoint.timeout)
+                status_code = response.status_code
+                response.raise_for_status()
+                data = response.json()
+            except (requests.RequestException, ValueError) as e:
+                error = e
+            latency_ms = int((time.monotonic() - started) * 1000)
+
+            if error is None:
+                with self.lock:
+                    stats.successes += 1
+                    stats.observe(latency_ms)
+                observe_inference(endpoint_name, 'success', latency_ms)
+                return data
+
+            retryable = attempt < self.max_retries and (
+                self.is_retryable(endpoint, status_code=status_code)
+                if isinstance(error, requests.HTTPError) else self.is_retryable(endpoint, error=error)
+            )
+            with self.lock:
+                stats.observe(latency_ms)
+                if isinstance(error, requests.Timeout):
+                    stats.timeouts += 1
+                if retryable:
+                    stats.retries += 1
+                else:
+                    stats.failures += 1
+            observe_inference(endpoint_name, 'retry' if retryable else 'failure', latency_ms)
+            if not retryable:
+                raise InferenceServiceError(endpoint_name, str(error))
+
+            time.sleep(self.get_backoff(attempt))
+            attempt += 1
+
+    def get_pool_metrics(self) -> Dict:
+        pools = {}
+        manager = self.adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests,
+                'idle_connections': pool.pool.qsize() if pool.pool is not None else 0,
+                'maxsize': pool.pool.maxsize if pool.pool is not None else 0,
+            }
+        return pools
+
+    def get_metrics(self) -> Dict:
+        with self.lock:
+            endpoints = {name: stats.as_dict() for name, stats in self.stats.items()}
+        return {'endpoints': endpoints, 'pools': self.get_pool_metrics()}
+
+
+def materialize_files(files: Dict) -> Dict:
+    """
+    파일 객체(UploadedFile 등)를 (이름, bytes, content_type) 튜플로 변환합니다.
+    """
+    materialized = {}
+    for key, value in files.items():
+        if value is None or isinstance(value, tuple):
+            materialized[key] = value
+            continue
+        value.seek(0)
+        materialized[key] = (os.path.basename(value.name), value.read(),
+                             getattr(value, 'content_type', None) or 'application/octet-stream')
+    return materialized
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_inference_client() -> InferenceClient:
+    """
+    프로세스 전역 클라이언트를 반환합니다.
+    워커 풀처럼 fork된 프로세스에서는 부모의 소켓을 공유하지 않도록 새로 만든다.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = InferenceClient()
+            _client_pid = os.getpid()
+        return _client
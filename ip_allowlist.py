@@ -0,0 +1,123 @@
+"""
+IPWhitelistMiddleware용 허용 IP 목록
+AllowedIP.ip_address(단일 IPv4/IPv6 주소 또는 CIDR 대역)를 정렬된 정수 구간으로 컴파일해 프로세스 메모리에 두고,
+bisect로 O(log n) 조회한다.
+
+무효화
+    - AllowedIP 저장/삭제 시그널이 캐시의 버전 키를 올리고, 각 워커는 IP_ALLOWLIST_VERSION_CHECK_INTERVAL초마다
+      버전을 확인하여 바뀌었으면 다시 읽는다. (워커 간 공유 캐시 필요)
+    - 공유 캐시가 없거나 버전 키가 유실돼도 IP_ALLOWLIST_TTL초가 지나면 다시 읽는다.
+"""
+import bisect
+import ipaddress
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import AllowedIP
+
+VERSION_KEY = 'ip_allowlist:version'
+
+
+def get_cache():
+    from django.core.cache import caches
+    return caches[getattr(settings, 'IP_ALLOWLIST_CACHE_ALIAS', 'default')]
+
+
+class CompiledAllowlist:
+    """
+    IP 버전별로 겹치거나 이어지는 대역을 합친 [start, end] 정수 구간 목록
+    """
+
+    def __init__(self, entries: Iterable[str]):
+        ranges = {4: [], 6: []}
+        self.invalid = []
+        for entry in entries:
+            try:
+                network = ipaddress.ip_network((entry or '').strip(), strict=False)
+            except ValueError:
+                self.invalid.append(entry)
+                continue
+            ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+        self.intervals = {version: self.merge(items) for version, items in ranges.items()}
+        self.starts = {version: [start for start, _ in items] for version, items in self.intervals.items()}
+
+    @staticmethod
+    def merge(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def __contains__(self, ip: Optional[str]) -> bool:
+        try:
+            address = ipaddress.ip_address((ip or '').strip())
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        value = int(address)
+        index = bisect.bisect_right(self.starts[address.version], value) - 1
+        return index >= 0 and value <= self.intervals[address.version][index][1]
+
+    def __len__(self):
+        return sum(len(items) for items in self.intervals.values())
+
+
+class AllowlistHolder:
+    def __init__(self):
+        self.allowlist: Optional[CompiledAllowlist] = None
+        self.version = None
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> CompiledAllowlist:
+        now = time.monotonic()
+        ttl = getattr(settings, 'IP_ALLOWLIST_TTL', 60)
+        check_interval = getattr(settings, 'IP_ALLOWLIST_VERSION_CHECK_INTERVAL', 1.0)
+        if self.allowlist is not None and now - self.loaded_at < ttl and now - self.checked_at < check_interval:
+            return self.allowlist
+
+        with self.lock:
+            version = get_cache().get(VERSION_KEY)
+            self.checked_at = now
+            if self.allowlist is None or version != self.version or now - self.loaded_at >= ttl:
+                try:
+                    entries = list(AllowedIP.objects.values_list('ip_address', flat=True))
+                except Exception as e:
+                    if self.allowlist is None:
+                        raise
+                    # DB 오류 시 이전 목록을 계속 사용한다.
+                    print(f'허용 IP 목록 갱신 실패: {e}')
+                    return self.allowlist
+                allowlist = CompiledAllowlist(entries)
+                if allowlist.invalid:
+                    print(f'허용 IP 형식 오류: {allowlist.invalid}')
+                self.allowlist, self.version, self.loaded_at = allowlist, version, now
+        return self.allowlist
+
+
+holder = AllowlistHolder()
+
+
+def is_allowed_ip(ip: Optional[str]) -> bool:
+    return ip in holder.get()
+
+
+def bump_version():
+    get_cache().set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+@receiver([post_save, post_delete], sender=AllowedIP)
+def invalidate_allowlist(sender, **kwargs):
+    bump_version()
+    # 같은 프로세스는 다음 요청에서 바로 다시 읽는다.
+    holder.checked_at = 0.0
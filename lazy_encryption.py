@@ -0,0 +1,175 @@
+"""
+암호화 필드 지연 복호화
+encrypted_fields의 필드는 DB에서 행을 읽을 때(from_db_value) 바로 복호화한다. 목록/엑스포트에서 성별이나 개수만
+필요해도 모든 행의 이름, 생년월일을 복호화하게 되므로, 아래 필드는 암호문을 EncryptedValue로 감싸 두었다가
+속성을 실제로 읽을 때 한 번만 복호화하고 인스턴스에 평문을 저장(memoize)한다.
+
+    - 변경하지 않은 값은 저장 시 다시 암호화하지 않고 기존 암호문을 그대로 쓴다.
+    - values()/values_list()로 읽은 값은 EncryptedValue이며 str()로 복호화된다.
+    - 짝이 되는 SearchField는 LazySearchField를 써야 name/age 속성도 평문을 돌려준다.
+    - 요청별 복호화 횟수는 DecryptStatsMiddleware가 contextvar로 집계한다.
+"""
+import contextvars
+import threading
+from typing import Iterable
+
+from django.db.models.query_utils import DeferredAttribute
+from encrypted_fields.fields import (EncryptedCharField, EncryptedDateField, SearchField, SearchFieldDescriptor,
+                                     is_hashed_already)
+
+# 요청 단위 복호화 횟수 (DecryptStatsMiddleware가 요청마다 새 dict로 설정)
+_request_stats = contextvars.ContextVar('decrypt_stats', default=None)
+
+
+class DecryptTotals:
+    def __init__(self):
+        self.decrypts = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def add(self, decrypts: int):
+        with self.lock:
+            self.decrypts += decrypts
+            self.requests += 1
+
+    def get_metrics(self):
+        with self.lock:
+            return {
+                'decrypts': self.decrypts,
+                'requests': self.requests,
+                'decrypts_per_request': round(self.decrypts / self.requests, 2) if self.requests else 0.0,
+            }
+
+
+totals = DecryptTotals()
+
+
+def start_request_stats():
+    return _request_stats.set({'decrypts': 0})
+
+
+def finish_request_stats(token) -> int:
+    stats = _request_stats.get()
+    _request_stats.reset(token)
+    decrypts = stats['decrypts'] if stats else 0
+    totals.add(decrypts)
+    return decrypts
+
+
+def count_decrypt():
+    stats = _request_stats.get()
+    if stats is not None:
+        stats['decrypts'] += 1
+
+
+class EncryptedValue:
+    """
+    아직 복호화하지 않은 암호문
+    """
+    __slots__ = ('ciphertext', 'field')
+
+    def __init__(self, ciphertext, field):
+        self.ciphertext = ciphertext
+        self.field = field
+
+    def decrypt(self):
+        return self.field.decrypt_value(self.ciphertext)
+
+    def __str__(self):
+        return str(self.decrypt())
+
+    def __repr__(self):
+        return f'<EncryptedValue {self.field.name}>'
+
+
+class LazyDecryptAttribute(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, EncryptedValue):
+            value = value.decrypt()
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # 데이터 디스크립터여야 instance.__dict__의 EncryptedValue가 __get__을 가리지 않는다.
+        instance.__dict__[self.field.attname] = value
+
+
+class LazyDecryptMixin:
+    descriptor_class = LazyDecryptAttribute
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return EncryptedValue(bytes(value), self)
+
+    def decrypt_value(self, ciphertext):
+        count_decrypt()
+        return super().from_db_value(ciphertext, None, None)
+
+    def pre_save(self, model_instance, add):
+        # 디스크립터를 거치지 않아 저장만으로는 복호화되지 않게 한다.
+        return model_instance.__dict__.get(self.attname)
+
+    def get_db_prep_save(self, value, connection):
+        if isinstance(value, EncryptedValue):
+            # 바뀌지 않은 값: 기존 암호문을 그대로 저장
+            return value.ciphertext
+        return super().get_db_prep_save(value, connection)
+
+    def to_python(self, value):
+        if isinstance(value, EncryptedValue):
+            value = value.decrypt()
+        return super().to_python(value)
+
+
+class LazyEncryptedCharField(LazyDecryptMixin, EncryptedCharField):
+    pass
+
+
+class LazyEncryptedDateField(LazyDecryptMixin, EncryptedDateField):
+    pass
+
+
+class LazySearchFieldDescriptor(SearchFieldDescriptor):
+    """
+    SearchFieldDescriptor는 암호화 필드 값을 instance.__dict__에서 바로 읽으므로,
+    암호화 필드의 디스크립터(getattr)를 거쳐 복호화된 평문을 읽게 한다.
+    """
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        self.__set__(instance, getattr(instance, self.field.encrypted_field_name))
+        return instance.__dict__[self.field.name]
+
+
+class LazySearchField(SearchField):
+    descriptor_class = LazySearchFieldDescriptor
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if is_hashed_already(value) and \
+                isinstance(model_instance.__dict__.get(self.encrypted_field_name), EncryptedValue):
+            # 암호화 필드가 바뀌지 않았으면 DB에서 읽은 해시를 그대로 저장한다. (복호화 없음)
+            return value
+        return super().pre_save(model_instance, add)
+
+
+def decrypt_fields(instances: Iterable, field_names: Iterable[str]) -> int:
+    """
+    화면에 보일 인스턴스(현재 페이지)의 지정 필드만 한 번에 복호화해 두고, 복호화한 값의 수를 반환합니다.
+    이미 복호화되었거나 지연 로딩(defer)된 필드는 건너뜁니다.
+    """
+    field_names = list(field_names)
+    decrypted = 0
+    for instance in instances:
+        if instance is None:
+            continue
+        for field_name in field_names:
+            value = instance.__dict__.get(field_name)
+            if isinstance(value, EncryptedValue):
+                instance.__dict__[field_name] = value.decrypt()
+                decrypted += 1
+    return decrypted
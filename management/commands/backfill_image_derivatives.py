@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from doctors.image_derivatives import DERIVATIVE_FORMAT, DERIVATIVE_SIZES, SOURCE_IMAGE_FIELDS, generate_derivatives
+from doctors.models import ImageDerivative
+
+
+class Command(BaseCommand):
+    help = '기존 안저/hitmap 이미지의 썸네일, 화면용 파생본을 생성합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=None, help='처리할 최대 원본 이미지 수')
+
+    def handle(self, *args, **options):
+        processed, failed = 0, 0
+        limit = options['limit']
+        for model, field_name in SOURCE_IMAGE_FIELDS:
+            queryset = (model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                        .order_by('pk'))
+            for instance in queryset.iterator(chunk_size=options['batch_size']):
+                if limit is not None and processed >= limit:
+                    break
+                field_file = getattr(instance, field_name)
+                done = ImageDerivative.objects.filter(source_name=field_file.name, format=DERIVATIVE_FORMAT).count()
+                if done >= len(DERIVATIVE_SIZES):
+                    continue
+                try:
+                    generate_derivatives(field_file)
+                    processed += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{model.__name__}({instance.pk}) {field_file.name}: {e}')
+            self.stdout.write(f'{model.__name__} 완료')
+
+        self.stdout.write(self.style.SUCCESS(f'{processed}개 이미지 처리, {failed}개 실패'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from doctors.models import PatientInfo
+from doctors.name_index import index_patient_names
+
+
+class Command(BaseCommand):
+    help = '기존 환자 이름의 prefix/초성 검색 토큰을 생성합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        patient_infos = PatientInfo.available_objects.select_related('patient').order_by('pk')
+        indexed, tokens, batch = 0, 0, []
+        for patient_info in patient_infos.iterator(chunk_size=batch_size):
+            batch.append((patient_info.patient_id, patient_info.patient.doctor_id, patient_info.name))
+            if len(batch) >= batch_size:
+                tokens += index_patient_names(batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            tokens += index_patient_names(batch)
+            indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'{indexed}명 환자 이름 색인, 토큰 {tokens}개'))
@@ -0,0 +1,72 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from doctors.method import filter_queryset_by_range, get_date_range
+from doctors.models import MedicalHistory, Patient
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = '방문 기록 날짜 검색(EXTRACT 방식과 반열린 구간 방식)의 실행 계획과 소요 시간을 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=200)
+        parser.add_argument('--histories', type=int, default=500, help='환자당 방문 기록 수')
+        parser.add_argument('--search', default='2023-06')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--keep', action='store_true', help='생성한 데이터를 지우지 않음')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                patient = self.seed(options['patients'], options['histories'])
+                self.compare(patient, options['search'], options['repeat'])
+                if not options['keep']:
+                    raise Rollback()
+        except Rollback:
+            self.stdout.write('생성한 데이터를 롤백했습니다.')
+
+    def seed(self, num_patients, num_histories):
+        started = datetime(2020, 1, 1)
+        span = int(timedelta(days=365 * 4).total_seconds())
+        patients = [Patient(patient_reg_no=f'bench-{random.getrandbits(64):016x}') for _ in range(num_patients)]
+        Patient.objects.bulk_create(patients)
+        for patient in patients:
+            MedicalHistory.objects.bulk_create(
+                [MedicalHistory(patient_id=patient.id, created=started + timedelta(seconds=random.randrange(span)))
+                 for _ in range(num_histories)],
+                batch_size=1000,
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {MedicalHistory._meta.db_table}')
+        self.stdout.write(f'환자 {num_patients}명, 방문 기록 {num_patients * num_histories}건 생성')
+        return patients[len(patients) // 2]
+
+    def compare(self, patient, search, repeat):
+        start, end = get_date_range(search)
+        histories = MedicalHistory.objects.filter(patient_id=patient.id)
+        queries = {
+            'extract (created__year/created__month)': histories.filter(created__year=start.year,
+                                                                       created__month=start.month),
+            'range (created >= start AND created < end)': filter_queryset_by_range(histories, start, end),
+        }
+        for label, queryset in queries.items():
+            elapsed = []
+            for _ in range(repeat):
+                began = time.perf_counter()
+                list(queryset.values_list('id', flat=True))
+                elapsed.append(time.perf_counter() - began)
+            elapsed.sort()
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(f'median {elapsed[len(elapsed) // 2] * 1000:.2f}ms, '
+                              f'min {elapsed[0] * 1000:.2f}ms ({repeat}회)\n')
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.request_log_retention import (drop_archive_tables_before, get_oldest_log_time, get_retention_cutoff,
+                                        retire_day, rollup_hours)
+
+
+class Command(BaseCommand):
+    help = ('보존 기간이 지난 요청 로그를 시간별 집계 후 날짜별 보관 테이블로 옮기거나 삭제합니다. (매일 실행)\n'
+            '배치마다 트랜잭션을 나누므로 운영 중에 실행해도 됩니다.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'REQUEST_LOG_RETENTION_DAYS', 30))
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'REQUEST_LOG_PRUNE_BATCH_SIZE', 1000))
+        parser.add_argument('--max-batches', type=int, default=None, help='하루치당 최대 배치 수 (미지정 시 제한 없음)')
+        parser.add_argument('--archive', dest='archive', action='store_true',
+                            default=getattr(settings, 'REQUEST_LOG_ARCHIVE', True))
+        parser.add_argument('--no-archive', dest='archive', action='store_false', help='보관 없이 삭제')
+        parser.add_argument('--archive-days', type=int,
+                            default=getattr(settings, 'REQUEST_LOG_ARCHIVE_RETENTION_DAYS', 365))
+
+    def handle(self, *args, **options):
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        # --days가 설정보다 짧아도 이미 옮기기 시작한 날짜의 집계를 덮어쓰지 않도록 둘 중 늦은 시각을 기준으로 한다.
+        cutoff = get_retention_cutoff(options['days'])
+        retired_before = max(cutoff, get_retention_cutoff())
+
+        oldest = get_oldest_log_time()
+        total = 0
+        if oldest is not None and oldest < cutoff:
+            day = oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+            while day < cutoff:
+                # 원본을 옮기기 전에 그날의 집계를 먼저 만든다. (이미 집계가 있는 시간대는 그대로 둔다.)
+                rollup_hours(day, day + timedelta(days=1), retired_before)
+                moved, done = retire_day(day, options['archive'], options['batch_size'], options['max_batches'])
+                total += moved
+                self.stdout.write(f'{day:%Y-%m-%d}: {moved}건 {"보관" if options["archive"] else "삭제"}'
+                                  f'{"" if done else " (남은 로그 있음)"}')
+                day += timedelta(days=1)
+
+        dropped = drop_archive_tables_before(today - timedelta(days=options['archive_days']))
+        self.stdout.write(self.style.SUCCESS(f'{cutoff:%Y-%m-%d} 이전 로그 {total}건 처리, 보관 테이블 {len(dropped)}개 삭제'))
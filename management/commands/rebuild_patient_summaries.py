@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from doctors.models import Patient
+from doctors.patient_summary import refresh_patient_summaries
+
+
+class Command(BaseCommand):
+    help = '환자 요약(PatientSummary)을 방문 히스토리에서 다시 계산합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--doctor', default=None, help='특정 의사(doctor_pk)의 환자만 재계산')
+
+    def handle(self, *args, **options):
+        patients = Patient.all_objects.order_by('pk')
+        if options['doctor']:
+            patients = patients.filter(doctor_id=options['doctor'])
+
+        batch_size = options['batch_size']
+        processed, batch = 0, []
+        for patient_id in patients.values_list('id', flat=True).iterator(chunk_size=batch_size):
+            batch.append(patient_id)
+            if len(batch) >= batch_size:
+                processed += refresh_patient_summaries(batch)
+                batch = []
+        if batch:
+            processed += refresh_patient_summaries(batch)
+        self.stdout.write(self.style.SUCCESS(f'{processed}명 환자 요약 재계산 완료'))
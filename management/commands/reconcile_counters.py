@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from doctors.counters import reconcile_patient_counts, reconcile_visit_counts
+from doctors.models import Patient
+
+
+class Command(BaseCommand):
+    help = '의사별 환자 수, 환자별 방문 수 캐시 카운터를 DB 집계 값으로 다시 설정합니다. (주기 실행)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        doctors = reconcile_patient_counts()
+
+        batch_size = options['batch_size']
+        patients, batch = 0, []
+        for patient_id in Patient.available_objects.order_by('pk').values_list('id', flat=True) \
+                .iterator(chunk_size=batch_size):
+            batch.append(patient_id)
+            if len(batch) >= batch_size:
+                patients += reconcile_visit_counts(batch)
+                batch = []
+        if batch:
+            patients += reconcile_visit_counts(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'의사 {doctors}명, 환자 {patients}명 카운터 재설정'))
@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.request_log_retention import floor_hour, rollup_hours
+
+
+class Command(BaseCommand):
+    help = '요청 로그(RequestLogger)를 시간별로 집계하여 RequestLogRollup에 저장합니다. (매시 실행)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=2, help='현재 시각 이전 몇 시간을 다시 집계할지')
+
+    def handle(self, *args, **options):
+        # 진행 중인 현재 시간대는 제외하고, 늦게 저장된 로그를 반영하도록 직전 몇 시간을 다시 집계한다.
+        # 보존 기간이 지난 시간대는 집계가 없을 때만 만든다. (rollup_hour)
+        end = floor_hour(datetime.now())
+        start = end - timedelta(hours=options['hours'])
+        hours, rows = rollup_hours(start, end)
+        self.stdout.write(self.style.SUCCESS(f'{start:%Y-%m-%d %H}시부터 {hours}시간, 집계 {rows}행 저장'))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from doctors.background import process_pending_jobs, run_worker_pool
+
+
+class Command(BaseCommand):
+    help = '대기 중인 진단 작업(DiagnosisJob)을 처리하는 워커 프로세스 풀을 실행합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=getattr(settings, 'DIAGNOSIS_WORKER_PROCESSES', 2))
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'DIAGNOSIS_WORKER_POLL_INTERVAL', 1.0))
+        parser.add_argument('--once', action='store_true', help='대기 작업을 한 번 처리하고 종료합니다.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = process_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f'{processed}건의 진단 작업을 처리했습니다.'))
+            return
+
+        self.stdout.write(f"진단 워커 {options['processes']}개를 실행합니다.")
+        run_worker_pool(options['processes'], options['poll_interval'])
@@ -1,16 +1,22 @@
 import random
 import string
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from datetime import date, datetime
 
 from config.settings import APP_ENV
 from doctors.models import PatientInfo
+from doctors.name_index import filter_patients_by_name
 from datetime import datetime, timedelta
 from django.db import models
 from core.constants import VIEW_COUNT
 from django.core.paginator import Paginator, EmptyPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+import base64
+import binascii
+import uuid
 
 
 def get_test_doctor(test_account):
@@ -130,12 +136,18 @@ def random_date(start_date: str, end_date: str) -> date:
 
 
 def search_patients(patients: models.QuerySet, search: str) -> models.QuerySet:
-    search_queryset = patients.filter(patient_info__name=search)
+    """
+    이름 완전 일치, 앞부분 일치(홍길), 초성(ㅎㄱㄷ) 검색 (doctors.name_index)
+    """
+    search_queryset = filter_patients_by_name(patients, search)
     return search_queryset
 
 
-def paginate_queryset(queryset: models.QuerySet, request_page: int) -> Tuple:
+def paginate_queryset(queryset: models.QuerySet, request_page: int, count: Optional[int] = None) -> Tuple:
     paginator = Paginator(queryset, VIEW_COUNT)
+    if count is not None:
+        # 이미 센 값이 있으면 Paginator가 COUNT를 다시 실행하지 않도록 한다.
+        paginator.count = count
     try:
         page = paginator.page(request_page)
     except EmptyPage:
@@ -165,8 +177,183 @@ def get_adjacent_pages(current_page: int, last_page: int, num_adjacent: int) ->
 
 
 def filter_queryset_by_date(date_string, histories: models.QuerySet) -> models.QuerySet:
-    date_obj = datetime.strptime(date_string, "%Y-%m-%d").date()
-    year = date_obj.year
-    month = date_obj.month
-    histories = histories.filter(created__year=year, created__month=month)
+    date_obj = datetime.strptime(date_string, "%Y-%m-%d")
+    start = date_obj.replace(day=1)
+    histories = filter_queryset_by_range(histories, start, add_months(start, 1))
+    return histories
+
+
+# 검색 문자열 형식 -> 범위 단위
+DATE_SEARCH_FORMATS = (
+    ("%Y-%m-%d", 'day'),
+    ("%Y-%m", 'month'),
+    ("%Y", 'year'),
+)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    month_index = value.month - 1 + months
+    return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1)
+
+
+def parse_date(date_string: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(date_string, "%Y-%m-%d")
+    except (ValueError, TypeError):
+        return None
+
+
+def get_date_range(date_string: str) -> Optional[Tuple[datetime, datetime]]:
+    """
+    날짜 검색어를 반열린 구간 [start, end)로 바꿉니다.
+    2024-03-05 -> 그날 하루, 2024-03 -> 그 달, 2024 -> 그 해. 형식이 맞지 않으면 None.
+    """
+    for date_format, unit in DATE_SEARCH_FORMATS:
+        try:
+            start = datetime.strptime(date_string, date_format)
+        except (ValueError, TypeError):
+            continue
+        if unit == 'day':
+            return start, start + timedelta(days=1)
+        if unit == 'month':
+            return start, add_months(start, 1)
+        return start, start.replace(year=start.year + 1)
+    return None
+
+
+def get_custom_date_range(date_from: str, date_to: str) -> Optional[Tuple[Optional[datetime], Optional[datetime]]]:
+    """
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD (양 끝 날짜 포함)를 [start, end)로 바꿉니다. 둘 다 없거나 잘못되면 None.
+    """
+    start, end = parse_date(date_from), parse_date(date_to)
+    if end is not None:
+        end += timedelta(days=1)
+    if start is None and end is None:
+        return None
+    return start, end
+
+
+def filter_queryset_by_range(histories: models.QuerySet, start: Optional[datetime],
+                             end: Optional[datetime]) -> models.QuerySet:
+    """
+    created >= start AND created < end 로 거릅니다. EXTRACT(year/month)와 달리
+    (patient, is_removed, created) 인덱스의 범위 조회를 그대로 쓸 수 있습니다.
+    """
+    if start is not None:
+        histories = histories.filter(created__gte=start)
+    if end is not None:
+        histories = histories.filter(created__lt=end)
     return histories
+
+
+CURSOR_NEXT = 'n'
+CURSOR_PREV = 'p'
+
+
+def count_up_to(queryset: models.QuerySet, limit: int) -> Tuple[int, bool]:
+    """
+    최대 limit + 1개까지만 세어 (개수, 정확한 값인지)를 반환합니다.
+    limit을 넘으면 (limit, False)를 반환하여 대량 데이터에서 전체 COUNT를 피합니다.
+    """
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, False
+    return count, True
+
+
+def encode_cursor_value(value) -> str:
+    if value is None:
+        return "n"
+    if isinstance(value, datetime):
+        return f"d{value.isoformat()}"
+    return f"i{int(value)}"
+
+
+def decode_cursor_value(value: str):
+    if value == 'n':
+        return None
+    if value.startswith('d'):
+        parsed = parse_datetime(value[1:])
+        if parsed is None:
+            raise ValueError(value)
+        return parsed
+    if value.startswith('i'):
+        return int(value[1:])
+    raise ValueError(value)
+
+
+def encode_cursor(obj, direction: str, key: str = 'created') -> str:
+    raw = f"{encode_cursor_value(getattr(obj, key))}|{obj.id}|{direction}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple]:
+    """
+    커서를 (정렬 키 값, id, direction)으로 복원합니다. 올바르지 않은 커서면 None.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk, direction = raw.split('|')
+        value = decode_cursor_value(value)
+        pk = uuid.UUID(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREV):
+        return None
+    return value, pk, direction
+
+
+def get_keyset_filter(key: str, value, pk, direction: str, nullable: bool = False) -> Q:
+    """
+    (key DESC NULLS LAST, id DESC) 순서에서 커서 뒤(next) 또는 앞(prev)에 있는 행의 조건
+    NOT NULL 키에는 isnull 조건을 붙이지 않아야 (key, id) 인덱스 범위 조회가 된다.
+    """
+    if direction == CURSOR_NEXT:
+        if value is None:
+            return Q(**{f'{key}__isnull': True, 'id__lt': pk})
+        keyset_filter = Q(**{f'{key}__lt': value}) | Q(**{key: value, 'id__lt': pk})
+        return keyset_filter | Q(**{f'{key}__isnull': True}) if nullable else keyset_filter
+    if value is None:
+        return Q(**{f'{key}__isnull': False}) | Q(**{f'{key}__isnull': True, 'id__gt': pk})
+    return Q(**{f'{key}__gt': value}) | Q(**{key: value, 'id__gt': pk})
+
+
+def paginate_keyset(queryset: models.QuerySet, cursor: str = "", key: str = 'created',
+                    nullable: bool = False) -> Tuple:
+    """
+    (key, id) 내림차순 keyset 페이지네이션. OFFSET 없이 커서 위치부터 VIEW_COUNT + 1개만 읽어 다음 페이지 존재 여부를
+    판단합니다. key가 NULL일 수 있으면 nullable=True로 호출하며, NULL인 행은 마지막에 옵니다.
+    (NOT NULL 키는 NULLS LAST 없이 정렬해야 created 인덱스를 역순으로 읽을 수 있다.)
+    (object_list, next_cursor, prev_cursor)를 반환합니다.
+    """
+    if nullable:
+        descending = (models.F(key).desc(nulls_last=True), '-id')
+        ascending = (models.F(key).asc(nulls_first=True), 'id')
+    else:
+        descending, ascending = (f'-{key}', '-id'), (key, 'id')
+
+    position = decode_cursor(cursor) if cursor else None
+    if position is None:
+        rows = list(queryset.order_by(*descending)[:VIEW_COUNT + 1])
+        has_more = len(rows) > VIEW_COUNT
+        rows = rows[:VIEW_COUNT]
+        next_cursor = encode_cursor(rows[-1], CURSOR_NEXT, key) if has_more else None
+        return rows, next_cursor, None
+
+    value, pk, direction = position
+    if value is None and not nullable:
+        return paginate_keyset(queryset, "", key)
+    keyset_filter = get_keyset_filter(key, value, pk, direction, nullable)
+    if direction == CURSOR_NEXT:
+        rows = list(queryset.filter(keyset_filter).order_by(*descending)[:VIEW_COUNT + 1])
+        has_more = len(rows) > VIEW_COUNT
+        rows = rows[:VIEW_COUNT]
+        next_cursor = encode_cursor(rows[-1], CURSOR_NEXT, key) if has_more else None
+        prev_cursor = encode_cursor(rows[0], CURSOR_PREV, key) if rows else None
+    else:
+        rows = list(queryset.filter(keyset_filter).order_by(*ascending)[:VIEW_COUNT + 1])
+        has_more = len(rows) > VIEW_COUNT
+        rows = rows[:VIEW_COUNT][::-1]
+        next_cursor = encode_cursor(rows[-1], CURSOR_NEXT, key) if rows else None
+        prev_cursor = encode_cursor(rows[0], CURSOR_PREV, key) if has_more else None
+    return rows, next_cursor, prev_cursor
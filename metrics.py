@@ -0,0 +1,260 @@
+"""
+프로세스 내 메트릭 레지스트리와 Prometheus 텍스트 포맷 출력
+    - 요청 지연 시간 히스토그램 / 응답 코드 카운터 (URL 이름 기준, 경로의 UUID가 라벨에 들어가지 않게 한다)
+    - 요청당 DB 쿼리 수 히스토그램
+    - 추론 서버 호출 지연 시간 히스토그램 (doctors.inference_client)
+    - 기존 get_metrics() 값 (결과 캐시, 추론 캐시, 추론 클라이언트 엔드포인트/커넥션 풀, 복호화 수, 요청 로그 writer)
+
+여러 워커 프로세스 (METRICS_MULTIPROC_DIR, 기본값 <임시 디렉터리>/doctoreye_metrics)
+    각 프로세스(웹 워커, 진단 워커)가 METRICS_FLUSH_INTERVAL초마다 자기 값을 <dir>/metrics_<pid>.json에
+    원자적으로 덮어쓰고, /metrics를 받은 프로세스가 모든 파일을 합산해 내려준다. 종료된 프로세스의 파일도
+    합산하므로 (카운터가 줄어들지 않게) 배포 시 디렉터리를 비운다. 빈 값이면 현재 프로세스 값만 내려준다.
+"""
+import atexit
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+PREFIX = 'doctoreye_'
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+DEFAULT_MULTIPROC_DIR = os.path.join(tempfile.gettempdir(), 'doctoreye_metrics')
+
+# 이름: (타입, 설명)
+METRICS = {
+    'http_request_duration_ms': ('histogram', 'Request latency by URL name in milliseconds'),
+    'http_responses_total': ('counter', 'Responses by URL name and status code'),
+    'http_db_queries': ('histogram', 'Database queries per request by URL name'),
+    'inference_duration_ms': ('histogram', 'Inference service call latency (per attempt) in milliseconds'),
+    'inference_calls_total': ('counter', 'Inference service call attempts by endpoint and outcome'),
+}
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def make_key(name: str, labels: Optional[Dict]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.counters: Dict[Key, float] = {}
+        self.histograms: Dict[Key, Dict] = {}
+        self.lock = threading.Lock()
+        self.flushed_at = 0.0
+
+    def inc(self, name: str, labels: Optional[Dict] = None, value: float = 1):
+        key = make_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: Optional[Dict], value: float, buckets: Iterable = LATENCY_BUCKETS_MS):
+        key = make_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                buckets = list(buckets)
+                histogram = self.histograms[key] = {'le': buckets, 'buckets': [0] * (len(buckets) + 1),
+                                                    'sum': 0, 'count': 0}
+            index = next((i for i, bound in enumerate(histogram['le']) if value <= bound), len(histogram['le']))
+            histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, dict(labels), dict(histogram, buckets=list(histogram['buckets']))]
+                               for (name, labels), histogram in self.histograms.items()],
+                'sources': [[name, dict(labels), value] for name, labels, value in collect_sources()],
+            }
+
+    def flush(self, force: bool = False):
+        """
+        멀티프로세스 모드에서 현재 프로세스 값을 파일로 씁니다. 요청 처리 중에는 METRICS_FLUSH_INTERVAL초에 한 번만 씁니다.
+        """
+        directory = get_multiproc_dir()
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0):
+            return
+        self.flushed_at = now
+        path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+        temp_path = f'{path}.tmp'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f'metrics flush 실패: {e}')
+
+
+registry = MetricsRegistry()
+
+
+def get_multiproc_dir() -> Optional[str]:
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', DEFAULT_MULTIPROC_DIR) or None
+
+
+def observe_request(view_name: str, method: str, status_code: int, duration_ms: float, query_count: int):
+    labels = {'view': view_name, 'method': method}
+    registry.observe('http_request_duration_ms', labels, duration_ms)
+    registry.observe('http_db_queries', {'view': view_name}, query_count, QUERY_COUNT_BUCKETS)
+    registry.inc('http_responses_total', dict(labels, status=status_code))
+    registry.flush()
+
+
+def observe_inference(endpoint: str, outcome: str, duration_ms: float):
+    registry.observe('inference_duration_ms', {'endpoint': endpoint}, duration_ms)
+    registry.inc('inference_calls_total', {'endpoint': endpoint, 'outcome': outcome})
+    registry.flush()
+
+
+def collect_sources() -> List[Tuple[str, Dict, float]]:
+    """
+    모듈별 get_metrics() 중 프로세스 간 합산할 수 있는 값(누적 횟수, 큐 길이)만 모읍니다.
+    아직 만들어지지 않은 싱글턴(추론 클라이언트, 요청 로그 writer)은 만들지 않습니다.
+    """
+    values = []
+    try:
+        from core.lazy_encryption import totals
+        decrypt = totals.get_metrics()
+        values += [('decrypts_total', {}, decrypt['decrypts']),
+                   ('decrypt_tracked_requests_total', {}, decrypt['requests'])]
+
+        from core import request_log_writer
+        if request_log_writer._writer is not None and request_log_writer._writer_pid == os.getpid():
+            writer = request_log_writer._writer.get_metrics()
+            values += [(f'request_log_{key}_total', {}, writer[key])
+                       for key in ('enqueued', 'written', 'dropped', 'sampled_out', 'errors')]
+            values.append(('request_log_queue_size', {}, writer['queue_size']))
+
+        from doctors.result_cache import stats
+        result_cache = stats.get_metrics()
+        values += [('result_cache_hits_total', {}, result_cache['hits']),
+                   ('result_cache_misses_total', {}, result_cache['misses']),
+                   ('result_cache_build_ms_total', {}, result_cache['build_ms_total'])]
+
+        from doctors import inference_cache
+        if inference_cache._cache is not None:
+            cache = inference_cache._cache.get_metrics()
+            labels = {'backend': cache['backend']}
+            values += [('inference_cache_hits_total', labels, cache['hits']),
+                       ('inference_cache_misses_total', labels, cache['misses'])]
+
+        from doctors import inference_client
+        if inference_client._client is not None and inference_client._client_pid == os.getpid():
+            client = inference_client._client.get_metrics()
+            for endpoint, endpoint_stats in client['endpoints'].items():
+                values += [(f'inference_{key}_total', {'endpoint': endpoint}, endpoint_stats[key])
+                           for key in ('requests', 'successes', 'failures', 'retries', 'timeouts')]
+                values.append(('inference_latency_ms_total', {'endpoint': endpoint},
+                               endpoint_stats['latency_ms_total']))
+            # latency_ms_max는 프로세스 간에 합칠 수 없으므로 내보내지 않는다. (inference_duration_ms 히스토그램 참고)
+            for pool, pool_stats in client['pools'].items():
+                labels = {'pool': pool}
+                values += [('inference_pool_connections_opened_total', labels, pool_stats['connections_opened']),
+                           ('inference_pool_requests_sent_total', labels, pool_stats['requests_sent']),
+                           ('inference_pool_idle_connections', labels, pool_stats['idle_connections'])]
+    except Exception as e:
+        print(f'metrics source 수집 실패: {e}')
+    return values
+
+
+def load_snapshots() -> List[Dict]:
+    directory = get_multiproc_dir()
+    if not directory:
+        return [registry.snapshot()]
+    registry.flush(force=True)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            # 다른 프로세스가 쓰는 중이거나 손상된 파일은 이번 수집에서 건너뛴다.
+            continue
+    return snapshots
+
+
+def merge_snapshots(snapshots: Iterable[Dict]) -> Tuple[Dict, Dict, Dict]:
+    counters, histograms, sources = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', []):
+            key = make_key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot.get('sources', []):
+            key = make_key(name, labels)
+            sources[key] = sources.get(key, 0) + value
+        for name, labels, histogram in snapshot.get('histograms', []):
+            key = make_key(name, labels)
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = dict(histogram, buckets=list(histogram['buckets']))
+                continue
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    return counters, histograms, sources
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{escape_label_value(v)}"' for k, v in labels) + '}'
+
+
+def format_value(value) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus() -> str:
+    counters, histograms, sources = merge_snapshots(load_snapshots())
+    lines = []
+    written_headers = set()
+
+    def header(name, metric_type, description):
+        if name not in written_headers:
+            written_headers.add(name)
+            lines.append(f'# HELP {PREFIX}{name} {description}')
+            lines.append(f'# TYPE {PREFIX}{name} {metric_type}')
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, *METRICS.get(name, ('counter', name)))
+        lines.append(f'{PREFIX}{name}{format_labels(labels)} {format_value(value)}')
+
+    for (name, labels), histogram in sorted(histograms.items()):
+        header(name, *METRICS.get(name, ('histogram', name)))
+        cumulative = 0
+        for bound, count in zip(list(histogram['le']) + [math.inf], histogram['buckets']):
+            cumulative += count
+            bucket_labels = labels + (('le', format_value(bound)),)
+            lines.append(f'{PREFIX}{name}_bucket{format_labels(bucket_labels)} {cumulative}')
+        lines.append(f'{PREFIX}{name}_sum{format_labels(labels)} {format_value(histogram["sum"])}')
+        lines.append(f'{PREFIX}{name}_count{format_labels(labels)} {histogram["count"]}')
+
+    for (name, labels), value in sorted(sources.items()):
+        header(name, 'counter' if name.endswith('_total') else 'gauge', name.replace('_', ' '))
+        lines.append(f'{PREFIX}{name}{format_labels(labels)} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# multiprocessing 자식 프로세스는 atexit를 실행하지 않으므로 진단 워커는 worker_loop에서 따로 flush한다.
+atexit.register(registry.flush, True)
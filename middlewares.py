@@ -2,66 +2,159 @@ from django.contrib import messages
 from django.urls import reverse
 from django.utils.deprecation import MiddlewareMixin
 from django.shortcuts import redirect, render
-from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidden
-from core.models import AllowedIP
+from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidden, HttpResponseNotFound
+from core.ip_allowlist import is_allowed_ip
 from users.forms import LoginForm
 
 
 # For healthcheck(server)
 class HealthCheckMiddleware:
+    """
+    /health: 의존성 확인 없이 ok를 반환합니다. (liveness)
+    /ready: core.readiness의 의존성 확인 결과(JSON). 하나라도 실패하면 503 (readiness)
+    /metrics: core.metrics의 Prometheus 텍스트 (METRICS_ENABLED, Bearer METRICS_TOKEN 필요. 토큰이 없으면 404)
+    """
     def __init__(self, get_response):
+        from django.conf import settings
         self.get_response = get_response
+        self.metrics_enabled = getattr(settings, 'METRICS_ENABLED', True)
+        self.metrics_token = getattr(settings, 'METRICS_TOKEN', '')
 
     def __call__(self, request):
         if request.path == '/health':
             return HttpResponse('ok')
+        if request.path == '/ready':
+            return self.ready()
+        if request.path == '/metrics' and self.metrics_enabled:
+            # IP 허용 목록보다 먼저 처리하므로 토큰 없이는 열지 않는다.
+            if not self.metrics_token:
+                return HttpResponseNotFound()
+            return self.metrics(request)
         return self.get_response(request)
 
+    def ready(self):
+        from django.http import JsonResponse
+        from core.readiness import get_readiness
+        result = get_readiness()
+        return JsonResponse(result, status=200 if result['status'] == 'ok' else 503)
+
+    def metrics(self, request):
+        import hmac
+        from core.metrics import render_prometheus
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(authorization, f'Bearer {self.metrics_token}'):
+            return HttpResponseForbidden()
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    """
+    요청 지연 시간, 응답 코드, DB 쿼리 수를 URL 이름별로 core.metrics에 기록합니다.
+    URL이 매칭되지 않은 요청(404 등)은 'unresolved'로 묶습니다.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        import time
+        from django.db import connection
+        from core.metrics import observe_request
+
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.monotonic()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration_ms = (time.monotonic() - started) * 1000
+
+        try:
+            resolver_match = getattr(request, 'resolver_match', None)
+            view_name = (resolver_match.view_name if resolver_match else '') or 'unresolved'
+            observe_request(view_name, request.method, response.status_code, duration_ms, queries[0])
+        except Exception as e:
+            print(f'metrics exception : {e}')
+        return response
+
+
+class DecryptStatsMiddleware:
+    """
+    요청마다 암호화 필드 복호화 횟수를 집계합니다. (core.lazy_encryption)
+    DECRYPT_STATS_HEADER가 켜져 있으면 X-Decrypt-Count 헤더로 내려줍니다.
+    """
+    def __init__(self, get_response):
+        from django.conf import settings
+        self.get_response = get_response
+        self.add_header = getattr(settings, 'DECRYPT_STATS_HEADER', False)
+
+    def __call__(self, request):
+        from core.lazy_encryption import finish_request_stats, start_request_stats
+        token = start_request_stats()
+        try:
+            response = self.get_response(request)
+        finally:
+            decrypts = finish_request_stats(token)
+        if self.add_header:
+            response['X-Decrypt-Count'] = str(decrypts)
+        return response
+
 
 class RequestLoggerMiddleware:
+    """
+    요청/응답 로그를 RequestLogger에 남깁니다.
+    저장은 core.request_log_writer의 백그라운드 스레드가 일괄(bulk_create)로 처리하고,
+    본문은 REQUEST_LOG_BODY_CONTENT_TYPES 형식만 REQUEST_LOG_MAX_BODY 글자까지 기록합니다.
+    """
     def __init__(self, get_response):
+        from django.conf import settings
         self.get_response = get_response
-        self.prefixs = ['/admin', ]
+        self.prefixs = getattr(settings, 'REQUEST_LOG_EXCLUDED_PREFIXES', ['/admin', '/static/', '/media/'])
+        self.max_body = getattr(settings, 'REQUEST_LOG_MAX_BODY', 4096)
+        self.body_content_types = getattr(settings, 'REQUEST_LOG_BODY_CONTENT_TYPES',
+                                          ['application/json', 'text/plain', 'application/x-www-form-urlencoded'])
+        self.use_async = getattr(settings, 'REQUEST_LOG_ASYNC', True)
+
+    def is_excluded(self, request):
+        return any(request.path.startswith(prefix) for prefix in self.prefixs) or request.path.endswith('.ico')
 
     def __call__(self, request):
         import time
+        # 제외 경로는 로그 없이 뷰를 한 번만 실행한다.
+        if self.is_excluded(request):
+            return self.get_response(request)
+
         _t = time.time()  # Calculated execution time.
         response = self.get_response(request)  # Get response from view function.
         _t = int((time.time() - _t) * 1000)
 
-        # todo : If prefix needed how describing this
-        if any(request.path.startswith(prefix) for prefix in self.prefixs) or \
-                request.path.startswith('/static/') or request.path.endswith('.ico'):
-            return self.get_response(request)
-        # Create instance of our model and assign values
-        from core.models import RequestLogger
-        req_b = ''
-        try:
-            req_b = request.body.decode()
-            if req_b == '':
-                req_body = req_b
-            else:
-                from urllib.parse import parse_qs
-                req_body = parse_qs(req_b)
-
-        except Exception as e:
-            print(f'e : {e}')
-            req_body = str(f'e : {e}, raw : {req_b}')
         try:
-            res_body = response.content.decode()
+            request_log = self.build_request_log(request, response, _t)
         except Exception as e:
-            print(f'response exception : {e}')
-            res_body = e
-        session_key = request.session.session_key
+            print(f'request log exception : {e}')
+            return response
+
+        if self.use_async:
+            from core.request_log_writer import get_request_log_writer
+            get_request_log_writer().enqueue(request_log)
+        else:
+            request_log.save()
+        return response
+
+    def build_request_log(self, request, response, exec_time):
+        # Create instance of our model and assign values
+        from core.models import RequestLogger
         request_log = RequestLogger(
             endpoint=request.get_full_path(),
             response_code=response.status_code,
             method=request.method,
             remote_address=self.get_client_ip(request),
-            exec_time=_t,
-            body_response=res_body,
-            body_request=req_body,
-            session_key=session_key
+            exec_time=exec_time,
+            body_response=self.get_response_body(response),
+            body_request=self.get_request_body(request),
+            session_key=request.session.session_key if hasattr(request, 'session') else None
         )
         try:
             # Assign user to log if it's not an anonymous user
@@ -69,10 +162,42 @@ class RequestLoggerMiddleware:
                 request_log.user = request.user
         except Exception as e:
             print(f'user type exception : {e}')
+        return request_log
 
-        # Save log in db
-        request_log.save()
-        return response
+    def is_loggable_content_type(self, content_type):
+        content_type = (content_type or '').split(';')[0].strip().lower()
+        return content_type in self.body_content_types
+
+    def truncate(self, body):
+        if len(body) > self.max_body:
+            return f'{body[:self.max_body]}... ({len(body)} chars truncated)'
+        return body
+
+    def get_request_body(self, request):
+        content_type = request.META.get('CONTENT_TYPE', '')
+        if not self.is_loggable_content_type(content_type):
+            length = request.META.get('CONTENT_LENGTH') or 0
+            return f'<{content_type or "no content-type"} {length} bytes omitted>' if length else ''
+        try:
+            req_b = self.truncate(request.body.decode())
+        except Exception as e:
+            return f'e : {e}'
+        if req_b == '' or not content_type.startswith('application/x-www-form-urlencoded'):
+            return req_b
+        from urllib.parse import parse_qs
+        return parse_qs(req_b)
+
+    def get_response_body(self, response):
+        content_type = response.get('Content-Type', '')
+        if getattr(response, 'streaming', False):
+            return f'<streaming {content_type}>'
+        if not self.is_loggable_content_type(content_type):
+            return f'<{content_type} {len(response.content)} bytes omitted>'
+        try:
+            return self.truncate(response.content.decode())
+        except Exception as e:
+            print(f'response exception : {e}')
+            return str(e)
 
     # get clients ip address
     def get_client_ip(self, request):
@@ -89,6 +214,7 @@ class RedirectAllErrorsMiddleware(MiddlewareMixin):
     400~599 모든 오류 발생 시 자동으로 'main' 페이지로 리디렉트하는 미들웨어
     오류 메시지는 Django messages에 추가
     단, DEBUG=True일 때는 미들웨어가 동작하지 않도록 예외 처리
+    JSON 응답(진단 작업 등록/상태 조회, 배치 진단, 환자 조회 등 fetch 엔드포인트)은 상태 코드를 그대로 둔다.
     """
 
     def process_response(self, request, response):
@@ -97,9 +223,11 @@ class RedirectAllErrorsMiddleware(MiddlewareMixin):
         if settings.DEBUG:
             return response
 
-        # API 요청("/api/")은 예외 처리
+        # API 요청("/api/")과 JSON 응답은 예외 처리
         if request.path.startswith("/api/"):
             return response
+        if response.get('Content-Type', '').startswith('application/json'):
+            return response
 
         # 400~599 에러 발생 시 리디렉트
         if 400 <= response.status_code < 600:
@@ -116,10 +244,9 @@ class IPWhitelistMiddleware:
 
     def __call__(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        client_ip = x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
-        allowed_ips = AllowedIP.objects.values_list('ip_address', flat=True)
-        print(f'client_ip : {client_ip}')
-        if client_ip not in allowed_ips:
+        client_ip = x_forwarded_for.split(',')[0].strip() if x_forwarded_for else request.META.get('REMOTE_ADDR')
+        # 허용 목록은 프로세스 메모리에 컴파일해 두고 AllowedIP 변경 시에만 다시 읽는다. (core.ip_allowlist)
+        if not is_allowed_ip(client_ip):
             request.session.flush()  # 세션 강제 종료
             path = request.path
             form = LoginForm()
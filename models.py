@@ -1,12 +1,29 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
-from encrypted_fields.fields import EncryptedCharField, SearchField, EncryptedDateField
+from encrypted_fields.fields import EncryptedCharField
 from model_utils.models import SoftDeletableModel, TimeStampedModel, UUIDModel
+from core.lazy_encryption import LazyEncryptedCharField, LazyEncryptedDateField, LazySearchField
 from core.constants import CLASS_NAME_DISEASES, DANGER_LEVEL, GENDER_CHOICE
 from core.utils import mask_korean_name, Disease
 
 
+def get_disease_field_values(disease_type):
+    """
+    예측 결과(단일 값 또는 리스트)를 DiseaseLeft/Right의 질병별 '0'/'1' 필드 값으로 변환합니다.
+    """
+    field_values = {disease: '0' for disease in CLASS_NAME_DISEASES}
+
+    if isinstance(disease_type, list):
+        for item in disease_type:
+            if item in CLASS_NAME_DISEASES:
+                field_values[item] = '1'
+    else:
+        if disease_type in CLASS_NAME_DISEASES:
+            field_values[disease_type] = '1'
+    return field_values
+
+
 class Doctor(SoftDeletableModel, TimeStampedModel, UUIDModel):
     user = models.OneToOneField(get_user_model(), on_delete=models.CASCADE, related_name='doctor')
 
@@ -21,8 +38,8 @@ class Doctor(SoftDeletableModel, TimeStampedModel, UUIDModel):
 
 class DoctorInfo(SoftDeletableModel, TimeStampedModel, UUIDModel):
     doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, related_name='doctor_info')
-    _name = EncryptedCharField(max_length=100)
-    name = SearchField(hash_key=settings.ENC_FIELD_KEY, encrypted_field_name="_name")
+    _name = LazyEncryptedCharField(max_length=100)
+    name = LazySearchField(hash_key=settings.ENC_FIELD_KEY, encrypted_field_name="_name")
 
     class Meta:
         ordering = ['-created']
@@ -34,6 +51,11 @@ class Patient(SoftDeletableModel, TimeStampedModel, UUIDModel):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            # 진단 폼 등록번호 자동완성 (LIKE 'prefix%'). opclasses는 PostgreSQL에서만 적용된다.
+            models.Index(fields=['patient_reg_no'], name='patient_reg_no_prefix_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
         verbose_name = '환자 정보'
         verbose_name_plural = '환자 정보'
 
@@ -49,11 +71,11 @@ class Patient(SoftDeletableModel, TimeStampedModel, UUIDModel):
 
 
 class PatientInfo(SoftDeletableModel, TimeStampedModel, UUIDModel):
-    _name = EncryptedCharField(max_length=100)
-    name = SearchField(hash_key=settings.ENC_FIELD_KEY, encrypted_field_name="_name")
+    _name = LazyEncryptedCharField(max_length=100)
+    name = LazySearchField(hash_key=settings.ENC_FIELD_KEY, encrypted_field_name="_name")
     gender = models.CharField(choices=GENDER_CHOICE, max_length=1)
-    _age = EncryptedDateField()
-    age = SearchField(hash_key=settings.ENC_FIELD_KEY, encrypted_field_name="_age")
+    _age = LazyEncryptedDateField()
+    age = LazySearchField(hash_key=settings.ENC_FIELD_KEY, encrypted_field_name="_age")
     # 추가 필요: 형식논의 필요: null=True, blank=True 임시로 해놓음!
     patient = models.OneToOneField(Patient, on_delete=models.CASCADE, related_name='patient_info')
 
@@ -79,6 +101,10 @@ class MedicalHistory(SoftDeletableModel, TimeStampedModel, UUIDModel):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            # 환자별 방문 기록 목록/날짜 범위 검색 (patient_id = ? AND is_removed = false AND created >= ? AND created < ?)
+            models.Index(fields=['patient', 'is_removed', 'created'], name='history_patient_created_idx'),
+        ]
         verbose_name = '환자 방문 히스토리'
         verbose_name_plural = '환자 방문 히스토리'
 
@@ -148,20 +174,10 @@ class DiseaseLeft(SoftDeletableModel, TimeStampedModel):
 
     @classmethod
     def get_or_create_with_condition(cls, fundus_left_id, disease_type):
-        field_values = {disease: '0' for disease in CLASS_NAME_DISEASES}
-
-        if isinstance(disease_type, list):
-            for item in disease_type:
-                if item in CLASS_NAME_DISEASES:
-                    field_values[item] = '1'
-        else:
-            if disease_type in CLASS_NAME_DISEASES:
-                field_values[disease_type] = '1'
-
         return cls.available_objects.get_or_create(
             fundus_left_id=fundus_left_id,
             defaults={},
-            **field_values
+            **get_disease_field_values(disease_type)
         )
 
     def get_field_with_value_1(self):
@@ -191,20 +207,10 @@ class DiseaseRight(SoftDeletableModel, TimeStampedModel):
 
     @classmethod
     def get_or_create_with_condition(cls, fundus_right_id, disease_type):
-        field_values = {disease: '0' for disease in CLASS_NAME_DISEASES}
-
-        if isinstance(disease_type, list):
-            for item in disease_type:
-                if item in CLASS_NAME_DISEASES:
-                    field_values[item] = '1'
-        else:
-            if disease_type in CLASS_NAME_DISEASES:
-                field_values[disease_type] = '1'
-
         return cls.available_objects.get_or_create(
             fundus_right_id=fundus_right_id,
             defaults={},
-            **field_values
+            **get_disease_field_values(disease_type)
         )
 
     def get_field_with_value_1(self):
@@ -266,6 +272,150 @@ class MemoHistory(SoftDeletableModel, TimeStampedModel):
         return memo_history
 
 
+class ImageDerivative(TimeStampedModel):
+    """
+    안저/hitmap 원본 이미지의 축소본(썸네일, 화면용) 레지스트리
+    원본의 스토리지 키(source_name)로 찾으며, 파일은 원본 옆 derivatives/ 경로에 저장된다.
+    """
+    VARIANT_THUMBNAIL = 'thumbnail'
+    VARIANT_SCREEN = 'screen'
+    VARIANT_CHOICES = (
+        (VARIANT_THUMBNAIL, '썸네일'),
+        (VARIANT_SCREEN, '화면용'),
+    )
+
+    source_name = models.CharField(max_length=255)
+    variant = models.CharField(max_length=20, choices=VARIANT_CHOICES)
+    format = models.CharField(max_length=10)
+    file = models.ImageField(upload_to='derivatives/', max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['-created']
+        constraints = [
+            models.UniqueConstraint(fields=['source_name', 'variant', 'format'], name='unique_image_derivative'),
+        ]
+
+
+class DiagnosisJob(TimeStampedModel, UUIDModel):
+    """
+    비동기 진단 작업
+    웹 요청은 이미지와 입력값만 저장하고, 워커(doctors.background)가 classify -> upload -> 저장을 수행한다.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, '대기'),
+        (STATUS_RUNNING, '진행중'),
+        (STATUS_DONE, '완료'),
+        (STATUS_FAILED, '실패'),
+    )
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='diagnosis_jobs')
+    batch_id = models.UUIDField(null=True, blank=True, db_index=True)  # 배치 진단으로 함께 등록된 작업 묶음
+    reg_no = models.CharField(max_length=100)
+    name = EncryptedCharField(max_length=100)
+    birth = EncryptedCharField(max_length=20)
+    gender = models.CharField(choices=GENDER_CHOICE, max_length=1)
+    symptom_by_patient = models.TextField(null=True, blank=True)
+    memo_by_doctor = models.TextField(null=True, blank=True)
+    eye_image_first = models.ImageField(upload_to='diagnosis_job/')
+    eye_image_second = models.ImageField(upload_to='diagnosis_job/')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error_message = models.CharField(max_length=255, blank=True, default='')
+    medical_history = models.ForeignKey(MedicalHistory, on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='diagnosis_jobs')
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['status', 'created']),
+        ]
+        verbose_name = '진단 작업'
+        verbose_name_plural = '진단 작업'
+
+    def __str__(self):
+        return f"diagnosis_job_{self.status}"
+
+    def get_form(self):
+        return {
+            'name': self.name,
+            'birth': self.birth,
+            'sex': self.gender,
+            'symptom_by_patient': self.symptom_by_patient,
+            'memo_by_doctor': self.memo_by_doctor,
+        }
+
+
+class PatientSummary(TimeStampedModel):
+    """
+    환자 목록 정렬/필터용 요약 (읽기 모델)
+    doctors.patient_summary에서 진단 저장, 히스토리 삭제 시 갱신하며 rebuild_patient_summaries로 재계산한다.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, related_name='summary')
+    doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, null=True, related_name='patient_summaries')
+    latest_history = models.ForeignKey(MedicalHistory, on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='+')
+    last_visit_at = models.DateTimeField(null=True, blank=True)
+    visit_count = models.PositiveIntegerField(default=0)
+    # 최근 방문의 좌/우안 병변 (값이 "1"인 항목)
+    left_amd = models.BooleanField(default=False)
+    left_diabetic = models.BooleanField(default=False)
+    left_glaucoma = models.BooleanField(default=False)
+    left_erm = models.BooleanField(default=False)
+    left_normal = models.BooleanField(default=False)
+    right_amd = models.BooleanField(default=False)
+    right_diabetic = models.BooleanField(default=False)
+    right_glaucoma = models.BooleanField(default=False)
+    right_erm = models.BooleanField(default=False)
+    right_normal = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'last_visit_at']),
+            models.Index(fields=['doctor', 'visit_count']),
+        ]
+        verbose_name = '환자 요약'
+        verbose_name_plural = '환자 요약'
+
+    def __str__(self):
+        return f"patient_summary_{self.visit_count}"
+
+
+class PatientNameToken(models.Model):
+    """
+    환자 이름 블라인드 인덱스 토큰 (doctors.name_index)
+    이름 prefix / 초성 prefix의 HMAC 값만 저장한다.
+    """
+    KIND_PREFIX = 'prefix'
+    KIND_CHOSUNG = 'chosung'
+    KIND_CHOICES = (
+        (KIND_PREFIX, '이름 앞부분'),
+        (KIND_CHOSUNG, '초성'),
+    )
+
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='name_tokens')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, null=True, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    token = models.CharField(max_length=32)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'kind', 'token'], name='unique_patient_name_token'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'kind', 'token']),
+        ]
+        verbose_name = '환자 이름 검색 토큰'
+        verbose_name_plural = '환자 이름 검색 토큰'
+
+
 class RemovedDoctorManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(is_removed=True)
@@ -0,0 +1,127 @@
+"""
+암호화된 환자 이름의 블라인드 인덱스 (prefix / 초성 검색)
+PatientInfo.name은 암호문과 전체 값 해시(SearchField)만 저장하므로 완전 일치 검색만 가능하다.
+이름의 앞부분(prefix)과 한글 초성 문자열의 앞부분을 keyed HMAC 토큰으로 만들어 PatientNameToken에 저장하고,
+검색어도 같은 방식으로 토큰화하여 인덱스 조회로 찾는다. 평문은 DB에 저장되지 않는다.
+
+    홍길동 -> prefix: 홍, 홍길, 홍길동 / chosung: ㅎ, ㅎㄱ, ㅎㄱㄷ
+
+토큰은 PatientInfo 저장 시(시그널), DiagnosisRecordWriter 저장 시 갱신되며
+기존 환자는 backfill_name_index 커맨드로 채운다.
+"""
+import hashlib
+import hmac
+from typing import Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import models
+
+from doctors.models import PatientNameToken
+
+CHOSUNG = ('ㄱ', 'ㄲ', 'ㄴ', 'ㄷ', 'ㄸ', 'ㄹ', 'ㅁ', 'ㅂ', 'ㅃ', 'ㅅ',
+           'ㅆ', 'ㅇ', 'ㅈ', 'ㅉ', 'ㅊ', 'ㅋ', 'ㅌ', 'ㅍ', 'ㅎ')
+HANGUL_BASE, HANGUL_LAST, JUNG_JONG_COUNT = 0xAC00, 0xD7A3, 21 * 28
+
+_index_key = None
+
+
+def get_index_key() -> bytes:
+    """
+    NAME_INDEX_KEY가 없으면 필드 암호화 키에서 별도 용도의 키를 파생합니다. (SearchField 해시와 구분)
+    """
+    global _index_key
+    if _index_key is None:
+        key = getattr(settings, 'NAME_INDEX_KEY', None)
+        if key:
+            _index_key = key.encode() if isinstance(key, str) else key
+        else:
+            base = settings.ENC_FIELD_KEY
+            base = base.encode() if isinstance(base, str) else base
+            _index_key = hmac.new(base, b'doctors.name_index', hashlib.sha256).digest()
+    return _index_key
+
+
+def normalize_name(name: Optional[str]) -> str:
+    return ''.join((name or '').split()).lower()
+
+
+def get_chosung(name: str) -> str:
+    """
+    한글 음절은 초성으로 바꾸고, 이미 자음인 문자와 그 외 문자는 그대로 둡니다.
+    """
+    result = []
+    for char in name:
+        code = ord(char)
+        if HANGUL_BASE <= code <= HANGUL_LAST:
+            result.append(CHOSUNG[(code - HANGUL_BASE) // JUNG_JONG_COUNT])
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def is_chosung_query(query: str) -> bool:
+    return bool(query) and all(char in CHOSUNG for char in query)
+
+
+def make_token(kind: str, value: str) -> str:
+    message = f'{kind}:{value}'.encode()
+    return hmac.new(get_index_key(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def get_prefixes(value: str) -> List[str]:
+    max_length = getattr(settings, 'NAME_INDEX_MAX_PREFIX', 10)
+    return [value[:length] for length in range(1, min(len(value), max_length) + 1)]
+
+
+def build_tokens(name: str) -> Set[Tuple[str, str]]:
+    normalized = normalize_name(name)
+    tokens = {(PatientNameToken.KIND_PREFIX, make_token(PatientNameToken.KIND_PREFIX, prefix))
+              for prefix in get_prefixes(normalized)}
+    tokens |= {(PatientNameToken.KIND_CHOSUNG, make_token(PatientNameToken.KIND_CHOSUNG, prefix))
+               for prefix in get_prefixes(get_chosung(normalized))}
+    return tokens
+
+
+def get_query_token(query: str) -> Optional[Tuple[str, str]]:
+    """
+    검색어의 (종류, 토큰)을 반환합니다. 초성만으로 된 검색어는 초성 인덱스를 사용합니다.
+    """
+    normalized = normalize_name(query)
+    if not normalized or len(normalized) > getattr(settings, 'NAME_INDEX_MAX_PREFIX', 10):
+        return None
+    kind = PatientNameToken.KIND_CHOSUNG if is_chosung_query(normalized) else PatientNameToken.KIND_PREFIX
+    return kind, make_token(kind, normalized)
+
+
+def index_patient_names(entries: Iterable[Tuple], replace: bool = True) -> int:
+    """
+    (patient_id, doctor_id, name) 목록의 토큰을 저장하고, 저장한 토큰 수를 반환합니다.
+    replace가 True이면 해당 환자의 기존 토큰을 먼저 지웁니다. (쿼리 1~2회)
+    """
+    entries = list(entries)
+    if not entries:
+        return 0
+    if replace:
+        PatientNameToken.objects.filter(patient_id__in=[entry[0] for entry in entries]).delete()
+    tokens = [
+        PatientNameToken(patient_id=patient_id, doctor_id=doctor_id, kind=kind, token=token)
+        for patient_id, doctor_id, name in entries
+        for kind, token in build_tokens(name)
+    ]
+    PatientNameToken.objects.bulk_create(tokens, ignore_conflicts=True)
+    return len(tokens)
+
+
+def filter_patients_by_name(patients: models.QuerySet, search: str, doctor_pk=None) -> models.QuerySet:
+    """
+    이름 완전 일치(SearchField) 또는 prefix/초성 토큰이 일치하는 환자만 남깁니다.
+    """
+    query_token = get_query_token(search)
+    if query_token is None:
+        return patients.filter(patient_info__name=search)
+    kind, token = query_token
+    tokens = PatientNameToken.objects.filter(kind=kind, token=token)
+    if doctor_pk:
+        tokens = tokens.filter(doctor_id=doctor_pk)
+    return patients.filter(models.Q(patient_info__name=search) |
+                           models.Q(id__in=tokens.values('patient_id')))
@@ -0,0 +1,139 @@
+"""
+환자 요약(PatientSummary) 갱신
+환자 목록을 최근 방문일, 방문 횟수, 최근 진단 병변으로 정렬/필터할 때 MedicalHistory -> FundusImage* -> Disease*
+조인 대신 요약 테이블의 인덱스 컬럼을 사용한다.
+
+    - 진단 저장 (DiagnosisRecordWriter)   : record_new_histories로 증분 갱신 (쿼리 3회, 기록 개수와 무관)
+    - 히스토리/병변 수정, 삭제 (시그널)     : refresh_patient_summaries로 해당 환자만 재계산
+    - rebuild_patient_summaries 커맨드    : 전체 재계산
+"""
+from typing import Dict, Iterable, List
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from doctors.models import MedicalHistory, Patient, PatientSummary
+
+DISEASE_FIELDS = ('amd', 'diabetic', 'glaucoma', 'erm', 'normal')
+FLAG_FIELDS = tuple(f'{side}_{field}' for side in ('left', 'right') for field in DISEASE_FIELDS)
+SUMMARY_FIELDS = ('doctor_id', 'latest_history_id', 'last_visit_at', 'visit_count') + FLAG_FIELDS
+
+
+def get_disease_flags(side: str, disease) -> Dict[str, bool]:
+    removed = disease is None or getattr(disease, 'is_removed', False)
+    return {f'{side}_{field}': not removed and getattr(disease, field) == "1" for field in DISEASE_FIELDS}
+
+
+def get_history_flags(medical_history) -> Dict[str, bool]:
+    """
+    히스토리의 좌/우안 병변 플래그를 반환합니다. (fundus_image_*__disease_*를 select_related 한 객체 기준)
+    """
+    fundus_left = getattr(medical_history, 'fundus_image_left', None)
+    fundus_right = getattr(medical_history, 'fundus_image_right', None)
+    return {
+        **get_disease_flags('left', getattr(fundus_left, 'disease_left', None) if fundus_left else None),
+        **get_disease_flags('right', getattr(fundus_right, 'disease_right', None) if fundus_right else None),
+    }
+
+
+def apply_values(summary: PatientSummary, values: Dict):
+    for field, value in values.items():
+        setattr(summary, field, value)
+    summary.modified = timezone.now()
+
+
+def save_summaries(summaries: List[PatientSummary], new_summaries: List[PatientSummary]):
+    if summaries:
+        PatientSummary.objects.bulk_update(summaries, list(SUMMARY_FIELDS) + ['modified'])
+    if new_summaries:
+        PatientSummary.objects.bulk_create(new_summaries)
+
+
+def record_new_histories(records) -> None:
+    """
+    DiagnosisRecordWriter가 방금 INSERT 한 기록(DiagnosisRecord)들을 요약에 반영합니다.
+    writer의 트랜잭션 안에서 호출되며, 새 히스토리는 항상 해당 환자의 가장 최근 방문입니다.
+    """
+    by_patient: Dict = {}
+    for record in records:
+        by_patient.setdefault(record.patient.id, []).append(record)
+    if not by_patient:
+        return
+
+    summaries = {summary.patient_id: summary
+                 for summary in PatientSummary.objects.select_for_update().filter(patient_id__in=by_patient)}
+    new_summaries = []
+    for patient_id, patient_records in by_patient.items():
+        latest = max(patient_records, key=lambda record: record.medical_history.created)
+        values = {
+            'doctor_id': latest.patient.doctor_id,
+            'latest_history_id': latest.medical_history.id,
+            'last_visit_at': latest.medical_history.created,
+            **get_disease_flags('left', latest.disease_left),
+            **get_disease_flags('right', latest.disease_right),
+        }
+        summary = summaries.get(patient_id)
+        if summary is None:
+            new_summaries.append(PatientSummary(patient_id=patient_id, visit_count=len(patient_records), **values))
+        else:
+            apply_values(summary, dict(values, visit_count=summary.visit_count + len(patient_records)))
+
+    try:
+        with transaction.atomic():
+            save_summaries(list(summaries.values()), new_summaries)
+    except IntegrityError:
+        # 다른 워커가 같은 환자의 요약을 먼저 만든 경우: 해당 환자만 다시 계산한다.
+        refresh_patient_summaries(by_patient)
+
+
+def refresh_patient_summaries(patient_ids: Iterable) -> int:
+    """
+    주어진 환자들의 요약을 DB에서 다시 계산합니다. (쿼리 4~5회, 환자 수와 무관)
+    """
+    patient_ids = list(patient_ids)
+    if not patient_ids:
+        return 0
+    histories = MedicalHistory.available_objects.filter(patient_id__in=patient_ids)
+    stats = {
+        row['patient_id']: row
+        for row in histories.order_by().values('patient_id').annotate(visit_count=Count('id'),
+                                                                      last_visit_at=Max('created'))
+    }
+    latest_history = (MedicalHistory.available_objects.filter(patient_id=OuterRef('pk'))
+                      .order_by('-created').values('id')[:1])
+    patients = list(Patient.all_objects.filter(id__in=patient_ids)
+                    .annotate(latest_history_id=Subquery(latest_history))
+                    .values('id', 'doctor_id', 'latest_history_id'))
+    latest_histories = MedicalHistory.all_objects.select_related(
+        'fundus_image_left__disease_left', 'fundus_image_right__disease_right',
+    ).in_bulk([patient['latest_history_id'] for patient in patients if patient['latest_history_id']])
+
+    with transaction.atomic():
+        summaries = {summary.patient_id: summary
+                     for summary in PatientSummary.objects.select_for_update().filter(patient_id__in=patient_ids)}
+        new_summaries = []
+        for patient in patients:
+            stat = stats.get(patient['id'], {})
+            medical_history = latest_histories.get(patient['latest_history_id'])
+            values = {
+                'doctor_id': patient['doctor_id'],
+                'latest_history_id': patient['latest_history_id'],
+                'last_visit_at': stat.get('last_visit_at'),
+                'visit_count': stat.get('visit_count', 0),
+                **(get_history_flags(medical_history) if medical_history else
+                   {field: False for field in FLAG_FIELDS}),
+            }
+            summary = summaries.get(patient['id'])
+            if summary is None:
+                new_summaries.append(PatientSummary(patient_id=patient['id'], **values))
+            else:
+                apply_values(summary, values)
+        save_summaries(list(summaries.values()), new_summaries)
+    return len(patients)
+
+
+def refresh_history_patient(history_pk) -> None:
+    patient_id = MedicalHistory.all_objects.filter(id=history_pk).values_list('patient_id', flat=True).first()
+    if patient_id:
+        refresh_patient_summaries([patient_id])
@@ -0,0 +1,167 @@
+"""
+/ready 준비 상태 확인 (HealthCheckMiddleware)
+DB, 스토리지, 캐시, 추론 서버(CLASSIFY_URL / UPLOAD_URL)를 병렬로 확인하고 항목별 성공 여부와 지연 시간만 내려준다.
+    - 항목마다 READINESS_TIMEOUT초 안에 끝나지 않으면 실패로 본다. 실패 원인은 응답에 넣지 않고 로그로 남긴다.
+    - 이전 확인이 아직 끝나지 않은 항목은 새로 시작하지 않고 그 결과를 기다리므로, 항목마다 스레드는 하나까지만 쓴다.
+      S3 스토리지 확인은 READINESS_TIMEOUT을 적용한 별도 클라이언트로 한다. (boto3 기본 타임아웃은 60초)
+    - 결과는 프로세스 메모리에 READINESS_CACHE_SECONDS초 동안 저장하여, 프로브가 몰려도 의존성에 부하를 주지 않는다.
+      (캐시 장애도 확인 대상이므로 Django 캐시에는 저장하지 않는다.)
+/health는 의존성을 확인하지 않는 liveness 용도로 그대로 둔다.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict
+
+import requests
+from django.conf import settings
+
+PROBE_KEY = 'readiness:probe'
+
+
+def check_database():
+    from django.db import connection
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    finally:
+        # 확인용 스레드의 커넥션을 남기지 않는다.
+        connection.close()
+
+
+_s3_client = None
+_s3_client_pid = None
+
+
+def get_s3_client(storage):
+    global _s3_client, _s3_client_pid
+    if _s3_client is None or _s3_client_pid != os.getpid():
+        import boto3
+        from botocore.config import Config
+        timeout = getattr(settings, 'READINESS_TIMEOUT', 1.0)
+        _s3_client = boto3.client(
+            's3', region_name=getattr(storage, 'region_name', None),
+            endpoint_url=getattr(storage, 'endpoint_url', None),
+            aws_access_key_id=getattr(storage, 'access_key', None),
+            aws_secret_access_key=getattr(storage, 'secret_key', None),
+            config=Config(connect_timeout=timeout, read_timeout=timeout, retries={'max_attempts': 1}),
+        )
+        _s3_client_pid = os.getpid()
+    return _s3_client
+
+
+def check_storage():
+    from django.core.files.storage import default_storage
+    bucket_name = getattr(default_storage, 'bucket_name', None)
+    if bucket_name:
+        get_s3_client(default_storage).head_bucket(Bucket=bucket_name)
+    else:
+        default_storage.exists('readiness-probe')
+
+
+def check_cache():
+    from django.core.cache import caches
+    cache = caches[getattr(settings, 'READINESS_CACHE_ALIAS', 'default')]
+    value = str(time.time_ns())
+    cache.set(PROBE_KEY, value, timeout=30)
+    if cache.get(PROBE_KEY) != value:
+        raise RuntimeError('cache read-after-write mismatch')
+
+
+def make_service_check(url: str) -> Callable:
+    def check_service():
+        timeout = getattr(settings, 'READINESS_TIMEOUT', 1.0)
+        # 연결되고 5xx가 아니면 살아 있다고 본다. (GET을 지원하지 않는 405 등도 정상)
+        response = requests.get(url, timeout=(timeout, timeout))
+        if response.status_code >= 500:
+            raise RuntimeError(f'status {response.status_code}')
+    return check_service
+
+
+def get_checks() -> Dict[str, Callable]:
+    checks = {'database': check_database, 'storage': check_storage, 'cache': check_cache}
+    for name, setting in (('classify', 'CLASSIFY_URL'), ('upload', 'UPLOAD_URL')):
+        url = getattr(settings, setting, None)
+        if url:
+            checks[name] = make_service_check(url)
+    return checks
+
+
+def run_check(name: str, check: Callable) -> Dict:
+    started = time.monotonic()
+    try:
+        check()
+        ok = True
+    except Exception as e:
+        print(f'readiness {name} 실패: {e.__class__.__name__}: {e}')
+        ok = False
+    return {'ok': ok, 'latency_ms': int((time.monotonic() - started) * 1000)}
+
+
+_executor = None
+_executor_pid = None
+_in_flight: Dict[str, Future] = {}
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='readiness')
+        _executor_pid = os.getpid()
+        _in_flight.clear()
+    return _executor
+
+
+def run_checks() -> Dict:
+    """
+    ReadinessCache.lock 안에서만 호출합니다.
+    """
+    timeout = getattr(settings, 'READINESS_TIMEOUT', 1.0)
+    executor = get_executor()
+    futures = {}
+    for name, check in get_checks().items():
+        future = _in_flight.get(name)
+        if future is None or future.done():
+            future = _in_flight[name] = executor.submit(run_check, name, check)
+        futures[name] = future
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+        else:
+            print(f'readiness {name} 실패: {timeout}초 안에 끝나지 않음')
+            results[name] = {'ok': False, 'latency_ms': int(timeout * 1000)}
+    return {
+        'status': 'ok' if all(result['ok'] for result in results.values()) else 'fail',
+        'checks': results,
+    }
+
+
+class ReadinessCache:
+    def __init__(self):
+        self.result = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> Dict:
+        ttl = getattr(settings, 'READINESS_CACHE_SECONDS', 5)
+        if self.result is not None and time.monotonic() - self.checked_at < ttl:
+            return dict(self.result, cached=True)
+        with self.lock:
+            # 다른 스레드가 먼저 확인했으면 그 결과를 쓴다.
+            if self.result is not None and time.monotonic() - self.checked_at < ttl:
+                return dict(self.result, cached=True)
+            self.result = run_checks()
+            self.checked_at = time.monotonic()
+            return dict(self.result, cached=False)
+
+
+readiness = ReadinessCache()
+
+
+def get_readiness() -> Dict:
+    return readiness.get()
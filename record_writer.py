@@ -0,0 +1,247 @@
+"""
+진단 기록 일괄 저장 (unit of work)
+한 번의 진단은 환자, 환자 정보, 방문 히스토리, 메모, 좌/우안 이미지, 좌/우안 병변, 진단 파일,
+좌/우안 hitmap까지 최대 11개 행을 만든다. DiagnosisRecordWriter는 이 그래프를 메모리에서 만든 뒤
+하나의 트랜잭션에서 모델별 bulk_create 한 번씩으로 저장한다.
+
+이미지 4장(좌/우안 원본, 좌/우안 hitmap)은 트랜잭션을 열기 전에 스레드 풀에서 병렬로 스토리지에 올리고,
+트랜잭션 안에서는 저장된 키(파일 이름)만 기록한다.
+
+쿼리 수 (기록 개수와 무관):
+    기존 환자 조회(환자 정보 join) SELECT 1회 + 모델별 INSERT 최대 11회
+    + 환자 요약(PatientSummary) 갱신 최대 3회 + 새 환자 이름 검색 토큰 INSERT 1회 = MAX_QUERIES
+    bulk INSERT 후 PK를 돌려받지 못하는 백엔드(MySQL 등)에서는 안저 이미지만 건별 INSERT 한다.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from doctors.models import (DiagnosisFile, DiseaseLeft, DiseaseRight, FundusHitmapImageLeft, FundusHitmapImageRight,
+                            FundusImageLeft, FundusImageRight, MedicalHistory, MemoHistory, Patient, PatientInfo,
+                            get_disease_field_values)
+from doctors.counters import record_written
+from doctors.name_index import index_patient_names
+from doctors.patient_summary import record_new_histories
+
+
+# (DiagnosisRecord 속성, 모델, 파일 필드)
+FILE_FIELDS = (
+    ('left_eye', FundusImageLeft, 'left_image'),
+    ('right_eye', FundusImageRight, 'right_image'),
+    ('hit_left', FundusHitmapImageLeft, 'hit_image_left'),
+    ('hit_right', FundusHitmapImageRight, 'hit_image_right'),
+)
+
+
+class DiagnosisRecord:
+    """
+    저장될(또는 저장된) 진단 한 건의 모델 인스턴스 묶음
+    """
+
+    def __init__(self, doctor_pk, reg_no: str, form: Dict, left_eye, right_eye,
+                 left_prediction, right_prediction, hit_left, hit_right):
+        self.doctor_pk = doctor_pk
+        self.reg_no = reg_no
+        self.form = form
+        self.left_eye = left_eye
+        self.right_eye = right_eye
+        self.left_prediction = left_prediction
+        self.right_prediction = right_prediction
+        self.hit_left = hit_left
+        self.hit_right = hit_right
+
+        self.patient: Optional[Patient] = None
+        self.patient_info: Optional[PatientInfo] = None
+        self.medical_history: Optional[MedicalHistory] = None
+        self.memo_history: Optional[MemoHistory] = None
+        self.fundus_image_left: Optional[FundusImageLeft] = None
+        self.fundus_image_right: Optional[FundusImageRight] = None
+        self.disease_left: Optional[DiseaseLeft] = None
+        self.disease_right: Optional[DiseaseRight] = None
+        self.diagnosis_file: Optional[DiagnosisFile] = None
+        self.fundus_hit_left: Optional[FundusHitmapImageLeft] = None
+        self.fundus_hit_right: Optional[FundusHitmapImageRight] = None
+
+    @property
+    def patient_key(self):
+        return self.reg_no, str(self.doctor_pk)
+
+
+class DiagnosisRecordWriter:
+    MAX_QUERIES = 16
+
+    def __init__(self):
+        self.records: List[DiagnosisRecord] = []
+        self.staged_files = []
+
+    def add(self, doctor_pk, reg_no: str, form: Dict, left_eye, right_eye,
+            left_prediction, right_prediction, hit_left, hit_right) -> DiagnosisRecord:
+        record = DiagnosisRecord(doctor_pk, reg_no, form, left_eye, right_eye,
+                                 left_prediction, right_prediction, hit_left, hit_right)
+        self.records.append(record)
+        return record
+
+    def write(self) -> List[DiagnosisRecord]:
+        if not self.records:
+            return []
+        self.stage_files()
+        try:
+            with transaction.atomic():
+                self.write_records()
+        except Exception:
+            self.discard_staged_files()
+            raise
+        return self.records
+
+    def write_records(self):
+        new_patients, new_patient_infos = self.resolve_patients()
+        self.build_histories()
+
+        bulk_create(Patient, new_patients)
+        bulk_create(PatientInfo, new_patient_infos)
+        self.index_patient_names(new_patient_infos)
+        bulk_create(MedicalHistory, [record.medical_history for record in self.records])
+        bulk_create(MemoHistory, [record.memo_history for record in self.records])
+        bulk_create(DiagnosisFile, [record.diagnosis_file for record in self.records])
+        bulk_create(FundusImageLeft, [record.fundus_image_left for record in self.records], need_pk=True)
+        bulk_create(FundusImageRight, [record.fundus_image_right for record in self.records], need_pk=True)
+
+        self.build_fundus_children()
+        bulk_create(DiseaseLeft, [record.disease_left for record in self.records])
+        bulk_create(DiseaseRight, [record.disease_right for record in self.records])
+        bulk_create(FundusHitmapImageLeft, [record.fundus_hit_left for record in self.records])
+        bulk_create(FundusHitmapImageRight, [record.fundus_hit_right for record in self.records])
+
+        # bulk INSERT는 post_save 시그널을 보내지 않으므로 환자 요약과 카운터를 직접 갱신한다.
+        record_new_histories(self.records)
+        transaction.on_commit(lambda: record_written(new_patients, self.records))
+
+    def index_patient_names(self, new_patient_infos):
+        """
+        새 환자 정보의 이름 검색 토큰을 저장합니다. (bulk INSERT는 post_save 시그널을 보내지 않는다)
+        """
+        patients = {record.patient.id: record.patient for record in self.records}
+        entries = [(patient_info.patient_id, patients[patient_info.patient_id].doctor_id, patient_info.name)
+                   for patient_info in new_patient_infos]
+        index_patient_names(entries, replace=False)
+
+    def stage_files(self):
+        """
+        업로드 파일을 병렬로 스토리지에 저장하고, 레코드의 파일 값을 저장된 이름(문자열)으로 바꿉니다.
+        문자열이 할당된 FieldFile은 이미 커밋된 것으로 취급되므로 INSERT 시 다시 업로드하지 않습니다.
+        """
+        uploads = []
+        for record in self.records:
+            for attr, model, field_name in FILE_FIELDS:
+                content = getattr(record, attr)
+                if content is None or isinstance(content, str):
+                    continue
+                field = model._meta.get_field(field_name)
+                uploads.append((record, attr, field, field.generate_filename(None, content.name), content))
+        if not uploads:
+            return
+
+        max_workers = min(len(uploads), getattr(settings, 'STORAGE_UPLOAD_WORKERS', 4))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                (record, attr, field, executor.submit(field.storage.save, name, content, max_length=field.max_length))
+                for record, attr, field, name, content in uploads
+            ]
+            errors = []
+            for record, attr, field, future in futures:
+                try:
+                    saved_name = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                self.staged_files.append((field.storage, saved_name))
+                setattr(record, attr, saved_name)
+
+        if errors:
+            self.discard_staged_files()
+            raise errors[0]
+
+    def discard_staged_files(self):
+        """
+        DB 저장에 실패했을 때 미리 올린 파일을 지웁니다.
+        """
+        for storage, name in self.staged_files:
+            try:
+                storage.delete(name)
+            except Exception as e:
+                print(f"스토리지 파일 삭제 실패 {name}: {e}")
+        self.staged_files = []
+
+    def resolve_patients(self):
+        """
+        기존 환자를 한 번의 쿼리로 조회하고, 없는 환자와 환자 정보는 새 인스턴스로 만듭니다.
+        같은 배치에 같은 환자가 여러 번 나오면 하나의 인스턴스를 공유합니다.
+        """
+        reg_nos = {record.reg_no for record in self.records}
+        doctor_pks = {record.doctor_pk for record in self.records}
+        existing = {
+            (patient.patient_reg_no, str(patient.doctor_id)): patient
+            for patient in Patient.available_objects.select_related('patient_info')
+            .filter(patient_reg_no__in=reg_nos, doctor_id__in=doctor_pks)
+        }
+
+        patient_infos = {}
+        new_patients, new_patient_infos = [], []
+        for record in self.records:
+            patient = existing.get(record.patient_key)
+            if patient is None:
+                patient = Patient(doctor_id=record.doctor_pk, patient_reg_no=record.reg_no)
+                existing[record.patient_key] = patient
+                new_patients.append(patient)
+            record.patient = patient
+
+            patient_info = patient_infos.get(record.patient_key)
+            if patient_info is None:
+                # 새 환자는 UUID pk가 이미 있으므로 역참조(patient.patient_info)를 하면 쿼리가 나간다.
+                if patient not in new_patients and hasattr(patient, 'patient_info'):
+                    patient_info = patient.patient_info
+                else:
+                    patient_info = PatientInfo(patient_id=patient.id, name=record.form.get('name'),
+                                               age=record.form.get('birth'), gender=record.form.get('sex'))
+                    new_patient_infos.append(patient_info)
+                patient_infos[record.patient_key] = patient_info
+            record.patient_info = patient_info
+        return new_patients, new_patient_infos
+
+    def build_histories(self):
+        for record in self.records:
+            record.medical_history = MedicalHistory(patient_id=record.patient.id)
+            history_id = record.medical_history.id
+            record.memo_history = MemoHistory(medical_history_id=history_id,
+                                              symptom_by_patient=record.form.get('symptom_by_patient'),
+                                              symptom_by_doctor=record.form.get('memo_by_doctor'))
+            record.diagnosis_file = DiagnosisFile(medical_history_id=history_id, file=None)
+            record.fundus_image_left = FundusImageLeft(medical_history_id=history_id, left_image=record.left_eye)
+            record.fundus_image_right = FundusImageRight(medical_history_id=history_id, right_image=record.right_eye)
+
+    def build_fundus_children(self):
+        for record in self.records:
+            left_id, right_id = record.fundus_image_left.id, record.fundus_image_right.id
+            record.disease_left = DiseaseLeft(fundus_left_id=left_id,
+                                              **get_disease_field_values(record.left_prediction))
+            record.disease_right = DiseaseRight(fundus_right_id=right_id,
+                                                **get_disease_field_values(record.right_prediction))
+            record.fundus_hit_left = FundusHitmapImageLeft(fundus_left_id=left_id, hit_image_left=record.hit_left)
+            record.fundus_hit_right = FundusHitmapImageRight(fundus_right_id=right_id,
+                                                             hit_image_right=record.hit_right)
+
+
+def bulk_create(model, objs: List, need_pk=False):
+    """
+    objs를 INSERT 한 번으로 저장합니다.
+    need_pk인데 백엔드가 bulk INSERT 후 PK를 돌려주지 못하면 건별로 저장합니다.
+    """
+    if not objs:
+        return objs
+    if need_pk and not connection.features.can_return_rows_from_bulk_insert:
+        for obj in objs:
+            obj.save(force_insert=True)
+        return objs
+    return model.objects.bulk_create(objs)
@@ -0,0 +1,228 @@
+"""
+RequestLogger 보존 기간 관리와 시간별 집계
+RequestLogger는 요청마다 한 행씩 늘어나므로 다음 두 가지로 관리한다.
+
+    - 시간별 집계 (rollup_hours)
+        정시 단위로 endpoint(정규화), method, 응답 코드별 건수와 exec_time p50/p95/p99/max를 RequestLogRollup에 저장
+    - 보존 기간 (retire_day)
+        REQUEST_LOG_RETENTION_DAYS보다 오래된 로그를 날짜별 보관 테이블(<원본 테이블>_archive_YYYYMMDD)로 옮기거나
+        지운다. 네이티브 파티션이 없는 백엔드에서도 동작하도록 raw SQL(CREATE TABLE AS / INSERT SELECT / DELETE)을
+        사용하며, 한 배치(REQUEST_LOG_PRUNE_BATCH_SIZE행)마다 트랜잭션을 나눠 잠금 시간을 제한한다.
+
+원본을 옮기거나 지우기 전에 해당 날짜의 집계를 먼저 만든다. (prune_request_logs 커맨드)
+원본이 옮겨지기 시작한 시간대는 다시 집계하면 남은 일부만으로 덮어쓰게 되므로, 이미 집계가 있는 시간대는
+보존 기간 기준 시각(get_retention_cutoff) 이전이거나 원본 건수가 집계 건수보다 적으면 다시 집계하지 않는다.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Q, Sum
+
+from core.models import RequestLogger
+from core.rollup_models import RequestLogRollup
+
+UUID_RE = re.compile(r'[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}')
+NUMBER_RE = re.compile(r'(?<=/)\d+(?=/|$)')
+
+
+def get_timestamp_field() -> str:
+    return getattr(settings, 'REQUEST_LOG_TIMESTAMP_FIELD', 'created')
+
+
+def normalize_endpoint(endpoint: str) -> str:
+    """
+    /doctors/<uuid>/patients/?page=3 -> /doctors/:uuid/patients/
+    """
+    path = (endpoint or '').split('?', 1)[0]
+    path = UUID_RE.sub(':uuid', path)
+    path = NUMBER_RE.sub(':int', path)
+    return path[:255]
+
+
+def percentile(sorted_values: List[int], ratio: float) -> int:
+    """
+    nearest-rank 백분위수
+    """
+    if not sorted_values:
+        return 0
+    rank = max(1, int(-(-ratio * len(sorted_values) // 1)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def get_retention_cutoff(days: Optional[int] = None) -> datetime:
+    """
+    이 시각 이전의 원본 로그는 prune_request_logs가 옮기거나 지웠을 수 있습니다.
+    """
+    if days is None:
+        days = getattr(settings, 'REQUEST_LOG_RETENTION_DAYS', 30)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=days)
+
+
+def rollup_hour(bucket: datetime, retired_before: Optional[datetime] = None) -> Optional[int]:
+    """
+    [bucket, bucket + 1시간) 로그를 집계하여 저장하고, 집계 행 수를 반환합니다. 다시 실행해도 결과가 같습니다.
+    원본이 옮겨지기 시작한 시간대라 기존 집계를 유지했으면 None을 반환합니다.
+    """
+    bucket = floor_hour(bucket)
+    if retired_before is None:
+        retired_before = get_retention_cutoff()
+    rolled_count = RequestLogRollup.objects.filter(bucket=bucket).aggregate(total=Sum('count'))['total']
+    if rolled_count is not None and bucket < retired_before:
+        return None
+    timestamp_field = get_timestamp_field()
+    logs = (RequestLogger.objects
+            .filter(**{f'{timestamp_field}__gte': bucket, f'{timestamp_field}__lt': bucket + timedelta(hours=1)})
+            .order_by()
+            .values_list('endpoint', 'method', 'response_code', 'exec_time'))
+
+    exec_times = defaultdict(list)
+    for endpoint, method, response_code, exec_time in logs.iterator(chunk_size=5000):
+        exec_times[(normalize_endpoint(endpoint), method or '', response_code or 0)].append(exec_time or 0)
+    # 원본은 늦게 저장된 로그로 늘어날 뿐 줄어들지 않으므로, 집계보다 적으면 보존 기간 설정과 관계없이 옮겨지는 중이다.
+    if rolled_count is not None and sum(len(values) for values in exec_times.values()) < rolled_count:
+        return None
+
+    rollups = []
+    for (endpoint, method, response_code), values in exec_times.items():
+        values.sort()
+        rollups.append(RequestLogRollup(
+            bucket=bucket, endpoint=endpoint, method=method[:10], response_code=response_code,
+            count=len(values), exec_time_p50=percentile(values, 0.50), exec_time_p95=percentile(values, 0.95),
+            exec_time_p99=percentile(values, 0.99), exec_time_max=values[-1], exec_time_total=sum(values),
+        ))
+    with transaction.atomic():
+        RequestLogRollup.objects.filter(bucket=bucket).delete()
+        RequestLogRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def rollup_hours(start: datetime, end: datetime, retired_before: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    [start, end) 구간의 정시마다 rollup_hour를 실행하고 (집계한 시간 수, 집계 행 수)를 반환합니다.
+    기존 집계를 유지한 시간대는 세지 않습니다.
+    """
+    if retired_before is None:
+        retired_before = get_retention_cutoff()
+    hours, rows = 0, 0
+    bucket = floor_hour(start)
+    while bucket < end:
+        count = rollup_hour(bucket, retired_before)
+        if count is not None:
+            rows += count
+            hours += 1
+        bucket += timedelta(hours=1)
+    return hours, rows
+
+
+def get_oldest_log_time():
+    timestamp_field = get_timestamp_field()
+    return (RequestLogger.objects.order_by(timestamp_field)
+            .values_list(timestamp_field, flat=True).first())
+
+
+def get_archive_table(day: datetime) -> str:
+    return f"{RequestLogger._meta.db_table}_archive_{day:%Y%m%d}"
+
+
+def ensure_archive_table(table: str):
+    qn = connection.ops.quote_name
+    if table in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {qn(table)} AS SELECT * FROM {qn(RequestLogger._meta.db_table)} WHERE 1 = 0")
+
+
+def get_day_batch(day: datetime, batch_size: int) -> List:
+    timestamp_field = get_timestamp_field()
+    return list(RequestLogger.objects
+                .filter(**{f'{timestamp_field}__gte': day, f'{timestamp_field}__lt': day + timedelta(days=1)})
+                .order_by('pk').values_list('pk', flat=True)[:batch_size])
+
+
+def move_batch(pks: Iterable, archive_table=None) -> int:
+    """
+    한 배치를 (보관 테이블로 복사한 뒤) 원본에서 지웁니다. 배치마다 별도 트랜잭션입니다.
+    """
+    pks = list(pks)
+    if not pks:
+        return 0
+    qn = connection.ops.quote_name
+    source = qn(RequestLogger._meta.db_table)
+    pk_column = qn(RequestLogger._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(pks))
+    with transaction.atomic(), connection.cursor() as cursor:
+        if archive_table:
+            cursor.execute(f"INSERT INTO {qn(archive_table)} SELECT * FROM {source} "
+                           f"WHERE {pk_column} IN ({placeholders})", pks)
+        cursor.execute(f"DELETE FROM {source} WHERE {pk_column} IN ({placeholders})", pks)
+        return cursor.rowcount
+
+
+def retire_day(day: datetime, archive: bool, batch_size: int, max_batches=None) -> Tuple[int, bool]:
+    """
+    하루치 로그를 배치 단위로 보관(archive=True) 또는 삭제하고 (처리한 행 수, 그날을 모두 처리했는지)를 반환합니다.
+    """
+    archive_table = get_archive_table(day) if archive else None
+    if archive_table:
+        ensure_archive_table(archive_table)
+    moved, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        pks = get_day_batch(day, batch_size)
+        if not pks:
+            return moved, True
+        moved += move_batch(pks, archive_table)
+        batches += 1
+    return moved, not get_day_batch(day, 1)
+
+
+def get_archive_tables() -> List[str]:
+    prefix = f"{RequestLogger._meta.db_table}_archive_"
+    return sorted(table for table in connection.introspection.table_names() if table.startswith(prefix))
+
+
+def drop_archive_tables_before(day: datetime) -> List[str]:
+    """
+    day 이전 날짜의 보관 테이블을 지웁니다. (REQUEST_LOG_ARCHIVE_RETENTION_DAYS)
+    """
+    qn = connection.ops.quote_name
+    prefix = f"{RequestLogger._meta.db_table}_archive_"
+    dropped = []
+    for table in get_archive_tables():
+        try:
+            table_day = datetime.strptime(table[len(prefix):], '%Y%m%d')
+        except ValueError:
+            continue
+        if table_day < day:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {qn(table)}")
+            dropped.append(table)
+    return dropped
+
+
+def get_endpoint_summary(start: datetime, end: datetime, limit: int = 50) -> List[dict]:
+    """
+    대시보드용 endpoint별 요약. 원본 로그 대신 RequestLogRollup만 읽습니다.
+    시간별 백분위수는 합칠 수 없으므로 구간 내 최댓값(최악 시간대)을 보여줍니다.
+    """
+    rows = (RequestLogRollup.objects
+            .filter(bucket__gte=floor_hour(start), bucket__lt=end)
+            .values('endpoint', 'method')
+            .annotate(requests=Sum('count'), total_ms=Sum('exec_time_total'), p95_ms=Max('exec_time_p95'),
+                      p99_ms=Max('exec_time_p99'), max_ms=Max('exec_time_max'),
+                      errors=Sum('count', filter=Q(response_code__gte=500)))
+            .order_by('-requests')[:limit])
+    summary = []
+    for row in rows:
+        row['avg_ms'] = round(row['total_ms'] / row['requests']) if row['requests'] else 0
+        row['errors'] = row['errors'] or 0
+        summary.append(row)
+    return summary
@@ -0,0 +1,133 @@
+"""
+RequestLogger 비동기 일괄 저장
+요청 스레드는 로그 인스턴스를 크기가 정해진 큐에 넣기만 하고, 백그라운드 스레드가 REQUEST_LOG_BATCH_SIZE개 또는
+REQUEST_LOG_FLUSH_INTERVAL초마다 bulk_create로 저장한다.
+
+큐가 가득 찼을 때 (REQUEST_LOG_OVERFLOW)
+    'drop'   : 새 로그를 버린다. (기본값)
+    'sample' : 큐가 80% 이상 차면 REQUEST_LOG_SAMPLE_RATE 비율만 받고, 가득 차면 버린다.
+"""
+import atexit
+import os
+import queue
+import random
+import threading
+import time
+from typing import List
+
+from django.conf import settings
+from django.db import close_old_connections
+
+OVERFLOW_DROP = 'drop'
+OVERFLOW_SAMPLE = 'sample'
+SAMPLE_HIGH_WATER = 0.8
+
+
+class RequestLogWriter:
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float, overflow: str, sample_rate: float):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.sample_rate = sample_rate
+        self.stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'sampled_out': 0, 'batches': 0, 'errors': 0}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='request-log-writer', daemon=True)
+        self.thread.start()
+
+    def count(self, key: str, value: int = 1):
+        with self.lock:
+            self.stats[key] += value
+
+    def enqueue(self, request_log) -> bool:
+        if self.overflow == OVERFLOW_SAMPLE and self.queue.qsize() >= self.max_size * SAMPLE_HIGH_WATER:
+            if random.random() >= self.sample_rate:
+                self.count('sampled_out')
+                return False
+        try:
+            self.queue.put_nowait(request_log)
+        except queue.Full:
+            self.count('dropped')
+            return False
+        self.count('enqueued')
+        return True
+
+    def drain(self, timeout: float) -> List:
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def write(self, batch: List):
+        if not batch:
+            return
+        from core.models import RequestLogger
+        close_old_connections()
+        try:
+            RequestLogger.objects.bulk_create(batch, batch_size=self.batch_size)
+            self.count('written', len(batch))
+            self.count('batches')
+        except Exception as e:
+            self.count('errors')
+            print(f'request log bulk_create 실패 ({len(batch)}건): {e}')
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.write(self.drain(self.flush_interval))
+        self.flush()
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        self.write(batch)
+
+    def stop(self, timeout: float = 5.0):
+        self.stopped.set()
+        self.thread.join(timeout)
+
+    def get_metrics(self):
+        with self.lock:
+            return dict(self.stats, queue_size=self.queue.qsize())
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_request_log_writer() -> RequestLogWriter:
+    """
+    프로세스(pid)별 writer. fork 이후에는 자식 프로세스에서 새 스레드로 다시 만든다.
+    """
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _writer is not None and _writer_pid == pid:
+        return _writer
+    with _writer_lock:
+        if _writer is None or _writer_pid != pid:
+            _writer = RequestLogWriter(
+                max_size=getattr(settings, 'REQUEST_LOG_QUEUE_SIZE', 10000),
+                batch_size=getattr(settings, 'REQUEST_LOG_BATCH_SIZE', 200),
+                flush_interval=getattr(settings, 'REQUEST_LOG_FLUSH_INTERVAL', 1.0),
+                overflow=getattr(settings, 'REQUEST_LOG_OVERFLOW', OVERFLOW_DROP),
+                sample_rate=getattr(settings, 'REQUEST_LOG_SAMPLE_RATE', 0.1),
+            )
+            _writer_pid = pid
+            atexit.register(_writer.stop)
+    return _writer
@@ -0,0 +1,95 @@
+"""
+진단 결과 페이지 컨텍스트 캐시
+방문 기록은 저장 후 거의 바뀌지 않으므로 MedicalRecodeInfo로 만든 컨텍스트를 Django 캐시에 저장한다.
+키에는 history_pk와 함께 결과를 만드는 행들(히스토리, 환자, 환자 정보, 좌/우안 이미지, 병변, hitmap)의
+modified 값으로 만든 버전이 들어간다. (views_util.get_record_graph_version, 쿼리 1회)
+행이 저장(soft delete 포함)되면 modified가, 삭제되면 NULL로 값이 바뀌므로 별도의 무효화 없이 키가 달라지며,
+캐시가 비워지거나 워커마다 캐시가 달라도 오래된 결과를 내려주지 않는다.
+base64 인라인 이미지(*_img_path, hit_*_path)는 결과마다 수 MB라 캐시하지 않고, 캐시된 저장 파일 이름(image_names)으로
+필요할 때 다시 인코딩한다. (fill)
+"""
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+
+RESULT_KEY = 'diagnosis_result:{history_pk}:{patient_pk}:{version}'
+
+# 캐시하지 않고 매번 채우는 항목 (로고는 자산 레지스트리에서 메모리로 바로 읽고, 인라인 이미지는 fill로 다시 만든다)
+INLINE_IMAGE_KEYS = ('left_img_path', 'right_img_path', 'hit_left_path', 'hit_right_path')
+UNCACHED_KEYS = ('logo_img_path',) + INLINE_IMAGE_KEYS
+
+
+def get_cache():
+    from django.core.cache import caches
+    return caches[getattr(settings, 'RESULT_CACHE_ALIAS', 'default')]
+
+
+class ResultCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.build_ms_total = 0
+        self.lock = threading.Lock()
+
+    def get_metrics(self) -> Dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'build_ms_avg': int(self.build_ms_total / self.misses) if self.misses else 0,
+                'build_ms_total': self.build_ms_total,
+            }
+
+
+stats = ResultCacheStats()
+
+
+def make_version(values: Iterable) -> str:
+    return hashlib.md5(repr(tuple(values)).encode()).hexdigest()
+
+
+def get_result_key(patient_pk, history_pk, version: str) -> str:
+    return RESULT_KEY.format(history_pk=history_pk, patient_pk=patient_pk, version=version)
+
+
+def get_or_build_result(patient_pk, history_pk, version: Optional[str], build: Callable[[], Dict],
+                        fill: Optional[Callable[[Dict], Dict]] = None) -> Dict:
+    """
+    캐시된 결과 컨텍스트를 반환하고, 없으면 build()로 만들어 저장합니다.
+    캐시에서 읽은 컨텍스트는 fill(context)로 캐시하지 않은 항목(인라인 이미지)을 채웁니다.
+    version이 None(방문 기록 없음)이면 캐시하지 않습니다.
+    """
+    if version is None:
+        return build()
+    cache = get_cache()
+    key = get_result_key(patient_pk, history_pk, version)
+    context = cache.get(key)
+    if context is not None:
+        with stats.lock:
+            stats.hits += 1
+        context = fill_uncached(dict(context))
+        return fill(context) if fill else context
+
+    started = time.monotonic()
+    context = build()
+    build_ms = int((time.monotonic() - started) * 1000)
+    with stats.lock:
+        stats.misses += 1
+        stats.build_ms_total += build_ms
+
+    # 기록이 없어 빈 결과가 나온 경우는 캐시하지 않는다.
+    if context.get('date') is not None:
+        cache.set(key, {k: v for k, v in context.items() if k not in UNCACHED_KEYS},
+                  timeout=getattr(settings, 'RESULT_CACHE_TIMEOUT', 60 * 60 * 24))
+    return context
+
+
+def fill_uncached(context: Dict) -> Dict:
+    from core.asset_registry import get_report_assets
+    context['logo_img_path'] = get_report_assets().get_base64('logo')
+    return context
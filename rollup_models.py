@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class RequestLogRollup(models.Model):
+    """
+    RequestLogger 시간별 집계 (core.request_log_retention)
+    원본 로그는 보존 기간이 지나면 보관 테이블로 옮기거나 지우므로, 대시보드는 이 집계를 읽는다.
+    """
+    bucket = models.DateTimeField()  # 집계 구간 시작 (정시)
+    endpoint = models.CharField(max_length=255)  # 쿼리스트링 제거, UUID/숫자 치환
+    method = models.CharField(max_length=10)
+    response_code = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    exec_time_p50 = models.PositiveIntegerField(default=0)
+    exec_time_p95 = models.PositiveIntegerField(default=0)
+    exec_time_p99 = models.PositiveIntegerField(default=0)
+    exec_time_max = models.PositiveIntegerField(default=0)
+    exec_time_total = models.BigIntegerField(default=0)
+
+    class Meta:
+        app_label = 'core'
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'endpoint', 'method', 'response_code'],
+                                    name='unique_request_log_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['endpoint', 'bucket']),
+        ]
+        verbose_name = '요청 로그 시간별 집계'
+        verbose_name_plural = '요청 로그 시간별 집계'
+
+    def __str__(self):
+        return f"{self.bucket:%Y-%m-%d %H}시 {self.method} {self.endpoint} {self.response_code}"
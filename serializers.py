@@ -0,0 +1,108 @@
+from rest_framework import serializers
+
+from core.utils import Gender
+from doctors.models import MedicalHistory, Patient
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,name 처럼 요청한 필드만 직렬화합니다.
+    DEFERRABLE_FIELDS의 암호화 컬럼은 요청되지 않으면 조회 자체에서 제외(defer)되어 복호화되지 않습니다.
+    """
+    DEFERRABLE_FIELDS = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.get_requested_fields(self.context.get('request'))
+        if requested:
+            for field_name in set(self.fields) - requested:
+                self.fields.pop(field_name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        if request is None:
+            return None
+        value = request.query_params.get('fields')
+        if not value:
+            return None
+        requested = {field.strip() for field in value.split(',') if field.strip()}
+        return requested & set(cls.Meta.fields) or None
+
+    @classmethod
+    def get_deferred_columns(cls, request):
+        requested = cls.get_requested_fields(request)
+        if not requested:
+            return []
+        return [column for field_name, columns in cls.DEFERRABLE_FIELDS.items() if field_name not in requested
+                for column in columns]
+
+
+class PatientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    DEFERRABLE_FIELDS = {
+        'name': ['patient_info___name'],
+        'age': ['patient_info___age'],
+    }
+
+    reg_no = serializers.CharField(source='patient_reg_no')
+    name = serializers.SerializerMethodField()
+    gender = serializers.SerializerMethodField()
+    age = serializers.SerializerMethodField()
+    last_visit_at = serializers.DateTimeField(read_only=True)
+    visit_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Patient
+        fields = ('id', 'reg_no', 'name', 'gender', 'age', 'last_visit_at', 'visit_count', 'created')
+
+    def get_patient_info(self, patient):
+        return getattr(patient, 'patient_info', None)
+
+    def get_name(self, patient):
+        patient_info = self.get_patient_info(patient)
+        return patient_info.name if patient_info else None
+
+    def get_gender(self, patient):
+        patient_info = self.get_patient_info(patient)
+        return Gender.get_gender_display(patient_info.gender) if patient_info else None
+
+    def get_age(self, patient):
+        patient_info = self.get_patient_info(patient)
+        return patient_info.age if patient_info else None
+
+
+class MedicalHistorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    patient_id = serializers.UUIDField(read_only=True)
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MedicalHistory
+        fields = ('id', 'patient_id', 'created', 'result_url')
+
+    def get_result_url(self, history):
+        from django.urls import reverse
+        return reverse('doctors_api:history_result', kwargs={'history_pk': history.id})
+
+
+class DiagnosisResultSerializer(SparseFieldsMixin, serializers.Serializer):
+    """
+    MedicalRecodeInfo.get_basic_info() 결과 (base64 인라인 이미지와 로고는 제외하고 이미지 URL만 내보냄)
+    """
+    name = serializers.ReadOnlyField()
+    age = serializers.ReadOnlyField()
+    sex = serializers.ReadOnlyField()
+    date = serializers.ReadOnlyField()
+    time = serializers.ReadOnlyField()
+    patient_reg_no = serializers.ReadOnlyField()
+    left_label = serializers.ReadOnlyField()
+    left_data_value = serializers.ReadOnlyField()
+    right_label = serializers.ReadOnlyField()
+    right_data_value = serializers.ReadOnlyField()
+    left_img_url = serializers.ReadOnlyField()
+    right_img_url = serializers.ReadOnlyField()
+    hit_left_url = serializers.ReadOnlyField()
+    hit_right_url = serializers.ReadOnlyField()
+
+    class Meta:
+        fields = ('name', 'age', 'sex', 'date', 'time', 'patient_reg_no', 'left_label', 'left_data_value',
+                  'right_label', 'right_data_value', 'left_img_url', 'right_img_url', 'hit_left_url',
+                  'hit_right_url')
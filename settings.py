@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 import environ
 import json
 import boto3
@@ -121,6 +122,119 @@ MODEL_PATH = ENV_GENERAL.get('MODEL_PATH')
 UPLOAD_URL = ENV_GENERAL.get('UPLOAD_URL')
 CLASSIFY_URL = ENV_GENERAL.get('CLASSIFY_URL')
 
+# Inference service client (doctors.inference_client)
+INFERENCE_CONNECT_TIMEOUT = float(ENV_GENERAL.get('INFERENCE_CONNECT_TIMEOUT', 3.0))
+INFERENCE_CLASSIFY_READ_TIMEOUT = float(ENV_GENERAL.get('INFERENCE_CLASSIFY_READ_TIMEOUT', 30.0))
+INFERENCE_UPLOAD_READ_TIMEOUT = float(ENV_GENERAL.get('INFERENCE_UPLOAD_READ_TIMEOUT', 60.0))
+INFERENCE_MAX_RETRIES = int(ENV_GENERAL.get('INFERENCE_MAX_RETRIES', 2))
+INFERENCE_BACKOFF_BASE = float(ENV_GENERAL.get('INFERENCE_BACKOFF_BASE', 0.2))
+INFERENCE_BACKOFF_MAX = float(ENV_GENERAL.get('INFERENCE_BACKOFF_MAX', 2.0))
+INFERENCE_POOL_MAXSIZE = int(ENV_GENERAL.get('INFERENCE_POOL_MAXSIZE', 10))
+# Optional batch endpoints of the inference service (multipart keys p{i}_file{n} / p{i}_left_eye, p{i}_right_eye)
+CLASSIFY_BATCH_URL = ENV_GENERAL.get('CLASSIFY_BATCH_URL')
+UPLOAD_BATCH_URL = ENV_GENERAL.get('UPLOAD_BATCH_URL')
+INFERENCE_BATCH_READ_TIMEOUT = float(ENV_GENERAL.get('INFERENCE_BATCH_READ_TIMEOUT', 120.0))
+
+# Inference result cache (doctors.inference_cache): 'local' | 'django' | 'none'
+INFERENCE_MODEL_VERSION = ENV_GENERAL.get('INFERENCE_MODEL_VERSION', '')
+INFERENCE_CACHE_BACKEND = ENV_GENERAL.get('INFERENCE_CACHE_BACKEND', 'local')
+INFERENCE_CACHE_ALIAS = ENV_GENERAL.get('INFERENCE_CACHE_ALIAS', 'default')
+INFERENCE_CACHE_TTL = int(ENV_GENERAL.get('INFERENCE_CACHE_TTL', 60 * 60))
+INFERENCE_CACHE_MAX_ENTRIES = int(ENV_GENERAL.get('INFERENCE_CACHE_MAX_ENTRIES', 128))
+
+# Parallel blob uploads before the diagnosis transaction (doctors.record_writer)
+STORAGE_UPLOAD_WORKERS = int(ENV_GENERAL.get('STORAGE_UPLOAD_WORKERS', 4))
+
+# Result page images (doctors.image_delivery): 'proxy' | 'signed'
+DIAGNOSIS_IMAGE_DELIVERY = ENV_GENERAL.get('DIAGNOSIS_IMAGE_DELIVERY', 'proxy')
+# Embed base64 images in the result context as well as URLs. diagnose-result.html still reads *_path,
+# so keep this on until the template is switched to the *_url values.
+DIAGNOSIS_INLINE_IMAGES = str(ENV_GENERAL.get('DIAGNOSIS_INLINE_IMAGES', True)).lower() == 'true'
+
+# Image derivatives (doctors.image_derivatives): size used on the result page, eager generation in the worker
+DIAGNOSIS_RESULT_IMAGE_SIZE = ENV_GENERAL.get('DIAGNOSIS_RESULT_IMAGE_SIZE', 'screen')
+DIAGNOSIS_DERIVATIVES_ON_UPLOAD = str(ENV_GENERAL.get('DIAGNOSIS_DERIVATIVES_ON_UPLOAD', False)).lower() == 'true'
+
+# Assets embedded in diagnosis reports (core.asset_registry), resolved through the staticfiles finders
+REPORT_ASSETS = {
+    'logo': 'images/logo/logo.png',
+}
+REPORT_ASSET_CHECK_INTERVAL = float(ENV_GENERAL.get('REPORT_ASSET_CHECK_INTERVAL', 5.0))
+
+# Diagnosis result page cache (doctors.result_cache)
+RESULT_CACHE_ENABLED = str(ENV_GENERAL.get('RESULT_CACHE_ENABLED', True)).lower() == 'true'
+RESULT_CACHE_ALIAS = ENV_GENERAL.get('RESULT_CACHE_ALIAS', 'default')
+RESULT_CACHE_TIMEOUT = int(ENV_GENERAL.get('RESULT_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Patient/history lists switch from page numbers to (created, id) cursors above this many rows.
+# Off until the list templates render next_cursor / prev_cursor links.
+PAGINATION_KEYSET = str(ENV_GENERAL.get('PAGINATION_KEYSET', False)).lower() == 'true'
+PAGINATION_EXACT_COUNT_LIMIT = int(ENV_GENERAL.get('PAGINATION_EXACT_COUNT_LIMIT', 1000))
+
+# Blind index for prefix / 초성 patient name search (doctors.name_index); derived from ENC_FIELD_KEY when unset
+NAME_INDEX_KEY = ENV_GENERAL.get('NAME_INDEX_KEY')
+NAME_INDEX_MAX_PREFIX = int(ENV_GENERAL.get('NAME_INDEX_MAX_PREFIX', 10))
+
+# Cached patient/visit counters (doctors.counters); the timeout bounds drift between reconcile_counters runs
+# Only used when the alias is a shared backend (Redis/Memcached); with LocMemCache the lists count from the DB
+COUNTER_CACHE_ALIAS = ENV_GENERAL.get('COUNTER_CACHE_ALIAS', 'default')
+COUNTER_CACHE_TIMEOUT = int(ENV_GENERAL.get('COUNTER_CACHE_TIMEOUT', 60 * 60))
+
+# Diagnose form patient lookup (views_util.lookup_patient / search_reg_no_prefix)
+PATIENT_LOOKUP_CACHE_TIMEOUT = int(ENV_GENERAL.get('PATIENT_LOOKUP_CACHE_TIMEOUT', 30))
+PATIENT_LOOKUP_TYPEAHEAD_LIMIT = int(ENV_GENERAL.get('PATIENT_LOOKUP_TYPEAHEAD_LIMIT', 10))
+
+# Expose per-request decrypt counts of lazily decrypted fields (core.lazy_encryption) as X-Decrypt-Count
+DECRYPT_STATS_HEADER = str(ENV_GENERAL.get('DECRYPT_STATS_HEADER', DEBUG)).lower() == 'true'
+
+# Request logging (core.middlewares.RequestLoggerMiddleware, core.request_log_writer)
+REQUEST_LOG_ASYNC = str(ENV_GENERAL.get('REQUEST_LOG_ASYNC', True)).lower() == 'true'
+REQUEST_LOG_QUEUE_SIZE = int(ENV_GENERAL.get('REQUEST_LOG_QUEUE_SIZE', 10000))
+REQUEST_LOG_BATCH_SIZE = int(ENV_GENERAL.get('REQUEST_LOG_BATCH_SIZE', 200))
+REQUEST_LOG_FLUSH_INTERVAL = float(ENV_GENERAL.get('REQUEST_LOG_FLUSH_INTERVAL', 1.0))
+REQUEST_LOG_OVERFLOW = ENV_GENERAL.get('REQUEST_LOG_OVERFLOW', 'drop')  # 'drop' or 'sample'
+REQUEST_LOG_SAMPLE_RATE = float(ENV_GENERAL.get('REQUEST_LOG_SAMPLE_RATE', 0.1))
+REQUEST_LOG_MAX_BODY = int(ENV_GENERAL.get('REQUEST_LOG_MAX_BODY', 4096))
+REQUEST_LOG_BODY_CONTENT_TYPES = ['application/json', 'text/plain', 'application/x-www-form-urlencoded']
+REQUEST_LOG_EXCLUDED_PREFIXES = ['/admin', '/static/', '/media/', '/health', '/ready', '/metrics']
+
+# Request log retention (core.request_log_retention): rollup_request_logs hourly, prune_request_logs daily
+REQUEST_LOG_TIMESTAMP_FIELD = ENV_GENERAL.get('REQUEST_LOG_TIMESTAMP_FIELD', 'created')
+REQUEST_LOG_RETENTION_DAYS = int(ENV_GENERAL.get('REQUEST_LOG_RETENTION_DAYS', 30))
+REQUEST_LOG_ARCHIVE = str(ENV_GENERAL.get('REQUEST_LOG_ARCHIVE', True)).lower() == 'true'
+REQUEST_LOG_ARCHIVE_RETENTION_DAYS = int(ENV_GENERAL.get('REQUEST_LOG_ARCHIVE_RETENTION_DAYS', 365))
+REQUEST_LOG_PRUNE_BATCH_SIZE = int(ENV_GENERAL.get('REQUEST_LOG_PRUNE_BATCH_SIZE', 1000))
+
+# IP allowlist (core.ip_allowlist): version key in the shared cache, TTL bounds staleness without one
+IP_ALLOWLIST_CACHE_ALIAS = ENV_GENERAL.get('IP_ALLOWLIST_CACHE_ALIAS', 'default')
+IP_ALLOWLIST_VERSION_CHECK_INTERVAL = float(ENV_GENERAL.get('IP_ALLOWLIST_VERSION_CHECK_INTERVAL', 1.0))
+IP_ALLOWLIST_TTL = int(ENV_GENERAL.get('IP_ALLOWLIST_TTL', 60))
+
+# Metrics (core.metrics) served at /metrics by HealthCheckMiddleware, only when METRICS_TOKEN is set
+# METRICS_MULTIPROC_DIR: per-process snapshot files aggregated across web/diagnosis workers (clear it on deploy,
+# set it to '' to serve only the answering process)
+METRICS_ENABLED = str(ENV_GENERAL.get('METRICS_ENABLED', True)).lower() == 'true'
+METRICS_TOKEN = ENV_GENERAL.get('METRICS_TOKEN', '')
+METRICS_MULTIPROC_DIR = ENV_GENERAL.get('METRICS_MULTIPROC_DIR',
+                                        os.path.join(tempfile.gettempdir(), 'doctoreye_metrics'))
+METRICS_FLUSH_INTERVAL = float(ENV_GENERAL.get('METRICS_FLUSH_INTERVAL', 5.0))
+
+# Readiness probe (core.readiness) served at /ready; /health stays a liveness check
+READINESS_TIMEOUT = float(ENV_GENERAL.get('READINESS_TIMEOUT', 1.0))
+READINESS_CACHE_SECONDS = float(ENV_GENERAL.get('READINESS_CACHE_SECONDS', 5))
+READINESS_CACHE_ALIAS = ENV_GENERAL.get('READINESS_CACHE_ALIAS', 'default')
+
+# Diagnosis job pipeline (doctors.background)
+DIAGNOSIS_ASYNC = str(ENV_GENERAL.get('DIAGNOSIS_ASYNC', False)).lower() == 'true'
+DIAGNOSIS_WORKER_PROCESSES = int(ENV_GENERAL.get('DIAGNOSIS_WORKER_PROCESSES', 2))
+DIAGNOSIS_WORKER_POLL_INTERVAL = float(ENV_GENERAL.get('DIAGNOSIS_WORKER_POLL_INTERVAL', 1.0))
+DIAGNOSIS_JOB_MAX_ATTEMPTS = int(ENV_GENERAL.get('DIAGNOSIS_JOB_MAX_ATTEMPTS', 3))
+DIAGNOSIS_JOB_STALE_SECONDS = int(ENV_GENERAL.get('DIAGNOSIS_JOB_STALE_SECONDS', 300))
+DIAGNOSIS_BATCH_MAX_SIZE = int(ENV_GENERAL.get('DIAGNOSIS_BATCH_MAX_SIZE', 8))
+DIAGNOSIS_BATCH_FLUSH_SECONDS = float(ENV_GENERAL.get('DIAGNOSIS_BATCH_FLUSH_SECONDS', 2.0))
+# Django rejects more than DATA_UPLOAD_MAX_NUMBER_FILES (100) files per request: 2 images per patient
+DIAGNOSIS_BATCH_MAX_PATIENTS = int(ENV_GENERAL.get('DIAGNOSIS_BATCH_MAX_PATIENTS', 50))
+
 
 FIELD_ENCRYPTION_KEY_1 = ENV_GENERAL.get('FIELD_ENCRYPTION_KEY')
 
@@ -160,6 +274,8 @@ INSTALLED_APPS = FEATURED_APPS + PIP_LIBS + [
 # To manage custom middleware
 SELF_MADE_MIDDLEWARE = [
     'core.middlewares.HealthCheckMiddleware',
+    'core.middlewares.MetricsMiddleware',
+    'core.middlewares.DecryptStatsMiddleware',
     'core.middlewares.RequestLoggerMiddleware',
     'core.middlewares.RedirectAllErrorsMiddleware',
     # 'core.middlewares.IPWhitelistMiddleware',
@@ -0,0 +1,118 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core.lazy_encryption import EncryptedValue
+from doctors import counters, name_index, patient_summary
+from doctors.models import (DiseaseLeft, DiseaseRight, FundusImageLeft, FundusImageRight, MedicalHistory, Patient,
+                            PatientInfo, PatientNameToken)
+
+
+def get_fundus_history_pk(fundus_image):
+    return fundus_image.medical_history_id if fundus_image is not None else None
+
+
+@receiver([post_save, post_delete], sender=MedicalHistory)
+def refresh_history_summary(sender, instance, **kwargs):
+    # 개별 저장/삭제(soft delete 포함) 시 환자 요약을 다시 계산한다. writer의 bulk INSERT는 writer가 직접 반영한다.
+    patient_summary.refresh_patient_summaries([instance.patient_id])
+
+
+@receiver([post_save, post_delete], sender=FundusImageLeft)
+@receiver([post_save, post_delete], sender=FundusImageRight)
+def refresh_fundus_summary(sender, instance, **kwargs):
+    patient_summary.refresh_history_patient(instance.medical_history_id)
+
+
+@receiver([post_save, post_delete], sender=DiseaseLeft)
+def refresh_left_disease_summary(sender, instance, **kwargs):
+    history_pk = get_fundus_history_pk(FundusImageLeft.all_objects.filter(id=instance.fundus_left_id).first())
+    if history_pk:
+        patient_summary.refresh_history_patient(history_pk)
+
+
+@receiver([post_save, post_delete], sender=DiseaseRight)
+def refresh_right_disease_summary(sender, instance, **kwargs):
+    history_pk = get_fundus_history_pk(FundusImageRight.all_objects.filter(id=instance.fundus_right_id).first())
+    if history_pk:
+        patient_summary.refresh_history_patient(history_pk)
+
+
+@receiver(post_save, sender=Patient)
+def update_name_token_doctor(sender, instance, created, **kwargs):
+    if not created:
+        PatientNameToken.objects.filter(patient_id=instance.id).exclude(doctor_id=instance.doctor_id) \
+            .update(doctor_id=instance.doctor_id)
+
+
+@receiver(post_init, sender=PatientInfo)
+def remember_name_hash(sender, instance, **kwargs):
+    # DB에서 읽은 인스턴스는 name에 검색 해시가 들어 있다. 저장 시 이름이 바뀌었는지 복호화 없이 비교한다.
+    instance._name_hash = instance.__dict__.get('name')
+
+
+def is_name_changed(instance) -> bool:
+    name = instance.__dict__.get('_name')
+    if isinstance(name, EncryptedValue):
+        # 읽지도 할당하지도 않은 이름 (lazy 복호화 전)
+        return False
+    return PatientInfo._meta.get_field('name').get_prep_value(name) != instance._name_hash
+
+
+def get_patient_doctor_id(instance):
+    # 호출하는 쪽에서 patient를 넘겼으면(캐시되어 있으면) 조회하지 않는다.
+    if PatientInfo._meta.get_field('patient').is_cached(instance):
+        return instance.patient.doctor_id if instance.patient else None
+    return Patient.all_objects.filter(id=instance.patient_id).values_list('doctor_id', flat=True).first()
+
+
+@receiver(post_save, sender=PatientInfo)
+def index_patient_info_name(sender, instance, created, **kwargs):
+    # 이름이 바뀌지 않은 저장(성별 수정 등)은 토큰을 다시 만들지 않는다.
+    if not created and not is_name_changed(instance):
+        return
+    name_index.index_patient_names([(instance.patient_id, get_patient_doctor_id(instance), instance.name)])
+    instance._name_hash = PatientInfo._meta.get_field('name').get_prep_value(instance.__dict__.get('_name'))
+
+
+@receiver(post_init, sender=Patient)
+@receiver(post_init, sender=MedicalHistory)
+def remember_removed_state(sender, instance, **kwargs):
+    # DB에서 읽은(또는 새로 만든) 시점의 is_removed. 저장 전 추가 SELECT 없이 soft delete/복구를 판단한다.
+    instance._was_removed = instance.__dict__.get('is_removed')
+
+
+def get_count_delta(instance, created) -> int:
+    """
+    생성 또는 is_removed 변경(soft delete / 복구)에 따른 카운터 증감 값
+    """
+    if created:
+        return 0 if instance.is_removed else 1
+    was_removed = getattr(instance, '_was_removed', None)
+    if was_removed is None or was_removed == instance.is_removed:
+        # is_removed를 읽지 않은(defer) 인스턴스는 판단할 수 없으므로 reconcile_counters에 맡긴다.
+        return 0
+    return -1 if instance.is_removed else 1
+
+
+@receiver(post_save, sender=Patient)
+def count_patient(sender, instance, created, **kwargs):
+    counters.add_patient_count(instance.doctor_id, get_count_delta(instance, created))
+    instance._was_removed = instance.is_removed
+
+
+@receiver(post_save, sender=MedicalHistory)
+def count_visit(sender, instance, created, **kwargs):
+    counters.add_visit_count(instance.patient_id, get_count_delta(instance, created))
+    instance._was_removed = instance.is_removed
+
+
+@receiver(post_delete, sender=Patient)
+def uncount_patient(sender, instance, **kwargs):
+    if not instance.is_removed:
+        counters.add_patient_count(instance.doctor_id, -1)
+
+
+@receiver(post_delete, sender=MedicalHistory)
+def uncount_visit(sender, instance, **kwargs):
+    if not instance.is_removed:
+        counters.add_visit_count(instance.patient_id, -1)
@@ -0,0 +1,312 @@
+import base64
+import os
+import tempfile
+import uuid
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.lazy_encryption import finish_request_stats, start_request_stats
+from core.metrics import render_prometheus
+from doctors import inference_client
+from doctors.background import run_job_batch
+from doctors.method import CURSOR_NEXT, get_keyset_filter
+from doctors.models import (GENDER_CHOICE, DiagnosisJob, Doctor, DoctorInfo, MedicalHistory, Patient, PatientInfo,
+                            PatientSummary)
+from doctors.name_index import filter_patients_by_name
+from doctors.record_writer import DiagnosisRecordWriter
+from doctors.result_cache import INLINE_IMAGE_KEYS, get_cache, get_result_key
+from doctors.views_util import (annotate_patient_list, get_patient_info, get_patients, get_patients_history_result,
+                                get_record_graph_version, lookup_patient)
+
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT')
+
+
+def create_doctor(username='doctor'):
+    user_model = get_user_model()
+    user = user_model.objects.create(**{user_model.USERNAME_FIELD: username})
+    doctor = Doctor.objects.create(user=user)
+    DoctorInfo.objects.create(doctor=doctor, name='김의사')
+    return doctor
+
+
+def create_patient(doctor, reg_no, name='홍길동', age=date(1990, 1, 2)):
+    patient = Patient.objects.create(doctor=doctor, patient_reg_no=reg_no)
+    PatientInfo.objects.create(patient=patient, name=name, age=age, gender=GENDER_CHOICE[0][0])
+    return patient
+
+
+def write_records(doctor, reg_nos):
+    writer = DiagnosisRecordWriter()
+    for reg_no in reg_nos:
+        # 파일 이름(문자열)을 넘기면 스토리지에 올리지 않는다.
+        writer.add(doctor.pk, reg_no, {'name': '김환자', 'birth': date(1980, 5, 6), 'sex': GENDER_CHOICE[0][0]},
+                   'fundus_left/left.jpg', 'fundus_right/right.jpg', 'amd', ['normal'],
+                   'hit_left/left.jpg', 'hit_right/right.jpg')
+    return writer
+
+
+def count_data_queries(context: CaptureQueriesContext) -> int:
+    """
+    트랜잭션 제어 문(SAVEPOINT 등)을 제외한 쿼리 수. TestCase 안에서는 atomic이 SAVEPOINT로 바뀐다.
+    """
+    return sum(1 for query in context.captured_queries
+               if not query['sql'].upper().startswith(TRANSACTION_STATEMENTS))
+
+
+class LazyEncryptedFieldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patient = create_patient(cls.doctor, '1000')
+
+    def test_loaded_patient_info_returns_plaintext(self):
+        patient_info = PatientInfo.objects.get(patient=self.patient)
+        self.assertIs(type(patient_info.name), str)
+        self.assertIs(type(patient_info._name), str)
+        self.assertEqual(patient_info.name, '홍길동')
+        self.assertIs(type(patient_info.age), date)
+        self.assertEqual(patient_info.age, date(1990, 1, 2))
+
+    def test_related_access_returns_plaintext(self):
+        patient = Patient.objects.select_related('patient_info', 'doctor__doctor_info').get(pk=self.patient.pk)
+        self.assertIs(type(patient.patient_info.name), str)
+        self.assertIs(type(patient.doctor.doctor_info.name), str)
+        self.assertEqual(patient.doctor.doctor_info.name, '김의사')
+
+    def test_decrypts_only_on_access(self):
+        token = start_request_stats()
+        patient_infos = list(PatientInfo.objects.all())
+        self.assertEqual(finish_request_stats(token), 0)
+
+        token = start_request_stats()
+        patient_infos[0].name
+        patient_infos[0].name
+        self.assertEqual(finish_request_stats(token), 1)
+
+    def test_save_without_access_keeps_search_hash(self):
+        patient_info = PatientInfo.objects.get(patient=self.patient)
+        patient_info.gender = GENDER_CHOICE[-1][0]
+        patient_info.save()
+        self.assertTrue(PatientInfo.objects.filter(name='홍길동', age=date(1990, 1, 2)).exists())
+
+    def test_changed_name_is_searchable(self):
+        patient_info = PatientInfo.objects.get(patient=self.patient)
+        patient_info.name = '이영희'
+        patient_info.save()
+        self.assertEqual(PatientInfo.objects.get(name='이영희').name, '이영희')
+
+
+class DiagnosisRecordWriterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        create_patient(cls.doctor, '1000')
+        # 기존 환자의 요약(PatientSummary)을 만들어 두어 갱신/생성 경로를 모두 탄다.
+        write_records(cls.doctor, ['1000']).write()
+
+    def test_write_uses_max_queries_regardless_of_batch_size(self):
+        for reg_nos in (['1000', '2000'], ['1000', '3000', '4000', '3000', '5000']):
+            writer = write_records(self.doctor, reg_nos)
+            with CaptureQueriesContext(connection) as context:
+                records = writer.write()
+            self.assertEqual(count_data_queries(context), DiagnosisRecordWriter.MAX_QUERIES)
+            self.assertEqual(len(records), len(reg_nos))
+
+    def test_write_saves_record_graph(self):
+        records = write_records(self.doctor, ['1000', '2000', '2000']).write()
+        self.assertEqual(records[1].patient, records[2].patient)
+        self.assertEqual(Patient.objects.filter(doctor=self.doctor).count(), 2)
+        self.assertEqual(MedicalHistory.objects.filter(patient__patient_reg_no='2000').count(), 2)
+        self.assertEqual(PatientInfo.objects.get(patient=records[1].patient).name, '김환자')
+        self.assertEqual(PatientSummary.objects.get(patient=records[0].patient).visit_count, 2)
+        history = MedicalHistory.objects.select_related('fundus_image_left__disease_left').get(
+            pk=records[0].medical_history.pk)
+        self.assertEqual(history.fundus_image_left.left_image.name, 'fundus_left/left.jpg')
+        self.assertEqual(history.fundus_image_left.disease_left.amd, '1')
+
+
+class PatientListQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        for index in range(3):
+            patient = create_patient(cls.doctor, f'20{index}')
+            for _ in range(index):
+                MedicalHistory.objects.create(patient=patient)
+
+    def add_patients(self, count):
+        for index in range(count):
+            patient = create_patient(self.doctor, f'30{index}')
+            MedicalHistory.objects.create(patient=patient)
+
+    def test_annotate_patient_list_reads_page_in_one_query(self):
+        self.add_patients(4)
+        with self.assertNumQueries(1):
+            patients = [get_patient_info(patient)
+                        for patient in annotate_patient_list(Patient.objects.filter(doctor=self.doctor))]
+        self.assertEqual(len(patients), 7)
+        self.assertEqual(sorted(patient['visit_count'] for patient in patients), [0, 1, 1, 1, 1, 1, 2])
+        self.assertEqual(sum(patient['recent'] == 'No history' for patient in patients), 1)
+
+    def test_get_patients_query_count_does_not_grow_with_page_size(self):
+        with CaptureQueriesContext(connection) as context:
+            data = get_patients('', str(self.doctor.pk))
+        self.assertEqual(len(data['patients']), 3)
+
+        self.add_patients(5)
+        with self.assertNumQueries(len(context.captured_queries)):
+            data = get_patients('', str(self.doctor.pk))
+        self.assertEqual(len(data['patients']), 8)
+
+    @override_settings(PAGINATION_EXACT_COUNT_LIMIT=1)
+    def test_page_numbers_kept_above_exact_count_limit(self):
+        data = get_patients('page=1', str(self.doctor.pk))
+        self.assertEqual(data['pages'], [{'num_page': 1}])
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(data['total_count'], 3)
+
+    def test_keyset_filter_adds_null_term_only_for_nullable_key(self):
+        position = (timezone.now(), uuid.uuid4(), CURSOR_NEXT)
+        not_null = MedicalHistory.objects.filter(get_keyset_filter('created', *position))
+        nullable = MedicalHistory.objects.filter(get_keyset_filter('created', *position, nullable=True))
+        self.assertNotIn('IS NULL', str(not_null.query))
+        self.assertIn('IS NULL', str(nullable.query))
+
+
+class LookupPatientTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_miss_is_not_cached(self):
+        self.assertIsNone(lookup_patient(self.doctor.pk, 'account', '4000'))
+        create_patient(self.doctor, '4000_account')
+        self.assertEqual(lookup_patient(self.doctor.pk, 'account', '4000')['name'], '홍길동')
+
+    def test_hit_is_cached(self):
+        create_patient(self.doctor, '4000_account')
+        lookup_patient(self.doctor.pk, 'account', '4000_account')
+        with self.assertNumQueries(0):
+            self.assertEqual(lookup_patient(self.doctor.pk, 'account', '4000')['name'], '홍길동')
+
+
+def make_inference_result():
+    hit_map = base64.b64encode(b'hitmap').decode()
+    return {'left_eye': 'fundus_left/left.jpg', 'right_eye': 'fundus_right/right.jpg',
+            'upload': {'left_eye_prediction': 'AMD', 'right_eye_prediction': 'Normal',
+                       'hit_map_left': hit_map, 'hit_map_right': hit_map}}
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RunJobBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        # 다른 의사의 같은 등록번호 환자가 있으면 새 환자 INSERT가 unique 제약으로 실패한다.
+        create_patient(create_doctor('other'), '9000')
+
+    def create_job(self, reg_no):
+        return DiagnosisJob.objects.create(doctor=self.doctor, reg_no=reg_no, name='김환자', birth='1980-05-06',
+                                           gender=GENDER_CHOICE[0][0], eye_image_first='diagnosis_job/first.jpg',
+                                           eye_image_second='diagnosis_job/second.jpg',
+                                           status=DiagnosisJob.STATUS_RUNNING, attempts=1)
+
+    def test_bad_record_fails_only_its_own_job(self):
+        jobs = [self.create_job(reg_no) for reg_no in ('5000', '9000', '6000')]
+        with mock.patch('doctors.background.load_job_images', return_value=[]), \
+                mock.patch('doctors.background.request_inference_batch',
+                           side_effect=lambda image_sets: [make_inference_result() for _ in image_sets]):
+            run_job_batch(jobs)
+
+        statuses = dict(DiagnosisJob.objects.values_list('reg_no', 'status'))
+        self.assertEqual(statuses['5000'], DiagnosisJob.STATUS_DONE)
+        self.assertEqual(statuses['6000'], DiagnosisJob.STATUS_DONE)
+        self.assertEqual(statuses['9000'], DiagnosisJob.STATUS_PENDING)
+        self.assertEqual(MedicalHistory.objects.filter(patient__doctor=self.doctor).count(), 2)
+        self.assertFalse(DiagnosisJob.objects.filter(status=DiagnosisJob.STATUS_DONE, medical_history=None).exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DIAGNOSIS_INLINE_IMAGES=True, RESULT_CACHE_ENABLED=True)
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        doctor = create_doctor()
+        writer = write_records(doctor, ['7000'])
+        record = writer.records[0]
+        for attr in ('left_eye', 'right_eye', 'hit_left', 'hit_right'):
+            setattr(record, attr, default_storage.save(getattr(record, attr), ContentFile(attr.encode())))
+        writer.write()
+        self.patient_pk, self.history_pk = record.patient.pk, record.medical_history.pk
+
+    def test_inline_images_are_not_cached_but_refilled(self):
+        built = get_patients_history_result(self.patient_pk, self.history_pk)
+        self.assertEqual(built['left_img_path'], base64.b64encode(b'left_eye').decode())
+
+        version = get_record_graph_version(self.history_pk)
+        cached = get_cache().get(get_result_key(self.patient_pk, self.history_pk, version))
+        self.assertFalse(set(INLINE_IMAGE_KEYS) & set(cached))
+
+        context = get_patients_history_result(self.patient_pk, self.history_pk)
+        for key in INLINE_IMAGE_KEYS:
+            self.assertEqual(context[key], built[key])
+
+    def test_api_result_skips_inline_images(self):
+        context = get_patients_history_result(self.patient_pk, self.history_pk, inline_images=False)
+        self.assertIsNone(context['left_img_path'])
+        self.assertIsNotNone(context['left_img_url'])
+
+
+class PatientNameIndexSignalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = create_doctor()
+        cls.patient = create_patient(cls.doctor, '8000')
+
+    def search(self, name):
+        return filter_patients_by_name(Patient.objects.filter(doctor=self.doctor), name, doctor_pk=self.doctor.pk)
+
+    def test_save_without_name_change_skips_reindex(self):
+        patient_info = PatientInfo.objects.get(patient=self.patient)
+        patient_info.gender = GENDER_CHOICE[-1][0]
+        token = start_request_stats()
+        with self.assertNumQueries(1):
+            patient_info.save()
+        self.assertEqual(finish_request_stats(token), 0)
+
+        patient_info.name
+        with self.assertNumQueries(1):
+            patient_info.save()
+
+    def test_name_change_reindexes(self):
+        patient_info = PatientInfo.objects.select_related('patient').get(patient=self.patient)
+        patient_info.name = '이영희'
+        patient_info.save()
+        self.assertEqual(list(self.search('이영')), [self.patient])
+        self.assertFalse(self.search('홍길').exists())
+
+
+@override_settings(METRICS_MULTIPROC_DIR='')
+class InferenceMetricsTests(TestCase):
+    def test_endpoint_stats_are_exported(self):
+        client = inference_client.InferenceClient(
+            {'classify': inference_client.InferenceEndpoint('classify', 'http://127.0.0.1:9/', 0.1, 0.1)})
+        stats = client.stats['classify']
+        stats.requests, stats.retries, stats.timeouts, stats.latency_ms_total = 3, 2, 1, 250
+        with mock.patch.object(inference_client, '_client', client), \
+                mock.patch.object(inference_client, '_client_pid', os.getpid()):
+            output = render_prometheus()
+        self.assertIn('doctoreye_inference_requests_total{endpoint="classify"} 3', output)
+        self.assertIn('doctoreye_inference_timeouts_total{endpoint="classify"} 1', output)
+        self.assertIn('doctoreye_inference_latency_ms_total{endpoint="classify"} 250', output)
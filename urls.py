@@ -9,7 +9,11 @@ urlpatterns = [
     path(r'<uuid:doctor_pk>/patients/detail/<uuid:patient_pk>/', views.show_patients_detail, name='show_patients_detail'),
     path(r'<uuid:doctor_pk>/diagnose/', views.get_diagnose_template, name='get_diagnose_template'),
     path(r'<uuid:doctor_pk>/diagnose/result/', views.diagnose_result, name='diagnose_result'),
+    path(r'<uuid:doctor_pk>/diagnose/jobs/', views.diagnose_job, name='diagnose_job'),
+    path(r'<uuid:doctor_pk>/diagnose/batch/', views.diagnose_batch, name='diagnose_batch'),
+    path(r'<uuid:doctor_pk>/diagnose/jobs/<uuid:job_pk>/', views.diagnosis_job_status, name='diagnosis_job_status'),
     path(r'<uuid:doctor_pk>/patients/detail/<uuid:patient_pk>/result/<uuid:history_pk>/', views.show_patients_history_result, name='show_patients_history_result'),
+    path(r'<uuid:doctor_pk>/patients/result/<uuid:history_pk>/images/<str:kind>/', views.show_history_image, name='show_history_image'),
     path(r'getpatientsinfo/', views.get_patients_info, name='get_patients_info'),
     path(r'brain/', views.brain, name='brain'),
 ]
@@ -1,13 +1,20 @@
 # django
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
+from django.conf import settings
 # core
 from core.decorator import is_doctor_required
-from doctors.models import Patient, PatientInfo
+from doctors.models import DiagnosisJob
 # apps
-from doctors.views_util import get_patients, get_patients_detail, get_patients_history_result, save_diagnosis_info
+from doctors.background import enqueue_diagnosis_batch, enqueue_diagnosis_job, get_job_status
+from doctors.image_delivery import get_history_image, serve_image
+from doctors.image_derivatives import VARIANT_ORIGINAL, get_derivative, pick_variant
+from doctors.views_util import (DiagnosisError, get_diagnosis_form, get_patients, get_patients_detail,
+                                get_patients_history_result, load_medical_record_graph, lookup_patient,
+                                save_diagnosis_info, search_reg_no_prefix)
 
 
 @login_required(login_url="/users/prepare_login/")
@@ -35,10 +42,39 @@ def show_patients_history_result(request, doctor_pk, patient_pk, history_pk):
     return render(request, 'doctors/diagnose-result.html', context=context)
 
 
+@is_doctor_required
+@login_required(login_url="/users/prepare_login/")
+@require_http_methods(["GET", "HEAD"])
+def show_history_image(request, doctor_pk, history_pk, kind):
+    """
+    진단 결과의 안저/hitmap 이미지를 전송합니다. 본인 환자의 기록만 조회할 수 있습니다.
+    ?size=thumbnail|screen|original 또는 ?w=<표시 폭>으로 가장 작은 적합한 파생본을 받을 수 있습니다.
+    """
+    from django.http import Http404
+    medical_history = load_medical_record_graph(history_pk)
+    if medical_history is None or medical_history.patient.doctor_id != request.user.doctor.id:
+        raise Http404
+    instance, field_file = get_history_image(medical_history, kind)
+    if field_file is None:
+        raise Http404
+
+    width = request.GET.get('w', '')
+    variant = pick_variant(request.GET.get('size'), int(width) if width.isdigit() else None)
+    if variant != VARIANT_ORIGINAL:
+        derivative = get_derivative(field_file, variant)
+        if derivative is not None:
+            instance, field_file = derivative, derivative.file
+    return serve_image(request, instance, field_file)
+
+
 @is_doctor_required
 @login_required(login_url="/users/prepare_login/")
 @require_http_methods(["POST"])
 def diagnose_result(request, doctor_pk):
+    # 비동기 진단은 JSON을 받는 fetch 요청에만 적용한다. 일반 폼 제출은 기존처럼 결과 페이지를 렌더링한다.
+    if getattr(settings, 'DIAGNOSIS_ASYNC', False) and accepts_json(request):
+        return create_diagnosis_job(request, doctor_pk)
+
     context = save_diagnosis_info(request, doctor_pk)
 
     # save_diagnosis_info가 오류 dict를 반환한 경우
@@ -50,6 +86,95 @@ def diagnose_result(request, doctor_pk):
     return render(request, 'doctors/diagnose-result.html', context)
 
 
+def accepts_json(request):
+    return ('application/json' in request.headers.get('Accept', '') or
+            request.headers.get('X-Requested-With') == 'XMLHttpRequest')
+
+
+def create_diagnosis_job(request, doctor_pk):
+    """
+    이미지를 저장하고 진단 작업을 등록한 뒤, 추론을 기다리지 않고 job id를 즉시 반환합니다.
+    """
+    from django.urls import reverse
+    reg_no = f'{request.POST.get("reg_no")}_{request.user.account}'
+    try:
+        job = enqueue_diagnosis_job(request.user.doctor.id, reg_no, get_diagnosis_form(request.POST),
+                                    request.FILES.getlist('eye_image_input'))
+    except DiagnosisError as e:
+        return JsonResponse({"status": "error", "message": e.message}, status=400)
+
+    status_url = reverse('doctors:diagnosis_job_status', kwargs={'doctor_pk': doctor_pk, 'job_pk': job.id})
+    return JsonResponse({"job_id": str(job.id), "status": job.status, "status_url": status_url}, status=202)
+
+
+@is_doctor_required
+@login_required(login_url="/users/prepare_login/")
+@require_http_methods(["POST"])
+def diagnose_job(request, doctor_pk):
+    return create_diagnosis_job(request, doctor_pk)
+
+
+@is_doctor_required
+@login_required(login_url="/users/prepare_login/")
+@require_http_methods(["POST"])
+def diagnose_batch(request, doctor_pk):
+    """
+    검진 세션용 배치 진단
+    patients: 환자 정보 JSON 리스트 [{"reg_no", "name", "birth", "sex", "symptom_by_patient", "memo_by_doctor"}, ...]
+    eye_image_input_{순번}: 각 환자의 좌/우안 이미지 2장
+    """
+    import json
+    from django.urls import reverse
+    try:
+        patients_data = json.loads(request.POST.get('patients', '[]'))
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "환자 정보 형식이 올바르지 않습니다."}, status=400)
+
+    max_patients = getattr(settings, 'DIAGNOSIS_BATCH_MAX_PATIENTS', 50)
+    if not isinstance(patients_data, list) or not patients_data:
+        return JsonResponse({"status": "error", "message": "환자 정보가 없습니다."}, status=400)
+    if len(patients_data) > max_patients:
+        return JsonResponse({"status": "error", "message": f"한 번에 최대 {max_patients}명까지 진단할 수 있습니다."},
+                            status=400)
+
+    patients = []
+    for idx, patient_data in enumerate(patients_data):
+        eye_images = request.FILES.getlist(f'eye_image_input_{idx}')
+        if not isinstance(patient_data, dict) or len(eye_images) != 2:
+            return JsonResponse({"status": "error", "index": idx,
+                                 "message": "좌/우안 이미지 2장을 모두 업로드해주세요."}, status=400)
+        patients.append({
+            'reg_no': f'{patient_data.get("reg_no")}_{request.user.account}',
+            'form': get_diagnosis_form(patient_data),
+            'eye_images': eye_images,
+        })
+
+    jobs = enqueue_diagnosis_batch(request.user.doctor.id, patients)
+    return JsonResponse({
+        "batch_id": str(jobs[0].batch_id),
+        "jobs": [
+            {
+                "index": idx,
+                "job_id": str(job.id),
+                "status": job.status,
+                "status_url": reverse('doctors:diagnosis_job_status', kwargs={'doctor_pk': doctor_pk,
+                                                                              'job_pk': job.id}),
+            }
+            for idx, job in enumerate(jobs)
+        ],
+    }, status=202)
+
+
+@is_doctor_required
+@login_required(login_url="/users/prepare_login/")
+@require_http_methods(["GET"])
+def diagnosis_job_status(request, doctor_pk, job_pk):
+    job = DiagnosisJob.objects.filter(id=job_pk, doctor_id=request.user.doctor.id).first()
+    if job is None:
+        return JsonResponse({"error": "Job not found."}, status=404)
+    return JsonResponse(get_job_status(job))
+
+
 @is_doctor_required
 def get_diagnose_template(request, doctor_pk):
     check_patient_url = '/doctors/getpatientsinfo/'
@@ -60,38 +185,24 @@ def get_patients_info(request):
     """
     주어진 reg_no와 request.user.account를 기반으로 환자 정보를 조회하여 JSON 응답을 반환합니다.
     환자 정보가 없거나 reg_no가 제공되지 않으면 적절한 오류 메시지를 반환합니다.
+    ?prefix= 로 요청하면 등록번호 앞부분이 일치하는 환자 목록(자동완성)을 반환합니다.
     """
-    from django.db.models import Q
-    from django.http import JsonResponse
+    doctor_pk = request.user.doctor.id
+    prefix = request.GET.get("prefix", "").strip()
+    if prefix:
+        return JsonResponse({"patients": search_reg_no_prefix(doctor_pk, request.user.account, prefix)})
+
     reg_no = request.GET.get("reg_no", "").strip()
     if not reg_no:
         return JsonResponse({"error": "Registration number is missing."}, status=400)
 
-    # 사용자 계정과 결합한 등록번호 생성
-    combined_reg_no = f"{reg_no}_{request.user.account}"
-
-    # Patient 모델에서 combined_reg_no 또는 reg_no가 일치하고, 해당 의사의 환자인 항목을 조회
-    patient_qs = Patient.objects.filter(
-        Q(patient_reg_no=combined_reg_no) | Q(patient_reg_no=reg_no),
-        doctor_id=request.user.doctor.id
-    )
-
-    if not patient_qs.exists():
+    context = lookup_patient(doctor_pk, request.user.account, reg_no)
+    if context is None:
         return JsonResponse({"error": "Patient not found."}, status=404)
-
-    patient = patient_qs.first()
-
-    try:
-        patient_info = PatientInfo.objects.get(patient=patient)
-    except PatientInfo.DoesNotExist:
+    if not context:
         return JsonResponse({"error": "Patient information not found."}, status=404)
-
-    context = {
-        "name": patient_info.name,
-        "birth": patient_info.age,  # 만약 birth가 생년월일이면, 변수명 수정 고려
-        "gender": patient_info.gender,
-    }
     return JsonResponse(context)
 
+
 def brain(request):
     return render(request, 'doctors/brain.html')
\ No newline at end of file
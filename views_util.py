@@ -1,24 +1,32 @@
 # django
+import hashlib
 import uuid
 from io import BytesIO
-from time import sleep
 import datetime
 
-import requests
 from django.contrib import messages
 
 # core
 from core import constants
+from core.asset_registry import get_report_assets
+from core.lazy_encryption import decrypt_fields
 
-from core.utils import Disease, Gender, calculate_age
+from core.utils import Disease, Gender, calculate_age, mask_korean_name
 # apps
+from doctors.counters import get_patient_count, get_visit_count, is_shared as counters_shared
 from doctors.helpers import QueryStringHelper
+from doctors.inference_cache import get_inference_cache, hash_image
+from doctors.inference_client import InferenceServiceError, get_inference_client
+from doctors.record_writer import DiagnosisRecord, DiagnosisRecordWriter
+from doctors.result_cache import get_or_build_result, make_version
 
-from doctors.models import (DiagnosisFile, DiseaseLeft, DiseaseRight, FundusHitmapImageLeft, FundusHitmapImageRight,
+from doctors.models import (DiseaseLeft, DiseaseRight, FundusHitmapImageLeft, FundusHitmapImageRight,
                             FundusImageLeft, Doctor,
-                            FundusImageRight, MedicalHistory, MemoHistory, Patient, PatientInfo)
+                            FundusImageRight, MedicalHistory, Patient, PatientInfo)
 
 from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from typing import List, Optional, Dict
 from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
 from django.db.models.fields.files import ImageFieldFile
@@ -79,24 +87,68 @@ def encode_image_to_base64(image_file):
     return img_base64
 
 
-def load_img_base(path):
-    with open(path, "rb") as img_file:
-        bytes = img_file.read()
-    img_base64 = base64.b64encode(bytes).decode()
-    return img_base64
+def get_object_or_none(model, **kwargs):
+    return model.objects.filter(**kwargs).first()
 
 
-def get_object_or_none(model, **kwargs):
-    smtm = model.objects.filter(**kwargs)
-    if smtm.exists():
-        return smtm.first()
-    return None
+RECORD_GRAPH_RELATIONS = (
+    'patient__patient_info',
+    'fundus_image_left__disease_left',
+    'fundus_image_left__fundus_hitmap_image_left',
+    'fundus_image_right__disease_right',
+    'fundus_image_right__fundus_hitmap_image_right',
+)
+
+
+def load_medical_record_graph(history_pk) -> Optional[MedicalHistory]:
+    """
+    결과 페이지에 필요한 방문 히스토리 그래프(환자, 환자 정보, 좌/우안 이미지, 병변, hitmap)를
+    OneToOne 관계를 따라 select_related 하여 한 번의 쿼리로 가져옵니다.
+    """
+    return (MedicalHistory.objects
+            .select_related(*RECORD_GRAPH_RELATIONS)
+            .filter(id=history_pk)
+            .first())
+
+
+def get_record_graph_version(history_pk) -> Optional[str]:
+    """
+    load_medical_record_graph가 읽는 행들의 modified 값(행이 없으면 NULL)으로 결과 캐시 버전을 만듭니다.
+    값만 읽는 한 번의 쿼리이며, 방문 기록이 없으면 None을 반환합니다.
+    """
+    paths = []
+    for relation in RECORD_GRAPH_RELATIONS:
+        parts = relation.split('__')
+        for i in range(1, len(parts) + 1):
+            path = '__'.join(parts[:i])
+            if path not in paths:
+                paths.append(path)
+    # 이미지 URL에 들어가는 담당 의사도 버전에 포함한다.
+    fields = ['modified', 'patient__doctor_id'] + [f'{path}__modified' for path in paths]
+    values = MedicalHistory.objects.filter(id=history_pk).values_list(*fields).first()
+    return make_version(values) if values is not None else None
+
+
+def get_related_or_none(instance, related_name):
+    """
+    select_related로 채워진 역참조 OneToOne 객체를 반환합니다. 없거나 삭제 처리된 경우 None.
+    """
+    if instance is None:
+        return None
+    # RelatedObjectDoesNotExist는 AttributeError의 하위 클래스이므로 getattr 기본값으로 처리된다.
+    related = getattr(instance, related_name, None)
+    if related is None or getattr(related, 'is_removed', False):
+        return None
+    return related
 
 
 class MedicalRecodeInfo:
-    def __init__(self, patient_pk, history_pk):
+    def __init__(self, patient_pk, history_pk, inline_images: Optional[bool] = None):
         self.patient_pk = patient_pk
         self.history_pk = history_pk
+        if inline_images is None:
+            inline_images = getattr(settings, 'DIAGNOSIS_INLINE_IMAGES', True)
+        self.inline_images = inline_images
 
         self.name = None
         self.age = None
@@ -109,11 +161,17 @@ class MedicalRecodeInfo:
         self.right_img_path = None
         self.right_label = None
         self.right_data_value = None
-        self.logo_img_path = load_img_base('static/images/logo/logo.png')
+        self.logo_img_path = get_report_assets().get_base64('logo')
         self.hit_left_path = None
         self.hit_right_path = None
+        self.left_img_url = None
+        self.right_img_url = None
+        self.hit_left_url = None
+        self.hit_right_url = None
         self.patient_reg_no = None
+        self.image_names = {}
 
+        self.graph_loaded = False
         self.obj = {
             "patient_info": None,
             "medical_history": None,
@@ -142,10 +200,16 @@ class MedicalRecodeInfo:
             "logo_img_path": self.logo_img_path,
             "hit_left_path": self.hit_left_path,
             "hit_right_path": self.hit_right_path,
+            "left_img_url": self.left_img_url,
+            "right_img_url": self.right_img_url,
+            "hit_left_url": self.hit_left_url,
+            "hit_right_url": self.hit_right_url,
             "patient_reg_no": self.patient_reg_no,
+            "image_names": self.image_names,
         }
 
     def processor_diagnose_result_data_maker(self):
+        self.load_record_graph()
         self.build_name()
         self.build_age()
         self.build_sex()
@@ -169,37 +233,64 @@ class MedicalRecodeInfo:
                 self.patient_reg_no = None
         return self.patient_reg_no
 
+    def load_record_graph(self):
+        """
+        load_medical_record_graph 결과로 self.obj를 채웁니다.
+        이후 get_* 메서드는 추가 쿼리 없이 채워진 객체(또는 None)를 반환합니다.
+        """
+        medical_history = load_medical_record_graph(self.history_pk)
+        if medical_history is None:
+            return
+        patient = medical_history.patient
+        fundus_image_left = get_related_or_none(medical_history, 'fundus_image_left')
+        fundus_image_right = get_related_or_none(medical_history, 'fundus_image_right')
+
+        self.obj.update({
+            "medical_history": medical_history,
+            "fundus_image_left": fundus_image_left,
+            "fundus_image_right": fundus_image_right,
+            "disease_left": get_related_or_none(fundus_image_left, 'disease_left'),
+            "disease_right": get_related_or_none(fundus_image_right, 'disease_right'),
+            "fundus_hit_left": get_related_or_none(fundus_image_left, 'fundus_hitmap_image_left'),
+            "fundus_hit_right": get_related_or_none(fundus_image_right, 'fundus_hitmap_image_right'),
+        })
+        # 환자 정보는 URL의 patient_pk 기준이므로, 히스토리의 환자와 같을 때만 그래프 값을 사용한다.
+        if str(medical_history.patient_id) == str(self.patient_pk):
+            self.obj["patient_info"] = get_related_or_none(patient, 'patient_info')
+            self.patient_reg_no = patient.patient_reg_no
+            self.graph_loaded = True
+
     def get_dict_info(self):
         return self.__dict__
 
     def get_patient_info(self):
-        if self.obj['patient_info'] == None:
+        if self.obj['patient_info'] == None and not self.graph_loaded:
             patient_info: Optional[PatientInfo] = get_object_or_none(PatientInfo, patient_id=self.patient_pk)
             self.obj['patient_info'] = patient_info
         return self.obj.get('patient_info')
 
     def get_medical_history(self):
-        if self.obj['medical_history'] == None:
+        if self.obj['medical_history'] == None and not self.graph_loaded:
             medical_history: Optional[MedicalHistory] = get_object_or_none(MedicalHistory, id=self.history_pk)
             self.obj['medical_history'] = medical_history
         return self.obj.get('medical_history')
 
     def get_fundus_image_left(self):
-        if self.obj['fundus_image_left'] == None:
+        if self.obj['fundus_image_left'] == None and not self.graph_loaded:
             fundus_image_left: Optional[FundusImageLeft] = get_object_or_none(FundusImageLeft,
                                                                               medical_history_id=self.history_pk)
             self.obj['fundus_image_left'] = fundus_image_left
         return self.obj.get('fundus_image_left')
 
     def get_fundus_image_right(self):
-        if self.obj['fundus_image_right'] == None:
+        if self.obj['fundus_image_right'] == None and not self.graph_loaded:
             fundus_image_right: Optional[FundusImageRight] = get_object_or_none(FundusImageRight,
                                                                                 medical_history_id=self.history_pk)
             self.obj['fundus_image_right'] = fundus_image_right
         return self.obj.get('fundus_image_right')
 
     def get_disease_left(self):
-        if self.obj['disease_left'] == None:
+        if self.obj['disease_left'] == None and not self.graph_loaded:
             if self.obj['fundus_image_left'] != None:
                 disease_left: Optional[DiseaseLeft] = get_object_or_none(DiseaseLeft, fundus_left_id=self.obj.get(
                     'fundus_image_left').id)
@@ -208,7 +299,7 @@ class MedicalRecodeInfo:
         return self.obj.get('disease_left')
 
     def get_disease_right(self):
-        if self.obj['disease_right'] == None:
+        if self.obj['disease_right'] == None and not self.graph_loaded:
             if self.obj['fundus_image_right'] is not None and isinstance(self.obj['fundus_image_right'], FundusImageRight):
                 disease_right: Optional[DiseaseRight] = get_object_or_none(DiseaseRight, fundus_right_id=self.obj.get(
                     'fundus_image_right').id)
@@ -217,7 +308,7 @@ class MedicalRecodeInfo:
         return self.obj.get('disease_right')
 
     def get_hit_left(self):
-        if self.obj['fundus_hit_left'] == None:
+        if self.obj['fundus_hit_left'] == None and not self.graph_loaded:
             if self.obj['fundus_image_left'] != None and isinstance(self.obj['fundus_image_left'], FundusImageLeft):
                 fundus_hit_left: Optional[FundusHitmapImageLeft] = get_object_or_none(FundusHitmapImageLeft,
                                                                                       fundus_left_id=self.obj.get(
@@ -226,7 +317,7 @@ class MedicalRecodeInfo:
         return self.obj.get('fundus_hit_left')
 
     def get_hit_right(self):
-        if self.obj['fundus_hit_right'] == None:
+        if self.obj['fundus_hit_right'] == None and not self.graph_loaded:
             if self.obj['fundus_image_right'] != None and isinstance(self.obj['fundus_image_right'], FundusImageRight):
                 fundus_hit_right: Optional[FundusHitmapImageRight] = get_object_or_none(FundusHitmapImageRight,
                                                                                         fundus_right_id=self.obj.get(
@@ -235,6 +326,30 @@ class MedicalRecodeInfo:
         return self.obj.get('fundus_hit_right')
 
 
+    def get_image_url(self, kind):
+        from django.urls import reverse
+        medical_history = self.get_medical_history()
+        if not isinstance(medical_history, MedicalHistory) or medical_history.patient.doctor_id is None:
+            return None
+        url = reverse('doctors:show_history_image', kwargs={
+            'doctor_pk': medical_history.patient.doctor_id,
+            'history_pk': medical_history.id,
+            'kind': kind,
+        })
+        size = getattr(settings, 'DIAGNOSIS_RESULT_IMAGE_SIZE', 'screen')
+        return f'{url}?size={size}' if size else url
+
+    def build_image(self, kind, field_file):
+        """
+        이미지 URL과, DIAGNOSIS_INLINE_IMAGES 설정 시(기본값, 현재 템플릿은 *_path를 읽는다) base64 문자열을
+        (base64, url)로 반환합니다. 캐시된 결과에서 base64를 다시 만들 수 있도록 저장 파일 이름을 남깁니다.
+        """
+        if not field_file:
+            return None, None
+        self.image_names[kind] = field_file.name
+        img_base64 = encode_image_to_base64(field_file) if self.inline_images else None
+        return img_base64, self.get_image_url(kind)
+
     def build_name(self):
         patient_info = self.get_patient_info()
         if isinstance(patient_info, PatientInfo):
@@ -270,14 +385,15 @@ class MedicalRecodeInfo:
         if isinstance(fundus_image_left, FundusImageLeft):
             if hasattr(fundus_image_left, 'left_image'):
                 if isinstance(fundus_image_left.left_image, ImageFieldFile):
-                    self.left_img_path = encode_image_to_base64(fundus_image_left.left_image)
+                    self.left_img_path, self.left_img_url = self.build_image('left', fundus_image_left.left_image)
 
     def build_fundus_image_right(self):
         fundus_image_right = self.get_fundus_image_right()
         if isinstance(fundus_image_right, FundusImageRight):
             if hasattr(fundus_image_right, 'right_image'):
                 if isinstance(fundus_image_right.right_image, ImageFieldFile):
-                    self.right_img_path = encode_image_to_base64(fundus_image_right.right_image)
+                    self.right_img_path, self.right_img_url = self.build_image('right',
+                                                                              fundus_image_right.right_image)
 
     def build_disease_left(self):
         disease_left = self.get_disease_left()
@@ -297,28 +413,73 @@ class MedicalRecodeInfo:
         if isinstance(fundus_hit_left, FundusHitmapImageLeft):
             if hasattr(fundus_hit_left, 'hit_image_left'):
                 if isinstance(fundus_hit_left.hit_image_left, ImageFieldFile):
-                    self.hit_left_path = encode_image_to_base64(fundus_hit_left.hit_image_left)
+                    self.hit_left_path, self.hit_left_url = self.build_image('hit_left',
+                                                                             fundus_hit_left.hit_image_left)
 
     def build_hit_right(self):
         fundus_hit_right = self.get_hit_right()
         if isinstance(fundus_hit_right, FundusHitmapImageRight):
             if hasattr(fundus_hit_right, 'hit_image_right'):
                 if isinstance(fundus_hit_right.hit_image_right, ImageFieldFile):
-                    self.hit_right_path = encode_image_to_base64(fundus_hit_right.hit_image_right)
+                    self.hit_right_path, self.hit_right_url = self.build_image('hit_right',
+                                                                               fundus_hit_right.hit_image_right)
 
 
-def get_patients_history_result(patient_pk: str, history_pk: str) -> Dict:
-    infoMaker = MedicalRecodeInfo(patient_pk=patient_pk, history_pk=history_pk)
+def build_patients_history_result(patient_pk: str, history_pk: str, inline_images: Optional[bool] = None) -> Dict:
+    infoMaker = MedicalRecodeInfo(patient_pk=patient_pk, history_pk=history_pk, inline_images=inline_images)
     infoMaker.processor_diagnose_result_data_maker()
     return infoMaker.get_basic_info()
 
 
+# build_image의 kind: (컨텍스트 키, 모델, 파일 필드)
+INLINE_IMAGE_FIELDS = {
+    'left': ('left_img_path', FundusImageLeft, 'left_image'),
+    'right': ('right_img_path', FundusImageRight, 'right_image'),
+    'hit_left': ('hit_left_path', FundusHitmapImageLeft, 'hit_image_left'),
+    'hit_right': ('hit_right_path', FundusHitmapImageRight, 'hit_image_right'),
+}
+
+
+def fill_inline_images(context: Dict) -> Dict:
+    """
+    캐시에는 base64 이미지를 넣지 않으므로, 저장 파일 이름(image_names)으로 다시 인코딩합니다.
+    """
+    for kind, name in (context.get('image_names') or {}).items():
+        key, model, field_name = INLINE_IMAGE_FIELDS[kind]
+        try:
+            with model._meta.get_field(field_name).storage.open(name, 'rb') as image_file:
+                context[key] = encode_image_to_base64(image_file)
+        except Exception as e:
+            print(f"인라인 이미지 인코딩 실패 {name}: {e}")
+    return context
+
+
+def get_patients_history_result(patient_pk: str, history_pk: str, version: Optional[str] = None,
+                                inline_images: Optional[bool] = None) -> Dict:
+    """
+    version(get_record_graph_version)을 이미 구했으면 넘겨서 버전 쿼리를 다시 실행하지 않습니다.
+    inline_images가 False이면(API) base64 이미지를 만들지 않습니다. None이면 DIAGNOSIS_INLINE_IMAGES를 따릅니다.
+    """
+    if inline_images is None:
+        inline_images = getattr(settings, 'DIAGNOSIS_INLINE_IMAGES', True)
+    if not getattr(settings, 'RESULT_CACHE_ENABLED', True):
+        return build_patients_history_result(patient_pk, history_pk, inline_images)
+    if version is None:
+        version = get_record_graph_version(history_pk)
+    return get_or_build_result(patient_pk, history_pk, version,
+                               lambda: build_patients_history_result(patient_pk, history_pk, inline_images),
+                               fill_inline_images if inline_images else None)
+
+
 def get_patients(req_meta_qs: str, doctor_pk: str) -> Dict:
     try:
-        patients: models.QuerySet[Patient] = Patient.objects.filter(doctor_id=doctor_pk)
+        patients: models.QuerySet[Patient] = annotate_patient_list(Patient.objects.filter(doctor_id=doctor_pk))
         qs_helper = QueryStringHelper(query_string=req_meta_qs, pk_set={'doctor_pk': doctor_pk})
         query_set = qs_helper.search_controller(patients)
-        query_set = qs_helper.page_controller(query_set)
+        query_set = qs_helper.sort_controller(query_set)
+        # 공유 캐시 카운터가 없으면 page_controller가 count_up_to로 센다.
+        patient_count = None if qs_helper.has_filters() or not counters_shared() else get_patient_count(doctor_pk)
+        query_set = qs_helper.page_controller(query_set, count=patient_count)
         num_page, page_index, adjacent_pages = qs_helper.num_page, qs_helper.page_index, qs_helper.adjacent_pages
         patients_data: list = get_patients_data(query_set, page_index)
         doctors_data: dict = get_doctor_data(Doctor.objects.filter(id=doctor_pk).first())
@@ -328,7 +489,10 @@ def get_patients(req_meta_qs: str, doctor_pk: str) -> Dict:
             'doctor': doctors_data,
             'pages': pages_data,
             'current_page': qs_helper.get_int("page"),
-            'search_name': qs_helper.get('search')
+            'search_name': qs_helper.get('search'),
+            'sort': qs_helper.get('sort'),
+            'disease': qs_helper.get('disease'),
+            **get_cursor_data(qs_helper)
         }
     except:
         return dict()
@@ -350,51 +514,72 @@ def convert_to_inmemory_uploaded_file(io_bytes):
     )
 
 
-def save_diagnosis_info(request, doctor_pk):
-    post = request.POST
-    eye_images = request.FILES.getlist('eye_image_input')
-    reg_no = f'{post.get("reg_no")}_{request.user.account}'
-    files_for_request = {}
+class DiagnosisError(Exception):
+    """
+    진단 파이프라인(classify -> upload -> 저장) 중 한 단계가 실패했을 때 발생합니다.
+    message는 사용자에게 그대로 노출되는 문구입니다.
+    """
 
-    # 각 이미지의 이름을 UUID 기반으로 재설정 후, FormData에 추가
-    for idx, image in enumerate(eye_images):
-        image.name = f'{uuid.uuid4()}.jpg'
-        files_for_request[f"file{idx + 1}"] = (image.name, image.file.getvalue(), image.content_type)
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def get_diagnosis_form(post) -> Dict:
+    """
+    진단 요청 POST 데이터에서 저장에 필요한 환자/메모 정보를 추출합니다.
+    """
+    return {
+        'name': post.get('name'),
+        'birth': post.get('birth'),
+        'sex': post.get('sex'),
+        'symptom_by_patient': post.get('symptom_by_patient'),
+        'memo_by_doctor': post.get('memo_by_doctor'),
+    }
 
-    classify_url = settings.CLASSIFY_URL
-    upload_url = settings.UPLOAD_URL
 
-    # Classification API 호출
+def request_classification(eye_images: List[UploadedFile]) -> Dict:
+    """
+    Classification API를 호출하여 좌/우안 판별 결과를 반환합니다.
+    """
+    files_for_request = {f"file{idx + 1}": image for idx, image in enumerate(eye_images)}
+
     try:
-        classify_response = requests.post(classify_url, files=files_for_request)
-        classify_response.raise_for_status()
-        data = classify_response.json()
-    except requests.RequestException as e:
+        return get_inference_client().post('classify', files_for_request)
+    except InferenceServiceError as e:
         print(f"Classification API 오류: {e}")
-        messages.warning(request, "❌ 이미지 분석 중 오류가 발생했습니다. 다시 시도해주세요.")
-        sleep(2)
-        return {"status": "error", "message": "이미지 분석 중 오류가 발생했습니다. 다시 시도해주세요."}
+        raise DiagnosisError("이미지 분석 중 오류가 발생했습니다. 다시 시도해주세요.")
+
 
-    # 왼쪽과 오른쪽 눈 이미지 구분
+def split_eye_images(eye_images: List[UploadedFile], data: Dict):
+    """
+    Classification 결과의 left_eye 파일명을 기준으로 좌/우안 이미지를 구분합니다.
+    """
     left_eye, right_eye = None, None
     for image in eye_images:
         if image.name == data.get("left_eye"):
             left_eye = image
         else:
             right_eye = image
+    return left_eye, right_eye
 
-    files_for_request_2 = {"left_eye": left_eye, "right_eye": right_eye}
-    # Upload API 호출
+
+def request_upload(left_eye: UploadedFile, right_eye: UploadedFile) -> Dict:
+    """
+    Upload API를 호출하여 좌/우안 예측 결과와 hitmap을 반환합니다.
+    """
     try:
-        upload_response = requests.post(upload_url, files=files_for_request_2)
-        upload_response.raise_for_status()
-        data = upload_response.json()
-    except requests.RequestException as e:
+        return get_inference_client().post('upload', {"left_eye": left_eye, "right_eye": right_eye})
+    except InferenceServiceError as e:
         print(f"Upload API 오류: {e}")
-        messages.warning(request, "❌ 이미지 업로드 중 오류가 발생했습니다. 다시 시도해주세요.")
-        sleep(2)
-        return {"status": "error", "message": "이미지 업로드 중 오류가 발생했습니다. 다시 시도해주세요."}
+        raise DiagnosisError("이미지 업로드 중 오류가 발생했습니다. 다시 시도해주세요.")
+
 
+def add_diagnosis_record(writer: DiagnosisRecordWriter, doctor_pk, reg_no: str, form: Dict,
+                         left_eye, right_eye, data: Dict) -> DiagnosisRecord:
+    """
+    Upload API 결과(예측, hitmap)를 정규화하여 writer에 진단 기록 한 건을 추가합니다.
+    """
     # 질병 정보 정규화 (Disease.get_disease_info는 dict 대신 튜플 (정식 표기, 한글 라벨)을 반환)
     print(f'data : {data.get("left_eye_prediction")} | data : {data.get("right_eye_prediction")}')
     left_eye_prediction = Disease.get_disease_info(data.get("left_eye_prediction"))
@@ -407,54 +592,170 @@ def save_diagnosis_info(request, doctor_pk):
     hit_map_left_image = convert_to_inmemory_uploaded_file(BytesIO(hit_map_left_bytes))
     hit_map_right_image = convert_to_inmemory_uploaded_file(BytesIO(hit_map_right_bytes))
 
+    return writer.add(doctor_pk, reg_no, form, left_eye, right_eye,
+                      left_eye_prediction, right_eye_prediction, hit_map_left_image, hit_map_right_image)
+
+
+def write_diagnosis_records(writer: DiagnosisRecordWriter) -> List[DiagnosisRecord]:
     try:
-        from django.db import transaction
-        with transaction.atomic():
-
-            patient = Patient.get_or_create_patient(doctor_id=doctor_pk, reg_no=reg_no)
-            patient_info = PatientInfo.get_or_create_patient_info(
-                patient.id, post.get('name'), post.get('birth'), post.get('sex')
-            )
-            medical_history = MedicalHistory.objects.create(patient_id=patient.id)
-            memo_history = MemoHistory.get_or_create_memo_history(
-                medical_history.id, post.get('symptom_by_patient'), post.get('memo_by_doctor')
-            )
-            fundus_image_left = FundusImageLeft.get_or_create_fil(medical_history.id, left_eye)
-            fundus_image_right = FundusImageRight.get_or_create_fir(medical_history.id, right_eye)
-            disease_left, _ = DiseaseLeft.get_or_create_with_condition(
-                fundus_left_id=fundus_image_left.id, disease_type=left_eye_prediction
-            )
-            disease_right, _ = DiseaseRight.get_or_create_with_condition(
-                fundus_right_id=fundus_image_right.id, disease_type=right_eye_prediction
-            )
-            diagnose_file = DiagnosisFile.get_or_create_file(medical_history.id)
-            fundus_hit_left = FundusHitmapImageLeft.get_or_create_hit_left(
-                fundus_image_left.id, hit_map_left_image
-            )
-            fundus_hit_right = FundusHitmapImageRight.get_or_create_hit_right(
-                fundus_image_right.id, hit_map_right_image
-            )
+        return writer.write()
     except Exception as e:
         print(f"DB 저장 중 오류 발생: {e}")
-        messages.warning(request, "❌ 데이터 저장 중 오류가 발생했습니다. 다시 시도해주세요.")
-        sleep(2)
-        return {"status": "error", "message": "데이터 저장 중 오류가 발생했습니다. 다시 시도해주세요."}
-
-    # 여러 인스턴스를 저장
-    instances_to_save = [
-        patient, patient_info, medical_history, memo_history, fundus_image_left,
-        fundus_image_right, disease_left, disease_right, diagnose_file,
-        fundus_hit_left, fundus_hit_right
-    ]
+        raise DiagnosisError("데이터 저장 중 오류가 발생했습니다. 다시 시도해주세요.")
+
+
+def store_diagnosis_records(doctor_pk, reg_no: str, form: Dict, left_eye, right_eye, data: Dict):
+    """
+    Upload API 결과를 진단 기록(환자, 방문 히스토리, 안저 이미지, 병변, hitmap)으로 저장합니다.
+    저장된 (patient, medical_history)를 반환합니다.
+    """
+    writer = DiagnosisRecordWriter()
+    try:
+        add_diagnosis_record(writer, doctor_pk, reg_no, form, left_eye, right_eye, data)
+    except Exception as e:
+        print(f"진단 결과 변환 중 오류 발생: {e}")
+        raise DiagnosisError("이미지 분석 결과가 올바르지 않습니다. 다시 시도해주세요.")
+    record = write_diagnosis_records(writer)[0]
+    return record.patient, record.medical_history
+
 
-    for instance in instances_to_save:
+def run_diagnosis_pipeline(doctor_pk, reg_no: str, form: Dict, eye_images: List[UploadedFile]):
+    """
+    classify -> upload -> 저장 단계를 순서대로 수행합니다.
+    웹 요청(save_diagnosis_info)과 백그라운드 워커(doctors.background)가 함께 사용합니다.
+    """
+    data = request_inference(eye_images)
+    left_eye, right_eye = data['left_eye'], data['right_eye']
+    return store_diagnosis_records(doctor_pk, reg_no, form, left_eye, right_eye, data['upload'])
+
+
+def request_inference(eye_images: List[UploadedFile]) -> Dict:
+    """
+    classify -> upload 결과를 반환합니다.
+    같은 이미지 쌍의 결과가 추론 캐시에 있으면 추론 서버를 호출하지 않습니다.
+    """
+    result = request_inference_batch([eye_images])[0]
+    if isinstance(result, DiagnosisError):
+        raise result
+    return result
+
+
+def split_cached_eye_images(eye_images: List[UploadedFile], image_hashes: List[str], left_hash: str):
+    left_eye, right_eye = None, None
+    for image, image_hash in zip(eye_images, image_hashes):
+        if image_hash == left_hash and left_eye is None:
+            left_eye = image
+        else:
+            right_eye = image
+    return left_eye, right_eye
+
+
+def request_inference_batch(eye_image_sets: List[List[UploadedFile]]) -> List:
+    """
+    여러 환자의 좌/우안 이미지 쌍에 대한 추론 결과를 입력 순서대로 반환합니다.
+    실패한 항목은 DiagnosisError 인스턴스로 채워집니다.
+
+    캐시에 없는 항목이 둘 이상이고 CLASSIFY_BATCH_URL / UPLOAD_BATCH_URL이 설정되어 있으면
+    classify, upload를 각각 한 번의 요청으로 묶어서 보냅니다.
+    """
+    cache = get_inference_cache()
+    image_hashes = [[hash_image(image) for image in eye_images] for eye_images in eye_image_sets]
+    cache_keys = [cache.make_key(hashes) for hashes in image_hashes]
+    results = [None] * len(eye_image_sets)
+
+    misses = []
+    for idx, cache_key in enumerate(cache_keys):
+        cached = cache.get(cache_key)
+        if cached is None:
+            misses.append(idx)
+            continue
+        left_eye, right_eye = split_cached_eye_images(eye_image_sets[idx], image_hashes[idx], cached['left_hash'])
+        results[idx] = {'left_eye': left_eye, 'right_eye': right_eye, 'upload': cached['upload']}
+
+    if len(misses) > 1 and get_inference_client().supports_batch():
         try:
-            instance.save()
-        except Exception as e:
-            print(f"{instance} 저장 실패: {e}")
-            messages.warning(request, "❌ 일부 데이터 저장 중 오류가 발생했습니다.")
-            sleep(2)
-            return {"status": "error", "message": "일부 데이터 저장 중 오류가 발생했습니다."}
+            classify_results = request_classification_batch([eye_image_sets[idx] for idx in misses])
+            eye_pairs = [split_eye_images(eye_image_sets[idx], data) for idx, data in zip(misses, classify_results)]
+            upload_results = request_upload_batch(eye_pairs)
+        except DiagnosisError as e:
+            for idx in misses:
+                results[idx] = e
+            return results
+        inferred = [(idx, left_eye, right_eye, upload)
+                    for idx, (left_eye, right_eye), upload in zip(misses, eye_pairs, upload_results)]
+    else:
+        inferred = []
+        for idx in misses:
+            try:
+                data = request_classification(eye_image_sets[idx])
+                left_eye, right_eye = split_eye_images(eye_image_sets[idx], data)
+                inferred.append((idx, left_eye, right_eye, request_upload(left_eye, right_eye)))
+            except DiagnosisError as e:
+                results[idx] = e
+
+    for idx, left_eye, right_eye, upload in inferred:
+        if left_eye is not None:
+            left_hash = image_hashes[idx][eye_image_sets[idx].index(left_eye)]
+            cache.set(cache_keys[idx], {'left_hash': left_hash, 'upload': upload})
+        results[idx] = {'left_eye': left_eye, 'right_eye': right_eye, 'upload': upload}
+    return results
+
+
+def request_classification_batch(eye_image_sets: List[List[UploadedFile]]) -> List[Dict]:
+    """
+    Classification batch API를 호출합니다. 파일 키는 p{환자 순번}_file{이미지 순번} 형식입니다.
+    """
+    files_for_request = {
+        f"p{patient_idx}_file{idx + 1}": image
+        for patient_idx, eye_images in enumerate(eye_image_sets)
+        for idx, image in enumerate(eye_images)
+    }
+    try:
+        data = get_inference_client().post('classify_batch', files_for_request)
+    except InferenceServiceError as e:
+        print(f"Classification batch API 오류: {e}")
+        raise DiagnosisError("이미지 분석 중 오류가 발생했습니다. 다시 시도해주세요.")
+    return get_batch_results(data, len(eye_image_sets))
+
+
+def request_upload_batch(eye_pairs: List) -> List[Dict]:
+    """
+    Upload batch API를 호출합니다. 파일 키는 p{환자 순번}_left_eye / p{환자 순번}_right_eye 형식입니다.
+    """
+    files_for_request = {}
+    for patient_idx, (left_eye, right_eye) in enumerate(eye_pairs):
+        files_for_request[f"p{patient_idx}_left_eye"] = left_eye
+        files_for_request[f"p{patient_idx}_right_eye"] = right_eye
+    try:
+        data = get_inference_client().post('upload_batch', files_for_request)
+    except InferenceServiceError as e:
+        print(f"Upload batch API 오류: {e}")
+        raise DiagnosisError("이미지 업로드 중 오류가 발생했습니다. 다시 시도해주세요.")
+    return get_batch_results(data, len(eye_pairs))
+
+
+def get_batch_results(data: Dict, expected: int) -> List[Dict]:
+    results = data.get("results") if isinstance(data, dict) else None
+    if not isinstance(results, list) or len(results) != expected:
+        print(f"Batch API 응답 개수 불일치: expected={expected}")
+        raise DiagnosisError("이미지 분석 결과가 올바르지 않습니다. 다시 시도해주세요.")
+    return results
+
+
+def save_diagnosis_info(request, doctor_pk):
+    post = request.POST
+    eye_images = request.FILES.getlist('eye_image_input')
+    reg_no = f'{post.get("reg_no")}_{request.user.account}'
+
+    # 각 이미지의 이름을 UUID 기반으로 재설정
+    for image in eye_images:
+        image.name = f'{uuid.uuid4()}.jpg'
+
+    try:
+        patient, medical_history = run_diagnosis_pipeline(doctor_pk, reg_no, get_diagnosis_form(post), eye_images)
+    except DiagnosisError as e:
+        messages.warning(request, f"❌ {e.message}")
+        return {"status": "error", "message": e.message}
 
     history_pk = getattr(medical_history, 'id', None) or None
     patient_pk = getattr(patient, 'id', None) or None
@@ -468,7 +769,8 @@ def get_patients_detail(req_meta_qs, patient_pk):
     try:
         qs_helper = QueryStringHelper(query_string=req_meta_qs, pk_set={'patient_pk': patient_pk})
         query_set = qs_helper.search_controller(query_set=MedicalHistory.objects.filter(patient_id=patient_pk))
-        query_set = qs_helper.page_controller(query_set)
+        visit_count = None if qs_helper.has_filters() or not counters_shared() else get_visit_count(patient_pk)
+        query_set = qs_helper.page_controller(query_set, count=visit_count)
 
         num_page, page_index, adjacent_pages = qs_helper.num_page, qs_helper.page_index, qs_helper.adjacent_pages
 
@@ -490,32 +792,54 @@ def get_patients_detail(req_meta_qs, patient_pk):
             'patient': get_object_or_none(Patient, id=patient_pk),
             'patient_history': patient_history_data,
             'pages': pages_data,
-            'current_page': qs_helper.get_int('page')
+            'current_page': qs_helper.get_int('page'),
+            **get_cursor_data(qs_helper)
         }
     except:
         return dict()
 
 
+def annotate_patient_list(patients: models.QuerySet) -> models.QuerySet:
+    """
+    환자 목록 한 페이지를 한 번의 쿼리로 가져오도록 환자 정보를 함께 읽고,
+    최근 방문일(last_visit_at)과 방문 횟수(visit_count)를 서브쿼리로 붙입니다.
+    """
+    histories = MedicalHistory.available_objects.filter(patient_id=OuterRef('pk'))
+    last_visit = histories.order_by('-created').values('created')[:1]
+    visit_count = histories.order_by().values('patient_id').annotate(count=Count('id')).values('count')
+    return patients.select_related('patient_info').annotate(
+        last_visit_at=Subquery(last_visit),
+        visit_count=Coalesce(Subquery(visit_count, output_field=IntegerField()), 0),
+    )
+
+
 def get_patient_info(patient: Patient) -> Dict:
     """
     환자 정보를 가져옵니다.
+    annotate_patient_list로 읽은 환자는 추가 쿼리 없이 처리됩니다.
     """
     try:
-        patient_info = patient.patient_info
-        medical_history = patient.medical_history.first()
+        patient_info = get_related_or_none(patient, 'patient_info')
+        if hasattr(patient, 'last_visit_at'):
+            recent = patient.last_visit_at
+        else:
+            medical_history = patient.medical_history.first()
+            recent = medical_history.created if medical_history else None
 
         return {
             'name': patient_info.name if patient_info else "NoName",
             'gender': Gender.get_gender_display(patient_info.gender) if patient_info else "NoGender",
             'age': patient_info.age if patient_info else "NoAge",
-            'recent': medical_history.created if medical_history else "No history"
+            'recent': recent if recent else "No history",
+            'visit_count': getattr(patient, 'visit_count', None),
         }
     except:
         return {
             'name': 'NoName',
             'gender': "NoGender",
             'age': "NoAge",
-            'recent': "No history"
+            'recent': "No history",
+            'visit_count': None,
         }
 
 
@@ -526,7 +850,8 @@ def get_doctor_data(doctor: Doctor) -> Dict:
     doctor_info = doctor.doctor_info
     return {
         'name': doctor_info.name if doctor_info else "ErrorDoctorName",
-        'user_id': doctor.user_id
+        'user_id': doctor.user_id,
+        'patient_count': get_patient_count(doctor.id)
     }
 
 
@@ -537,10 +862,95 @@ def get_page_data(adjacent_pages: List[int]) -> List[Dict]:
     return [{'num_page': page} for page in adjacent_pages]
 
 
+PATIENT_LOOKUP_KEY = 'patient_lookup:{doctor_pk}:{reg_no}'
+
+
+def normalize_reg_no(reg_no: str, account: str):
+    """
+    입력된 등록번호를 (입력값, 저장 형식 "{reg_no}_{account}")로 정규화합니다.
+    이미 계정 접미사가 붙어 있으면 한 번만 붙입니다.
+    """
+    reg_no = reg_no.strip()
+    suffix = f"_{account}"
+    if reg_no.endswith(suffix):
+        reg_no = reg_no[:-len(suffix)]
+    return reg_no, f"{reg_no}{suffix}"
+
+
+def lookup_patient(doctor_pk, account: str, reg_no: str) -> Optional[Dict]:
+    """
+    진단 폼의 환자 조회. 환자가 없으면 None, 환자 정보가 없으면 빈 dict를 반환합니다.
+    unique 인덱스 조회 한 번(환자 정보 join)으로 처리하고, 찾은 환자만 의사별로 짧게 캐시합니다.
+    (방금 진단으로 등록된 환자가 바로 조회되도록 없는 환자는 캐시하지 않는다. 진단 저장은 bulk INSERT라 시그널로 지울 수 없다.)
+    """
+    from django.core.cache import cache
+    raw_reg_no, combined_reg_no = normalize_reg_no(reg_no, account)
+    cache_key = PATIENT_LOOKUP_KEY.format(doctor_pk=doctor_pk, reg_no=hashlib.sha256(raw_reg_no.encode()).hexdigest())
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached.get('patient')
+
+    patients = {
+        patient.patient_reg_no: patient
+        for patient in Patient.objects.select_related('patient_info')
+        .filter(patient_reg_no__in=[combined_reg_no, raw_reg_no], doctor_id=doctor_pk)
+    }
+    patient = patients.get(combined_reg_no) or patients.get(raw_reg_no)
+    context = None
+    if patient is not None:
+        patient_info = get_related_or_none(patient, 'patient_info')
+        context = {
+            "name": patient_info.name,
+            "birth": patient_info.age,  # 만약 birth가 생년월일이면, 변수명 수정 고려
+            "gender": patient_info.gender,
+        } if patient_info else {}
+
+    if context:
+        cache.set(cache_key, {'patient': context}, timeout=getattr(settings, 'PATIENT_LOOKUP_CACHE_TIMEOUT', 30))
+    return context
+
+
+def search_reg_no_prefix(doctor_pk, account: str, prefix: str) -> List[Dict]:
+    """
+    등록번호 앞부분이 일치하는 환자를 최대 PATIENT_LOOKUP_TYPEAHEAD_LIMIT명 반환합니다. (자동완성)
+    """
+    raw_prefix, _ = normalize_reg_no(prefix, account)
+    suffix = f"_{account}"
+    limit = getattr(settings, 'PATIENT_LOOKUP_TYPEAHEAD_LIMIT', 10)
+    patients = (Patient.objects.select_related('patient_info')
+                .filter(doctor_id=doctor_pk, patient_reg_no__startswith=raw_prefix)
+                .order_by('patient_reg_no')[:limit])
+    results = []
+    for patient in patients:
+        patient_info = get_related_or_none(patient, 'patient_info')
+        reg_no = patient.patient_reg_no
+        results.append({
+            "reg_no": reg_no[:-len(suffix)] if reg_no.endswith(suffix) else reg_no,
+            "name": mask_korean_name(patient_info.name) if patient_info else None,
+        })
+    return results
+
+
+def get_cursor_data(qs_helper: QueryStringHelper) -> Dict:
+    """
+    keyset 페이지네이션 커서와 (대략적인) 전체 개수를 가져옵니다.
+    total_count_exact가 False이면 total_count는 PAGINATION_EXACT_COUNT_LIMIT이며 "그 이상"을 의미합니다.
+    """
+    return {
+        'next_cursor': qs_helper.next_cursor,
+        'prev_cursor': qs_helper.prev_cursor,
+        'total_count': qs_helper.total_count,
+        'total_count_exact': qs_helper.total_count_exact,
+    }
+
+
 def get_patients_data(patients: List[Patient], page_index: List[int]) -> List[Dict]:
     """
     환자 데이터를 가져옵니다.
+    현재 페이지 환자의 이름, 생년월일만 복호화합니다.
     """
+    patients = list(patients)
+    decrypt_fields([get_related_or_none(patient, 'patient_info') for patient in patients], ['_name', '_age'])
     return [
         {
             **get_patient_info(patient),